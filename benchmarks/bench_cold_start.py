@@ -0,0 +1,81 @@
+# Холодный старт бота: время импорта bot.main (и что в нём тяжёлое), время до ответа на /start
+# и до полного ответа по первому участку — без прогрева (пул и модули грузятся на первом запросе)
+# и после фазы прогрева (bot/services/warmup.py). Каждый замер — в свежем процессе.
+# Запуск: python -m benchmarks.bench_cold_start [повторов]
+import os, sys, json, time, asyncio, subprocess, statistics
+
+def _child(mode):
+    t0 = time.perf_counter()
+    from .common import offline_env, synthetic_dem_dir, square_parcel, FakeMessage
+    from .fixtures import load_overpass, load_nominatim
+    offline_env()
+    synthetic_dem_dir()
+    osm, addr = load_overpass("suburban"), load_nominatim("suburban")
+    t_fixtures = time.perf_counter()
+    import bot.main as bm
+    from bot.services import warmup
+    out = {"import_s": time.perf_counter() - t_fixtures}
+
+    async def fixture(v):
+        return v
+    bm.geocoding.reverse_geocode_async = lambda lat, lon: fixture(addr)
+    bm.osm.fetch_overpass_async = lambda bbox: fixture(osm)
+
+    async def run():
+        msg = FakeMessage()
+        await bm.cmd_start(msg)
+        # Время до первого ответа считается без загрузки фикстур
+        out["start_reply_s"] = msg.sent[0][2] - t0 - (t_fixtures - t0)
+        if mode == "warm":
+            t = time.perf_counter()
+            await warmup.run()
+            out["warmup_s"], out["warmup_steps"] = time.perf_counter() - t, warmup.STATE["steps"]
+        msg = FakeMessage()
+        t = time.perf_counter()
+        await bm.run_pipeline_and_reply(msg, square_parcel(1), source="bench")
+        out["first_parcel_s"] = time.perf_counter() - t
+        out["first_brief_s"] = msg.sent[1][2] - t
+    try:
+        asyncio.run(run())
+    finally:
+        bm.workers.shutdown()
+    print(json.dumps(out))
+
+def _run_child(mode):
+    r = subprocess.run([sys.executable, "-m", "benchmarks.bench_cold_start", "--child", mode],
+                       capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if r.returncode:
+        raise RuntimeError(r.stderr[-2000:])
+    return json.loads(r.stdout.strip().splitlines()[-1])
+
+def _import_profile(top=8):
+    # Самые тяжёлые пакеты верхнего уровня по -X importtime (кумулятивно, мс)
+    env = dict(os.environ, TELEGRAM_BOT_TOKEN=os.getenv("TELEGRAM_BOT_TOKEN", "123456:" + "A" * 35))
+    r = subprocess.run([sys.executable, "-X", "importtime", "-c", "import bot.main"], capture_output=True,
+                       text=True, env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    pkgs = {}
+    for line in r.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            name = parts[2].rstrip()
+            if name.startswith("   ") and not name.startswith("    "):  # прямые импорты bot.main
+                pkgs[name.strip()] = int(parts[1]) / 1000
+    return sorted(pkgs.items(), key=lambda kv: -kv[1])[:top]
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        return _child(sys.argv[2])
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print("heaviest direct imports of bot.main:",
+          ", ".join(f"{k} {v:.0f} ms" for k, v in _import_profile()))
+    for mode in ("cold", "warm"):
+        runs = [_run_child(mode) for _ in range(n)]
+        med = lambda k: statistics.median(r[k] for r in runs) * 1000
+        line = (f"{mode}: import bot.main {med('import_s'):6.0f} ms | /start reply {med('start_reply_s'):6.0f} ms | "
+                f"first parcel {med('first_parcel_s'):6.0f} ms (brief at {med('first_brief_s'):5.0f} ms)")
+        if mode == "warm":
+            line += f" | warm-up {med('warmup_s'):6.0f} ms {runs[-1]['warmup_steps']}"
+        print(line)
+
+if __name__ == "__main__":
+    main()
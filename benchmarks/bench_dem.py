@@ -0,0 +1,68 @@
+# Сравнение старого (поточечного) и векторизованного сэмплинга DEM.
+# Запуск: python -m benchmarks.bench_dem
+import numpy as np
+from shapely.geometry import Point
+from shapely.ops import transform
+from pyproj import Transformer
+
+from bot.services import dem, projection
+from .common import synthetic_dem_dir, synthetic_srtm, square_parcel, timeit
+
+_legacy_elev = None  # srtm.GeoElevationData для исходного пути
+
+def legacy_compute_dem_stats(geom_wgs84, step_m=30.0, buffer_m=200):
+    # Исходная реализация compute_dem_stats (двойной цикл по сетке, srtm.py поточечно)
+    lon, lat = geom_wgs84.centroid.x, geom_wgs84.centroid.y
+    crs_utm = projection.utm_epsg(lon, lat)
+    to_utm = Transformer.from_crs("EPSG:4326", crs_utm, always_xy=True).transform
+    to_wgs = Transformer.from_crs(crs_utm, "EPSG:4326", always_xy=True).transform
+    g_utm = transform(to_utm, geom_wgs84).buffer(buffer_m)
+    minx, miny, maxx, maxy = g_utm.bounds
+    nx = max(5, int((maxx - minx) / step_m))
+    ny = max(5, int((maxy - miny) / step_m))
+    xs = np.linspace(minx, maxx, nx)
+    ys = np.linspace(miny, maxy, ny)
+    elev, elev_in = [], []
+    for x in xs:
+        for y in ys:
+            pt_utm = Point(x, y)
+            if not g_utm.contains(pt_utm):
+                continue
+            lon2, lat2 = transform(to_wgs, pt_utm).x, transform(to_wgs, pt_utm).y
+            h = _legacy_elev.get_elevation(lat2, lon2)
+            if h is None:
+                continue
+            elev.append(h)
+            if transform(to_utm, geom_wgs84).contains(pt_utm):
+                elev_in.append(h)
+    if not elev_in:
+        h0 = _legacy_elev.get_elevation(lat, lon)
+        elev_in = [h0] if h0 is not None else [0]
+    elev = np.array(elev) if elev else np.array(elev_in)
+    elev_in = np.array(elev_in)
+    slope_pct = float(np.clip(np.std(np.diff(np.sort(elev_in))) if len(elev_in) > 3 else 0.0, 0, 100))
+    return {
+        "elev_min": float(np.min(elev_in)),
+        "elev_max": float(np.max(elev_in)),
+        "elev_med": float(np.median(elev_in)),
+        "elev_p95": float(np.percentile(elev_in, 95)),
+        "slope_indicative_pct": slope_pct,
+        "rel_lowness_m": float(np.median(elev_in) - float(np.median(elev))),
+    }
+
+def main():
+    global _legacy_elev
+    _legacy_elev = synthetic_srtm(synthetic_dem_dir())
+    print(f"{'parcel':>8} {'legacy, ms':>12} {'vector, ms':>12} {'speedup':>8} {'max |dh|, m':>12}")
+    for ha in (1, 10, 100):
+        g = square_parcel(ha)
+        old = legacy_compute_dem_stats(g)
+        new = dem.compute_dem_stats(g)
+        # Новый путь интерполирует билинейно, старый брал ближайший узел — сравниваем высоты
+        dh = max(abs(old[k] - new[k]) for k in ("elev_min", "elev_max", "elev_med", "elev_p95"))
+        t_old = timeit(legacy_compute_dem_stats, g, repeat=3)
+        t_new = timeit(dem.compute_dem_stats, g)
+        print(f"{ha:>6}ha {t_old*1000:>12.1f} {t_new*1000:>12.1f} {t_old/t_new:>7.1f}x {dh:>12.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+# Поточечный srtm.py против пакетной билинейной выборки из memmap-тайлов.
+# Запуск: python -m benchmarks.bench_dem_tiles
+import numpy as np
+
+from bot.storage import dem_tiles
+from .common import synthetic_dem_dir, synthetic_srtm, synthetic_relief, timeit
+
+def main():
+    d = synthetic_dem_dir()
+    elev = synthetic_srtm(d)
+    rng = np.random.default_rng(0)
+    for n in (1_000, 10_000, 100_000):
+        lats = 55 + rng.random(n)
+        lons = 37 + rng.random(n)
+        t_pt = timeit(lambda: [elev.get_elevation(la, lo) for la, lo in zip(lats, lons)], repeat=1)
+        t_mm = timeit(dem_tiles.sample, lons, lats)
+        err = np.nanmax(np.abs(dem_tiles.sample(lons, lats) - synthetic_relief(lats, lons)))
+        print(f"{n:>7} pts  srtm.py {t_pt*1000:9.1f} ms  memmap {t_mm*1000:7.2f} ms  "
+              f"x{t_pt/t_mm:6.0f}  max err {err:.2f} m")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# Обратное геокодирование: локальный индекс (STRtree + точка-в-полигоне) против кэша ответов Nominatim,
+# и сколько соседних участков делят одну запись кэша при снапе к сетке.
+# Запуск: python -m benchmarks.bench_geocode [N]
+import os, sys, time, tempfile
+import numpy as np
+
+from .common import BASE_LAT, BASE_LON
+from .fixtures import write_geocoder_extract
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    d = tempfile.mkdtemp(prefix="bench_geocode_")
+    os.environ["GEOCODER_INDEX_PATH"] = os.path.join(d, "geocoder.sqlite")
+    from bot.storage import geocoder_index
+    from bot.services import geocoding
+    path = write_geocoder_extract(os.path.join(d, "extract.geojson"))
+    t0 = time.perf_counter()
+    print(f"import: {geocoder_index.load(path)} features, {time.perf_counter() - t0:.2f} s, {geocoder_index.count()}")
+    t0 = time.perf_counter()
+    geocoder_index.index()
+    print(f"index build (once per process): {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    rng = np.random.default_rng(1)
+    lats = BASE_LAT + rng.uniform(-0.15, 0.15, n)
+    lons = BASE_LON + rng.uniform(-0.25, 0.25, n)
+    t0 = time.perf_counter()
+    found = sum(geocoder_index.lookup(la, lo) is not None for la, lo in zip(lats, lons))
+    dt = time.perf_counter() - t0
+    print(f"local lookup: {dt / n * 1e6:.0f} µs/query, {found}/{n} answered")
+    print("sample:", geocoder_index.lookup(BASE_LAT, BASE_LON)["display_name"])
+
+    # Участки в радиусе ~2 км: сколько разных записей кэша Nominatim они дают
+    plats = BASE_LAT + rng.uniform(-0.018, 0.018, 1000)
+    plons = BASE_LON + rng.uniform(-0.03, 0.03, 1000)
+    exact = {(f"{a:.5f}", f"{b:.5f}") for a, b in zip(plats, plons)}
+    snapped = {(geocoding.snap(a), geocoding.snap(b)) for a, b in zip(plats, plons)}
+    print(f"1000 parcels within ~2 km: {len(exact)} cache keys exact, {len(snapped)} snapped "
+          f"to {geocoding.GEOCODE_GRID_DEG}°")
+
+if __name__ == "__main__":
+    main()
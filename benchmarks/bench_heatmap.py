@@ -0,0 +1,42 @@
+# Тепловая карта пригодности: векторный проход по всем ячейкам против цикла «участок-ячейка → compute_all».
+# Цикл меряется на выборке ячеек и экстраполируется на весь растр.
+# Запуск: python -m benchmarks.bench_heatmap [rural|suburban|urban]
+import sys, time
+import numpy as np
+
+from bot.services import heatmap, metrics, projection
+from .common import BASE_LAT, BASE_LON, synthetic_dem_dir, square_parcel, timeit
+from .fixtures import synthetic_overpass
+
+SIZE_M = 5000
+SAMPLE = 50
+
+def per_cell_loop(data, n, sample):
+    # Исходный путь: каждую ячейку как отдельный участок (индекс OSM общий — иначе совсем долго)
+    cell_ha = (SIZE_M / n) ** 2 / 10_000
+    index = metrics.build_osm_index(data, projection.utm_epsg(BASE_LON, BASE_LAT))
+    rng = np.random.default_rng(0)
+    half = SIZE_M / 2 / 111_000
+    t0 = time.perf_counter()
+    for _ in range(sample):
+        g = square_parcel(cell_ha, BASE_LAT + rng.uniform(-half, half), BASE_LON + rng.uniform(-half, half) * 1.7)
+        metrics.compute_all(g, data, {}, index)
+    return (time.perf_counter() - t0) / sample * n * n
+
+def main():
+    names = sys.argv[1:] or ["suburban"]
+    synthetic_dem_dir()
+    for name in names:
+        # Данные OSM покрывают квадрат с запасом 2 км, как в боте
+        data = synthetic_overpass(name, half_km=SIZE_M / 2000 + 2)
+        print(f"{name}: {len(data['elements'])} elements, {SIZE_M / 1000:.0f} km square")
+        for n in (100, 500):
+            t_vec = timeit(heatmap.compute_heatmap, BASE_LON, BASE_LAT, data, SIZE_M, n, repeat=3)
+            hm = heatmap.compute_heatmap(BASE_LON, BASE_LAT, data, SIZE_M, n)
+            t_png = timeit(heatmap.render_overlay_png, hm, repeat=3)
+            t_loop = per_cell_loop(data, n, SAMPLE)
+            print(f"  {n:>3}×{n:<3} vector {t_vec * 1000:9.1f} ms  (+png {t_png * 1000:6.1f} ms)  "
+                  f"per-cell loop ~{t_loop:8.1f} s  x{t_loop / t_vec:,.0f}")
+
+if __name__ == "__main__":
+    main()
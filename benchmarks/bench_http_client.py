@@ -0,0 +1,50 @@
+# Проверка http_client на локальном aiohttp-стабе: реальный темп запросов под token bucket,
+# лимит одновременных соединений и повторы на 429/5xx.
+# Запуск: python -m benchmarks.bench_http_client
+import asyncio, time
+from aiohttp import web
+
+from bot.services import http_client
+
+async def _stub(fail_first=0, delay=0.05):
+    state = {"times": [], "inflight": 0, "max_inflight": 0, "n": 0}
+    async def handler(request):
+        state["n"] += 1
+        state["times"].append(time.monotonic())
+        if state["n"] <= fail_first:
+            return web.Response(status=429 if state["n"] % 2 else 503)
+        state["inflight"] += 1
+        state["max_inflight"] = max(state["max_inflight"], state["inflight"])
+        await asyncio.sleep(delay)
+        state["inflight"] -= 1
+        return web.json_response({"ok": True})
+    app = web.Application()
+    app.router.add_route("*", "/", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/", state
+
+async def _run(name, n, rate, burst, concurrency, fail_first=0):
+    http_client.UPSTREAMS[name] = http_client.Upstream(name, rate, burst, concurrency, timeout=10)
+    runner, url, st = await _stub(fail_first)
+    t0 = time.monotonic()
+    await asyncio.gather(*[http_client.request_json(name, "GET", url) for _ in range(n)])
+    dt = time.monotonic() - t0
+    gaps = [b - a for a, b in zip(st["times"], st["times"][1:])]
+    print(f"{name:>10}: {n} calls, {st['n']} hits, rate cap {rate}/s burst {burst} -> "
+          f"observed {(st['n'] - burst) / max(dt, 1e-9):.2f}/s, min gap {min(gaps or [0]) * 1000:.0f} ms, "
+          f"max in-flight {st['max_inflight']} (cap {concurrency}), {dt:.2f} s")
+    await http_client.close()
+    await runner.cleanup()
+
+async def main():
+    http_client.HTTP_BACKOFF_S = 0.05
+    await _run("nominatim", 10, rate=5, burst=1, concurrency=1)
+    await _run("overpass", 20, rate=20, burst=5, concurrency=2)
+    await _run("retry", 5, rate=50, burst=5, concurrency=5, fail_first=4)
+
+if __name__ == "__main__":
+    asyncio.run(main())
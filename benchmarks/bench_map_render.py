@@ -0,0 +1,66 @@
+# Рендер карты участка: подложка из сети (stub-сервер тайлов) против постоянного кэша и офлайн-режима,
+# размер и время кодирования PNG против WebP.
+# Запуск: python -m benchmarks.bench_map_render [rural|suburban|urban]
+import io, os, sys, tempfile, threading, time, logging
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from PIL import Image
+
+from .common import square_parcel
+from .fixtures import load_overpass
+
+TILE_LATENCY_S = 0.05  # имитация задержки тайлового сервера
+
+def _tile_server():
+    buf = io.BytesIO()
+    Image.new("RGB", (256, 256), "#dfe8d8").save(buf, "PNG")
+    body = buf.getvalue()
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(TILE_LATENCY_S)
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        def log_message(self, *args):
+            pass
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+def main():
+    names = sys.argv[1:] or ["suburban"]
+    logging.basicConfig(level=logging.INFO, format="    %(message)s")  # разбивка: тайлы / рисование / PNG
+    srv = _tile_server()
+    os.environ["TILE_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench_tiles_")
+    os.environ["TILE_URL"] = f"http://127.0.0.1:{srv.server_address[1]}/{{z}}/{{x}}/{{y}}.png"
+    from bot.services import map_render, tiles, http_client
+    # Темп тайлового upstream'а не меряем — только передачу, кэш и рисование
+    http_client.UPSTREAMS["tiles"].bucket = http_client.TokenBucket(1000, 1000)
+    parcel = square_parcel(1)
+    for name in names:
+        data = load_overpass(name)
+        print(f"{name}: {len(data['elements'])} elements")
+        modes = [("cold (network)", lambda: None), ("warm (cache)", lambda: None),
+                 ("revalidate (304)", lambda: setattr(tiles, "TILE_TTL_S", 0)),
+                 ("offline, cached", lambda: setattr(tiles, "TILE_OFFLINE", True)),
+                 ("offline, blank", lambda: setattr(tiles, "TILE_SOURCE", "empty"))]
+        tiles.TILE_TTL_S, tiles.TILE_OFFLINE, tiles.TILE_SOURCE = 7 * 24 * 3600, False, f"bench_{name}"
+        for label, setup in modes:
+            setup()
+            t0 = time.perf_counter()
+            png = map_render.render_map(parcel, data)
+            print(f"  {label:>17}: {(time.perf_counter() - t0) * 1000:8.1f} ms  {len(png) // 1024} KB")
+        tiles.TILE_SOURCE = f"bench_{name}"
+        for fmt in ("png", "webp"):
+            t0 = time.perf_counter()
+            out = map_render.render_map(parcel, data, fmt=fmt)
+            print(f"  {'offline, ' + fmt:>17}: {(time.perf_counter() - t0) * 1000:8.1f} ms  {len(out) // 1024} KB")
+    srv.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# compute_all: восемь проходов _collect_geoms + unary_union против одного классификатора и STRtree.
+# Запуск: python -m benchmarks.bench_metrics [rural|suburban|urban]
+import sys
+from shapely.ops import transform, unary_union
+
+from bot.services import metrics
+from .common import square_parcel, timeit
+from .fixtures import load_overpass
+
+def legacy_measures(geom_wgs84, osm_data):
+    # Исходный путь расчёта дистанций и фасада из compute_all
+    parcel_utm, to_utm, _, _ = metrics.project_to_utm(geom_wgs84)
+    def collect(f):
+        return [transform(to_utm, g) for g in metrics._collect_geoms(osm_data, f)]
+    c = metrics.CATEGORIES
+    r_major, r_all = collect(c["roads_major"]), collect(c["roads_all"])
+    waters, powers = collect(c["waters"]), collect(c["powers"])
+    collect(c["subst"]); collect(c["socials"])
+    stops, places = collect(c["stops"]), collect(c["places"])
+    def min_distance(geom, candidates):
+        return float(geom.distance(unary_union(candidates))) if candidates else None
+    out = {
+        "d_road_m": min_distance(parcel_utm, r_major) or min_distance(parcel_utm, r_all),
+        "d_water_m": min_distance(parcel_utm, waters),
+        "d_power_m": min_distance(parcel_utm, powers),
+        "d_stop_m": min_distance(parcel_utm, stops),
+        "d_place_m": min_distance(parcel_utm, places),
+        "facade_len_m": 0.0,
+    }
+    if r_all:
+        inter = parcel_utm.boundary.intersection(unary_union([g.buffer(10) for g in r_all]))
+        out["facade_len_m"] = float(inter.length) if not inter.is_empty else 0.0
+    return out
+
+def main():
+    names = sys.argv[1:] or ["rural", "suburban", "urban"]
+    parcel = square_parcel(1)
+    for name in names:
+        data = load_overpass(name)
+        new = metrics.compute_all(parcel, data, {})
+        old = legacy_measures(parcel, data)
+        for k, v in old.items():
+            assert (v is None and new[k] is None) or abs(v - new[k]) < 1e-6, (k, v, new[k])
+        t_old = timeit(legacy_measures, parcel, data, repeat=3)
+        t_new = timeit(metrics.compute_all, parcel, data, {}, repeat=3)
+        print(f"{name:>9}: {len(data['elements']):>6} elements  legacy {t_old*1000:8.1f} ms  "
+              f"strtree {t_new*1000:7.1f} ms  x{t_old/t_new:.1f}")
+
+if __name__ == "__main__":
+    main()
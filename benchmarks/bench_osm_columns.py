@@ -0,0 +1,79 @@
+# Колонки OSM (.npz) против прежнего пути «JSON → список dict» на каждом попадании в кэш тайлов:
+# размер в кэше, память разобранного ответа (tracemalloc), время разбора, объём передачи в воркер
+# (pickle) и время потребителей — категории метрик и линии карты.
+# Запуск: python -m benchmarks.bench_osm_columns [rural|suburban|urban]
+import sys, pickle, tracemalloc
+import numpy as np
+
+from bot.services import metrics, osm_columns
+from bot.storage import cache
+from .common import timeit
+from .fixtures import load_overpass
+
+def legacy_classify(data):
+    # Прежний metrics.classify_osm: геометрия на каждый dict-элемент
+    out = {k: [] for k in metrics.CATEGORIES}
+    for el in data.get("elements", []):
+        tags = el.get("tags", {})
+        cats = [k for k, f in metrics.CATEGORIES.items() if f(tags, el["type"])]
+        if not cats:
+            continue
+        g = metrics._element_geom(el, tags)
+        if g is None:
+            continue
+        for k in cats:
+            out[k].append(g)
+    return {k: np.array(v, dtype=object) for k, v in out.items()}
+
+def legacy_lines(data):
+    # Прежний map_render._collect_lines
+    coords, offsets, styles = [], [0], []
+    for el in data.get("elements", []):
+        if el.get("type") != "way" or "geometry" not in el:
+            continue
+        st = osm_columns.style_of(el.get("tags", {}))
+        if st is None:
+            continue
+        pts = [p for p in el["geometry"] if p]
+        if len(pts) < 2:
+            continue
+        coords.extend((p["lon"], p["lat"]) for p in pts)
+        offsets.append(len(coords))
+        styles.append(st)
+    arr = np.array(coords, dtype=float).reshape(-1, 2)
+    return arr[:, 0], arr[:, 1], np.array(offsets), styles
+
+def _held_mb(fn, *args):
+    # Память, которую держит результат fn (то, что лежит в LRU кэша и живёт весь запрос)
+    tracemalloc.start()
+    obj = fn(*args)
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del obj
+    return held / 2**20
+
+def main():
+    names = sys.argv[1:] or ["rural", "suburban", "urban"]
+    print(f"{'':>9} {'cache KB':>9} {'held MB':>8} {'decode ms':>10} {'pickle KB':>10} "
+          f"{'classify ms':>12} {'lines ms':>9}")
+    for name in names:
+        data = load_overpass(name)
+        cols = osm_columns.of(data)
+        js, _ = cache._encode(data)
+        npz = cols.to_npz()
+        decode_json = lambda: cache._decode(js)[0]
+        decode_npz = lambda: osm_columns.from_npz(npz)
+        rows = [
+            ("dict", len(js), _held_mb(decode_json), timeit(decode_json), len(pickle.dumps(data, 5)),
+             timeit(legacy_classify, data), timeit(legacy_lines, data)),
+            ("columns", len(npz), _held_mb(decode_npz), timeit(decode_npz), len(pickle.dumps(cols, 5)),
+             timeit(cols.layers), timeit(cols.lines)),
+        ]
+        assert len(legacy_lines(data)[3]) == len(cols.lines()[3])
+        print(f"{name} ({len(data['elements'])} elements, {len(cols)} kept, {len(cols.coords)} vertices)")
+        for label, kb, mb, t_dec, pk, t_cls, t_lines in rows:
+            print(f"{label:>9} {kb / 1024:9.0f} {mb:8.1f} {t_dec * 1000:10.1f} {pk / 1024:10.0f} "
+                  f"{t_cls * 1000:12.1f} {t_lines * 1000:9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# Локальное SQLite/R*Tree-хранилище OSM против HTTP-пути Overpass (локальный stub-сервер).
+# Запуск: python -m benchmarks.bench_osm_store [rural|suburban|urban]
+import json, sys, tempfile, threading, os
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from bot.services import metrics, osm, http_client
+from bot.storage import osm_store
+from .common import square_parcel, timeit
+from .fixtures import load_overpass
+
+def _stub_server(payload):
+    body = json.dumps(payload).encode()
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        def log_message(self, *args):
+            pass
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+def main():
+    names = sys.argv[1:] or ["rural", "suburban", "urban"]
+    # Ограничение темпа Overpass не меряем — только передачу и разбор ответа
+    http_client.UPSTREAMS["overpass"].bucket = http_client.TokenBucket(1000, 1000)
+    bbox = metrics.expand_bbox(square_parcel(1).bounds)
+    for name in names:
+        data = load_overpass(name)
+        srv = _stub_server(data)
+        osm.OVERPASS_URL = f"http://127.0.0.1:{srv.server_address[1]}/api/interpreter"
+        osm_store.OSM_STORE_PATH = os.path.join(tempfile.mkdtemp(prefix="bench_osm_"), "osm.sqlite")
+        osm_store._local.conn = None
+        osm_store.upsert(data["elements"])
+        n_http = len(osm._query_overpass(bbox)["elements"])
+        n_local = len(osm_store.query(bbox)["elements"])
+        t_http = timeit(osm._query_overpass, bbox, repeat=3)
+        t_local = timeit(osm_store.query, bbox, repeat=3)
+        print(f"{name:>9}: http {t_http*1000:8.1f} ms ({n_http} el)  "
+              f"sqlite {t_local*1000:7.1f} ms ({n_local} el)  x{t_http/t_local:.1f}")
+        srv.shutdown()
+
+if __name__ == "__main__":
+    main()
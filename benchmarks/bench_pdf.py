@@ -0,0 +1,56 @@
+# PDF-отчёты: одиночный отчёт (с картой из памяти) и сводный по N участкам — страниц/с и пик памяти.
+# Запуск: python -m benchmarks.bench_pdf [N]
+import os, sys, time, resource, tracemalloc
+
+from .common import square_parcel, timeit
+from .fixtures import load_overpass
+
+def _metric_set(i):
+    return {"area_ha": 1.0 + i % 7 * 0.3, "touches_road": i % 2 == 0, "facade_len_m": 40.0 + i % 50,
+            "can_house_10x10": True, "d_road_m": 120.0 + i, "d_water_m": None, "d_stop_m": 800.0,
+            "d_place_m": 1500.0, "d_power_m": 300.0, "profile": "izhs",
+            "score": {"total": 50 + i % 50, "access": 80.0, "slope": 70.0, "flood": 90.0, "infra": 60.0,
+                      "power": 75.0, "road": 100.0},
+            "dem": {"elev_min": 140.0, "elev_max": 152.0, "elev_med": 146.0, "slope_indicative_pct": 3.4,
+                    "slope_p90_pct": 6.1, "slope_gt8_share": 0.04, "slope_gt15_share": 0.0, "rel_lowness_m": -0.6}}
+
+def _map_png():
+    # Настоящая карта участка на пустой подложке (без сети)
+    os.environ["TILE_OFFLINE"], os.environ["TILE_SOURCE"] = "1", "bench_empty"
+    from bot.services import map_render
+    return map_render.render_map(square_parcel(1), load_overpass("suburban"))
+
+def _peak(fn, *args):
+    # Отдельный прогон: tracemalloc сам замедляет выполнение в разы
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def main():
+    from bot.services import pdf
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    addr = {"display_name": "Московская область, Ленинский городской округ, деревня Тестовая"}
+    png = _map_png()
+    t0 = time.perf_counter()
+    pdf.fonts()
+    pdf._template()
+    print(f"fonts + template (once per process): {(time.perf_counter() - t0) * 1000:.0f} ms")
+    for label, m in (("no map", None), ("with map", png)):
+        dt = timeit(pdf.render_report, _metric_set(0), addr, "bench", m, repeat=10)
+        size = len(pdf.render_report(_metric_set(0), addr, "bench", m))
+        print(f"single report, {label:>8}: {dt * 1000:6.1f} ms, {1 / dt:5.1f} pages/s, {size // 1024} KB")
+    for label, m in (("no maps", None), ("with maps", png)):
+        items = [(f"parcel-{i}", _metric_set(i), addr, m) for i in range(n)]
+        t0 = time.perf_counter()
+        data = pdf.render_batch_report(items, "bench")
+        dt = time.perf_counter() - t0
+        peak = _peak(pdf.render_batch_report, items, "bench")
+        pages = data.count(b"/Type /Page\n")
+        print(f"batch {n}, {label:>9}: {dt:5.2f} s, {pages} pages, {pages / dt:6.1f} pages/s, "
+              f"{len(data) // 1024} KB, peak traced {peak / 2**20:.1f} MB")
+    print(f"process max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# Пересчёт скоринга по профилю из хранилища снимков: миллион участков — чтение столбцами + NumPy.
+# Для сравнения — построчный пересчёт (score_scalar на каждый снимок) на выборке.
+# Запуск: python -m benchmarks.bench_rescore [число снимков]
+import os, sys, tempfile, time
+import numpy as np
+
+def fill(n, seed=0):
+    from bot.storage import snapshots
+    rng = np.random.default_rng(seed)
+    cols = {
+        "lon": rng.uniform(37, 38, n), "lat": rng.uniform(55, 56, n),
+        "area_m2": rng.uniform(500, 50_000, n), "facade_len_m": rng.uniform(0, 100, n),
+        "touches_road": rng.random(n) < 0.4, "can_house_10x10": rng.random(n) < 0.9,
+        "d_road_m": rng.exponential(800, n), "d_water_m": np.where(rng.random(n) < 0.3, np.nan, rng.exponential(300, n)),
+        "d_power_m": rng.exponential(1500, n), "d_stop_m": rng.exponential(1200, n), "d_place_m": rng.exponential(2000, n),
+        "slope_pct": rng.gamma(2, 2, n), "rel_lowness_m": rng.normal(0, 1.5, n), "wetness_idx": rng.random(n) * 0.5,
+    }
+    names = [c for c in snapshots.NAMES if c in cols]
+    vals = [np.where(np.isnan(cols[c].astype(float)), None, cols[c].astype(float)).tolist() for c in names]
+    rows = zip((f"k{i:08d}" for i in range(n)), *vals)
+    c = snapshots._conn()
+    with c:
+        c.executemany(f"INSERT OR REPLACE INTO snapshots (key, {', '.join(names)}) VALUES ({', '.join('?' * (len(names) + 1))})", rows)
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    os.environ["SNAPSHOT_STORE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench_snap_"), "snapshots.sqlite")
+    from bot.storage import snapshots
+    from bot.services import scoring
+    t0 = time.perf_counter()
+    fill(n)
+    print(f"{n} snapshots written in {time.perf_counter() - t0:.1f}s")
+    t0 = time.perf_counter()
+    keys, cols = snapshots.load_columns(snapshots.SCORE_NAMES)
+    t_load = time.perf_counter() - t0
+    for profile in scoring.PROFILES:
+        t0 = time.perf_counter()
+        sc = scoring.score(snapshots.measures(cols), profile)
+        t_score = time.perf_counter() - t0
+        print(f"  {profile:>10}: load {t_load:.2f}s + score {t_score * 1000:.0f} ms, mean total {sc['total'].mean():.1f}")
+    # Построчно: как если бы каждый снимок пересчитывался отдельно
+    sample = 2000
+    m = {k: v[:sample] for k, v in snapshots.measures(cols).items()}
+    t0 = time.perf_counter()
+    for i in range(sample):
+        scoring.score_scalar({k: v[i] for k, v in m.items()})
+    per_row = (time.perf_counter() - t0) / sample
+    print(f"  per-row loop ~{per_row * n:.1f}s for {n} (x{per_row * n / t_score:,.0f} vs vector score)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+# Нагрузочный бенчмарк CPU-стадий (DEM + метрики): потоки против пула процессов.
+# Запуск: python -m benchmarks.bench_workers [jobs]
+import asyncio, os, sys, time
+
+from .common import synthetic_dem_dir, square_parcel
+from .fixtures import load_overpass
+
+async def _load(workers, jobs, data):
+    parcels = [square_parcel(5, lat=55.5 + i * 1e-3) for i in range(jobs)]
+    async def one(g):
+        d = await workers.compute_dem_stats(g)
+        return await workers.compute_all(g, data, d)
+    await one(parcels[0])  # прогрев пула
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(g) for g in parcels))
+    return jobs / (time.perf_counter() - t0)
+
+def main():
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    synthetic_dem_dir()
+    from bot.services import workers
+    data = load_overpass("suburban")
+    cpus = os.cpu_count() or 1
+    print(f"{cpus} CPU, {jobs} parcels (5 ha, suburban OSM)")
+    for n in sorted({0, 1, 2, 4, cpus}):
+        workers.WORKER_PROCESSES = n
+        rate = asyncio.run(_load(workers, jobs, data))
+        workers.shutdown()
+        label = "threads" if n == 0 else f"{n} proc"
+        print(f"{label:>9}: {rate:6.2f} parcels/s")
+
+if __name__ == "__main__":
+    main()
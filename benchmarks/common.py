@@ -0,0 +1,114 @@
+# Общие помощники для бенчмарков: синтетический рельеф, тестовые участки, замер времени.
+import math, os, resource, statistics, tempfile, time
+import numpy as np
+from shapely.geometry import Polygon
+
+BASE_LAT, BASE_LON = 55.55, 37.55  # Подмосковье, тайл N55E037
+SRTM3_SIDE = 1201
+
+def synthetic_relief(lats, lons):
+    # Плавный холм + долина: даёт и уклоны, и низины
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    return (150 + 40 * np.sin((lats - 55) * 40) * np.cos((lons - 37) * 25)
+            - 15 * np.exp(-((lats - BASE_LAT) ** 2 + (lons - BASE_LON) ** 2) / 2e-4))
+
+def write_synthetic_hgt(dir_path, lat0=55, lon0=37, side=SRTM3_SIDE):
+    # Файл в формате SRTM .hgt (big-endian int16, строки с севера на юг)
+    rows = np.arange(side)
+    cols = np.arange(side)
+    lats = lat0 + 1 - rows / (side - 1)
+    lons = lon0 + cols / (side - 1)
+    lat_grid, lon_grid = np.meshgrid(lats, lons, indexing="ij")
+    h = np.round(synthetic_relief(lat_grid, lon_grid)).astype(">i2")
+    name = f"N{lat0:02d}E{lon0:03d}.hgt"
+    h.tofile(os.path.join(dir_path, name))
+    return name
+
+def synthetic_dem_dir():
+    # Каталог с синтетическим тайлом; хранилище DEM переключается на него в офлайн-режиме
+    from bot.storage import dem_tiles
+    d = tempfile.mkdtemp(prefix="bench_dem_")
+    write_synthetic_hgt(d)
+    dem_tiles.DEM_TILE_DIR = d
+    dem_tiles.DEM_OFFLINE = True
+    os.environ["DEM_TILE_DIR"] = d  # для воркеров пула процессов
+    os.environ["DEM_OFFLINE"] = "1"
+    dem_tiles.close_all()
+    return d
+
+def synthetic_srtm(dir_path):
+    # srtm.GeoElevationData, читающий только локальный каталог (без сети)
+    import srtm
+    return srtm.get_data(local_cache_dir=dir_path)
+
+def square_parcel(area_ha, lat=BASE_LAT, lon=BASE_LON):
+    side = math.sqrt(area_ha * 10_000.0)
+    dlat = side / 111_000.0 / 2
+    dlon = side / (111_000.0 * math.cos(math.radians(lat))) / 2
+    return Polygon([(lon - dlon, lat - dlat), (lon + dlon, lat - dlat),
+                    (lon + dlon, lat + dlat), (lon - dlon, lat + dlat)])
+
+def timeit(fn, *args, repeat=5, **kwargs):
+    fn(*args, **kwargs)  # прогрев
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args, **kwargs)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+def sample(fn, *args, repeat=20, warmup=1, **kwargs):
+    # Все замеры (с) после прогрева — для перцентилей
+    for _ in range(warmup):
+        fn(*args, **kwargs)
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args, **kwargs)
+        times.append(time.perf_counter() - t0)
+    return times
+
+def percentiles(times, ps=(50, 90, 99)):
+    # {"p50": мс, ..., "max": мс}; перцентиль — ближайший ранг
+    xs = sorted(times)
+    out = {f"p{p}": xs[min(len(xs) - 1, max(0, math.ceil(p / 100 * len(xs)) - 1))] * 1000 for p in ps}
+    out["max"] = xs[-1] * 1000
+    return out
+
+def peak_rss_mb(pid=None):
+    # Пиковый RSS (МБ) этого процесса или процесса pid (воркер пула; только Linux, иначе None)
+    if pid is None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+def offline_env():
+    # До импорта bot.*: конфигурация модулей читается из окружения при импорте.
+    # Кэши — во временном каталоге, подложка карты — пустая, кэш готовых ответов выключен
+    d = tempfile.mkdtemp(prefix="bench_offline_")
+    os.environ["CACHE_DIR"] = d
+    os.environ["TILE_CACHE_DIR"] = os.path.join(d, "tiles")
+    os.environ["TILE_OFFLINE"], os.environ["TILE_SOURCE"] = "1", "bench_empty"
+    os.environ["RESULT_CACHE"] = "0"
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:" + "A" * 35)  # формат токена проверяет aiogram
+    return d
+
+class FakeMessage:
+    # Вместо types.Message: ответы бота только запоминаются (вид, размер, момент)
+    def __init__(self):
+        self.sent = []
+
+    async def answer(self, text, **kwargs):
+        self.sent.append(("text", len(text), time.perf_counter()))
+
+    async def answer_photo(self, photo, **kwargs):
+        self.sent.append(("photo", len(photo.data), time.perf_counter()))
+
+    async def answer_document(self, document, **kwargs):
+        self.sent.append(("document", len(document.data), time.perf_counter()))
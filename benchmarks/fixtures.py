@@ -0,0 +1,169 @@
+# Фикстуры для бенчмарков: ответы Overpass и Nominatim, большие KML.
+# Записанный ответ (benchmarks/fixtures/<name>.json.gz, nominatim_<name>.json) используется, если он есть;
+# иначе детерминированно генерируется синтетический payload той же структуры.
+# Запись: python -m benchmarks.fixtures record <name> minlon minlat maxlon maxlat
+#         python -m benchmarks.fixtures record-nominatim <name> lat lon
+import gzip, json, os, sys
+import numpy as np
+
+from .common import BASE_LAT, BASE_LON
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# Плотность синтетики: шаг уличной сетки (м), число водотоков/ЛЭП/остановок/соцобъектов
+PROFILES = {
+    "rural": dict(street_m=400, rivers=4, lines=3, stops=20, socials=5, places=6),
+    "suburban": dict(street_m=60, rivers=12, lines=10, stops=300, socials=60, places=15),
+    "urban": dict(street_m=35, rivers=8, lines=6, stops=900, socials=250, places=4),
+}
+
+def _way(i, tags, lons, lats):
+    return {"type": "way", "id": i, "tags": tags,
+            "geometry": [{"lat": float(la), "lon": float(lo)} for lo, la in zip(lons, lats)]}
+
+def _node(i, tags, lon, lat):
+    return {"type": "node", "id": i, "lat": float(lat), "lon": float(lon), "tags": tags}
+
+def synthetic_overpass(name="suburban", half_km=2.0, lat=BASE_LAT, lon=BASE_LON, seed=0):
+    p = PROFILES[name]
+    rng = np.random.default_rng(seed)
+    dlat = half_km * 1000 / 111_000.0
+    dlon = half_km * 1000 / (111_000.0 * np.cos(np.radians(lat)))
+    minx, maxx, miny, maxy = lon - dlon, lon + dlon, lat - dlat, lat + dlat
+    els, i = [], 1
+    # Уличная сетка: каждый квартал — отдельный way (как в OSM, улицы порезаны перекрёстками)
+    n = max(2, int(2 * half_km * 1000 / p["street_m"]))
+    gx, gy = np.linspace(minx, maxx, n), np.linspace(miny, maxy, n)
+    for k in range(n):
+        hw = "secondary" if k % 10 == 0 else ("tertiary" if k % 5 == 0 else "residential")
+        for j in range(n - 1):
+            jitter = rng.normal(0, 2e-5, 3)
+            els.append(_way(i, {"highway": hw}, [gx[k] + jitter[0]] * 3, np.linspace(gy[j], gy[j + 1], 3))); i += 1
+            els.append(_way(i, {"highway": "service" if j % 3 else hw},
+                            np.linspace(gx[j], gx[j + 1], 3), [gy[k] + jitter[1]] * 3)); i += 1
+    for _ in range(p["rivers"]):
+        xs = np.linspace(minx, maxx, 40)
+        ys = rng.uniform(miny, maxy) + np.cumsum(rng.normal(0, dlat / 60, 40))
+        els.append(_way(i, {"waterway": "stream"}, xs, ys)); i += 1
+        cx, cy, r = rng.uniform(minx, maxx), rng.uniform(miny, maxy), dlat / 40
+        t = np.linspace(0, 2 * np.pi, 24)
+        ring_x, ring_y = cx + r * np.cos(t) * 1.7, cy + r * np.sin(t)
+        els.append(_way(i, {"natural": "water"}, ring_x, ring_y)); i += 1
+    for _ in range(p["lines"]):
+        ys = np.linspace(miny, maxy, 30)
+        els.append(_way(i, {"power": "line"}, rng.uniform(minx, maxx) + np.linspace(0, dlon / 5, 30), ys)); i += 1
+        els.append(_node(i, {"power": "substation"}, rng.uniform(minx, maxx), rng.uniform(miny, maxy))); i += 1
+    for _ in range(p["stops"]):
+        els.append(_node(i, {"highway": "bus_stop"}, rng.uniform(minx, maxx), rng.uniform(miny, maxy))); i += 1
+    for k in range(p["socials"]):
+        els.append(_node(i, {"amenity": ("school", "kindergarten", "clinic", "hospital")[k % 4]},
+                         rng.uniform(minx, maxx), rng.uniform(miny, maxy))); i += 1
+    for _ in range(p["places"]):
+        els.append(_node(i, {"place": "village"}, rng.uniform(minx, maxx), rng.uniform(miny, maxy))); i += 1
+    return {"version": 0.6, "generator": "synthetic", "elements": els}
+
+def load_overpass(name="suburban"):
+    path = os.path.join(FIXTURE_DIR, f"{name}.json.gz")
+    if os.path.exists(path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    return synthetic_overpass(name)
+
+def record(name, bbox):
+    from bot.services import osm
+    # Сырой ответ Overpass (dict); бот получает его уже в колонках (osm_columns)
+    data = osm._query_overpass(bbox)
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    path = os.path.join(FIXTURE_DIR, f"{name}.json.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    return path
+
+def synthetic_nominatim(name="suburban", lat=BASE_LAT, lon=BASE_LON):
+    # Ответ reverse (format=jsonv2, addressdetails=1) — поля, которые читают бот и отчёт
+    village = {"rural": "деревня Полевая", "suburban": "деревня Тестовая", "urban": "Видное"}[name]
+    address = {"village" if name != "urban" else "town": village, "municipality": "Ленинский городской округ",
+               "state": "Московская область", "ISO3166-2-lvl4": "RU-MOS", "country": "Россия", "country_code": "ru"}
+    return {"place_id": 1, "licence": "Data © OpenStreetMap contributors, ODbL 1.0", "osm_type": "relation",
+            "osm_id": 1, "lat": f"{lat:.7f}", "lon": f"{lon:.7f}", "category": "boundary", "type": "administrative",
+            "place_rank": 16, "addresstype": "village", "name": village,
+            "display_name": f"{village}, Ленинский городской округ, Московская область, Россия",
+            "address": address, "boundingbox": [f"{lat - 0.01:.7f}", f"{lat + 0.01:.7f}",
+                                                f"{lon - 0.01:.7f}", f"{lon + 0.01:.7f}"]}
+
+def load_nominatim(name="suburban"):
+    path = os.path.join(FIXTURE_DIR, f"nominatim_{name}.json")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return synthetic_nominatim(name)
+
+def record_nominatim(name, lat, lon):
+    from bot.services import geocoding
+    data = geocoding.reverse_geocode(lat, lon)
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    path = os.path.join(FIXTURE_DIR, f"nominatim_{name}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    return path
+
+def write_big_kml(path, parcels=5000, first_vertices=20000, seed=0):
+    # KML как из кадастровой выгрузки: первый участок с очень подробным контуром, дальше — много обычных
+    rng = np.random.default_rng(seed)
+    def ring(cx, cy, n, r):
+        t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+        rr = r * (1 + 0.05 * rng.standard_normal(n))
+        xs, ys = cx + rr * np.cos(t) * 1.8, cy + rr * np.sin(t)
+        return " ".join(f"{x:.7f},{y:.7f},0" for x, y in zip(np.append(xs, xs[0]), np.append(ys, ys[0])))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://www.opengis.net/kml/2.2"><Document>\n')
+        for i in range(parcels):
+            n = first_vertices if i == 0 else int(rng.integers(5, 40))
+            cx, cy = BASE_LON + (i % 70) * 2e-3, BASE_LAT + (i // 70) * 1.2e-3
+            f.write(f"<Placemark><name>{i}</name><Polygon><outerBoundaryIs><LinearRing><coordinates>"
+                    f"{ring(cx, cy, n, 4e-4)}</coordinates></LinearRing></outerBoundaryIs></Polygon></Placemark>\n")
+        f.write("</Document></kml>\n")
+    return path
+
+def write_geocoder_extract(path, half_km=20.0, lat=BASE_LAT, lon=BASE_LON, seed=0):
+    # GeoJSON как из `osmium export`: страна/регион/округа (admin_level 2/4/6/8), н.п. и именованные улицы
+    rng = np.random.default_rng(seed)
+    dlat = half_km * 1000 / 111_000.0
+    dlon = half_km * 1000 / (111_000.0 * np.cos(np.radians(lat)))
+    def box(x0, y0, x1, y1):
+        return {"type": "Polygon", "coordinates": [[[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]]}
+    def feat(props, geom):
+        return {"type": "Feature", "properties": props, "geometry": geom}
+    minx, miny, maxx, maxy = lon - dlon, lat - dlat, lon + dlon, lat + dlat
+    feats = [feat({"boundary": "administrative", "admin_level": "2", "name": "Россия"}, box(30, 45, 50, 65)),
+             feat({"boundary": "administrative", "admin_level": "4", "name": "Московская область"},
+                  box(minx - 1, miny - 1, maxx + 1, maxy + 1))]
+    # Округа 4×4 и поселения 8×8 внутри
+    for k, n, level, title in ((0, 4, "6", "городской округ {}"), (1, 8, "8", "сельское поселение {}")):
+        xs, ys = np.linspace(minx, maxx, n + 1), np.linspace(miny, maxy, n + 1)
+        for i in range(n):
+            for j in range(n):
+                feats.append(feat({"boundary": "administrative", "admin_level": level,
+                                   "name": title.format(f"{k}-{i}-{j}")}, box(xs[i], ys[j], xs[i + 1], ys[j + 1])))
+    kinds = ["town"] * 6 + ["village"] * 120 + ["hamlet"] * 300
+    for i, kind in enumerate(kinds):
+        feats.append(feat({"place": kind, "name": f"{kind} {i}"},
+                          {"type": "Point", "coordinates": [rng.uniform(minx, maxx), rng.uniform(miny, maxy)]}))
+    for i in range(3000):
+        x, y = rng.uniform(minx, maxx), rng.uniform(miny, maxy)
+        dx, dy = rng.normal(0, 2e-3, 2)
+        feats.append(feat({"highway": "residential", "name": f"улица {i}"},
+                          {"type": "LineString", "coordinates": [[x, y], [x + dx, y + dy], [x + 2 * dx, y]]}))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"type": "FeatureCollection", "features": feats}, f, ensure_ascii=False)
+    return path
+
+if __name__ == "__main__":
+    if len(sys.argv) == 7 and sys.argv[1] == "record":
+        print(record(sys.argv[2], tuple(float(v) for v in sys.argv[3:])))
+    elif len(sys.argv) == 5 and sys.argv[1] == "record-nominatim":
+        print(record_nominatim(sys.argv[2], float(sys.argv[3]), float(sys.argv[4])))
+    else:
+        print("usage: python -m benchmarks.fixtures record <name> minlon minlat maxlon maxlat\n"
+              "       python -m benchmarks.fixtures record-nominatim <name> lat lon")
+        sys.exit(2)
@@ -0,0 +1,151 @@
+# Сквозной набор бенчмарков на записанных фикстурах: офлайн и повторяемо (Overpass/Nominatim из
+# benchmarks/fixtures или синтетика, синтетический SRTM-тайл, подложка карты — пустая, без сети).
+# По каждому случаю — перцентили задержки; в конце пиковый RSS. Сравнение с сохранённым baseline
+# по p50: рост больше --tolerance — регрессия (код выхода 1).
+# Коммит, который намеренно меняет производительность, перезаписывает baseline (--save-baseline)
+# на той же машине — иначе набор перестаёт быть проверкой.
+#
+#   python -m benchmarks.suite                         # прогон + сравнение с benchmarks/baseline.json
+#   python -m benchmarks.suite --save-baseline         # записать текущие результаты как baseline
+#   python -m benchmarks.suite --only dem,e2e --repeat 50
+import os, sys, json, time, asyncio, argparse, platform
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+def _cases(work_dir):
+    from bot.services import dem, metrics, map_render, pdf, osm_columns
+    from .common import synthetic_dem_dir, square_parcel
+    from .fixtures import load_overpass, load_nominatim, write_big_kml
+    synthetic_dem_dir()
+    raw = {name: load_overpass(name) for name in ("rural", "suburban", "urban")}
+    # Стадии получают OSM в колонках — как из кэша тайлов (bot/services/osm.py)
+    osm = {name: osm_columns.of(d) for name, d in raw.items()}
+    npz = osm["urban"].to_npz()
+    addr = load_nominatim("suburban")
+    parcel, big = square_parcel(1), square_parcel(25)
+    kml = write_big_kml(os.path.join(work_dir, "big.kml"))
+    dem_stats = dem.compute_dem_stats(parcel)
+    m = metrics.compute_all(parcel, osm["suburban"], dem_stats)
+    png = map_render.render_map(parcel, osm["suburban"])
+    roads = metrics.CATEGORIES["roads_all"]
+    # имя → (функция без аргументов, доля от --repeat: тяжёлые случаи гоняются реже)
+    cases = {
+        "dem.compute_dem_stats[1ha]": (lambda: dem.compute_dem_stats(parcel), 1.0),
+        "dem.compute_dem_stats[25ha]": (lambda: dem.compute_dem_stats(big), 1.0),
+        **{f"metrics.compute_all[{n}]": ((lambda d=d: metrics.compute_all(parcel, d, dem_stats)), 1.0)
+           for n, d in osm.items()},
+        "metrics._collect_geoms[urban]": (lambda: metrics._collect_geoms(raw["urban"], roads), 1.0),
+        "osm_columns.from_elements[urban]": (lambda: osm_columns.from_elements(raw["urban"]["elements"]), 1.0),
+        "osm_columns.from_npz[urban]": (lambda: osm_columns.from_npz(npz), 1.0),
+        "map_render.render_map[suburban]": (lambda: map_render.render_map(parcel, osm["suburban"]), 1.0),
+        "metrics.read_polygon_from_file[big.kml]": (lambda: metrics.read_polygon_from_file(kml), 1.0),
+        "metrics.iter_polygons_from_file[big.kml]": (lambda: sum(1 for _ in metrics.iter_polygons_from_file(kml)),
+                                                     0.25),
+        "pdf.render_report[map]": (lambda: pdf.render_report(m, addr, "bench", png), 1.0),
+    }
+    return cases, osm, addr
+
+def _e2e(osm, addr, repeat):
+    # run_pipeline_and_reply целиком (пул процессов, стадии, отправка) на фикстурах вместо сети
+    import bot.main as bm
+    from .common import square_parcel, peak_rss_mb, FakeMessage
+
+    async def fixture(v):
+        return v
+    bm.geocoding.reverse_geocode_async = lambda lat, lon: fixture(addr)
+    bm.osm.fetch_overpass_async = lambda bbox: fixture(osm["suburban"])
+
+    async def run():
+        bm.workers.start()
+        parcels = [square_parcel(1, lat=55.55 + i * 1e-4) for i in range(repeat + 1)]
+        times = []
+        for i, g in enumerate(parcels):
+            msg = FakeMessage()
+            t0 = time.perf_counter()
+            await bm.run_pipeline_and_reply(msg, g, source="bench")
+            if i:  # первый — прогрев пула
+                times.append(time.perf_counter() - t0)
+            assert [s[0] for s in msg.sent] == ["text", "text", "photo", "document"], msg.sent
+        pids = list(getattr(bm.workers._pool, "_processes", None) or {})
+        return times, max((peak_rss_mb(p) or 0 for p in pids), default=0)
+    try:
+        return asyncio.run(run())
+    finally:
+        bm.workers.shutdown()
+
+def compare(results, baseline, tolerance):
+    # [(случай, p50 сейчас, p50 в baseline, отношение)] и есть ли регрессии
+    rows, regressed = [], False
+    for name, r in results.items():
+        b = baseline.get("results", {}).get(name)
+        if b is None:
+            rows.append((name, r["p50"], None, None))
+            continue
+        ratio = r["p50"] / b["p50"] if b["p50"] else float("inf")
+        regressed |= ratio > 1 + tolerance
+        rows.append((name, r["p50"], b["p50"], ratio))
+    return rows, regressed
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline benchmark suite with baseline comparison")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--only", default="", help="comma-separated substrings of case names (e2e included)")
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown vs baseline")
+    ap.add_argument("--json", help="also write results here")
+    args = ap.parse_args()
+
+    from .common import offline_env, sample, percentiles, peak_rss_mb
+    work_dir = offline_env()
+    only = [s for s in args.only.split(",") if s]
+    pick = lambda name: not only or any(s in name for s in only)
+
+    cases, osm, addr = _cases(work_dir)
+    results, worker_rss = {}, 0
+    for name, (fn, share) in cases.items():
+        if pick(name):
+            results[name] = percentiles(sample(fn, repeat=max(3, int(args.repeat * share))))
+            print(f"{name:<42} p50 {results[name]['p50']:8.1f} ms  p90 {results[name]['p90']:8.1f}  "
+                  f"p99 {results[name]['p99']:8.1f}  max {results[name]['max']:8.1f}", flush=True)
+    name = "e2e.run_pipeline_and_reply[suburban]"
+    if pick(name):
+        times, worker_rss = _e2e(osm, addr, max(3, args.repeat // 2))
+        results[name] = percentiles(times)
+        print(f"{name:<42} p50 {results[name]['p50']:8.1f} ms  p90 {results[name]['p90']:8.1f}  "
+              f"p99 {results[name]['p99']:8.1f}  max {results[name]['max']:8.1f}")
+    own = peak_rss_mb()
+    print(f"peak RSS: {own:.0f} MB (this process), {worker_rss:.0f} MB (largest pool worker)")
+
+    report = {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+              "repeat": args.repeat, "peak_rss_mb": round(own, 1), "peak_rss_worker_mb": round(worker_rss, 1),
+              "results": {k: {p: round(v, 3) for p, v in r.items()} for k, r in results.items()}}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        print(f"baseline saved: {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline} (run with --save-baseline)")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    rows, regressed = compare(results, baseline, args.tolerance)
+    print(f"\nvs baseline ({baseline.get('machine')}, {baseline.get('cpus')} CPU, python {baseline.get('python')}):")
+    for name, now, was, ratio in rows:
+        if ratio is None:
+            print(f"{name:<42} {now:8.1f} ms  (new)")
+        else:
+            flag = "REGRESSION" if ratio > 1 + args.tolerance else ("faster" if ratio < 1 - args.tolerance else "")
+            print(f"{name:<42} {now:8.1f} ms  was {was:8.1f}  x{ratio:4.2f} {flag}")
+    rss_was = baseline.get("peak_rss_mb")
+    if rss_was:
+        print(f"peak RSS {own:.0f} MB, was {rss_was:.0f} MB")
+    if regressed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
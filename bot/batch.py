@@ -0,0 +1,226 @@
+# Пакетный скоринг участков без Telegram:
+#   python -m bot.batch parcels.geojson [more.kml ...] -o scores.csv|scores.geojson
+# Участки группируются в кластеры по тайлам сетки (BATCH_CLUSTER_ZOOM): на кластер — одна
+# выгрузка OSM и одна сетка DEM. Результаты дописываются в выходной файл по мере расчёта;
+# при повторном запуске с тем же -o уже посчитанные участки (по id) пропускаются.
+# Сырые измерения сохраняются в хранилище снимков (bot/storage/snapshots.py) — пересчёт по другому
+# профилю потом не требует OSM/DEM: python -m bot.storage.snapshots rescore agri out.csv
+# --pdf report.pdf — сводный PDF по участкам, посчитанным в этом запуске (--pdf-maps — с картами).
+import os, sys, csv, json, time, asyncio, logging, argparse
+from dotenv import load_dotenv
+from shapely.geometry import mapping
+from .services import metrics, dem, osm, http_client, scoring, map_render, pdf, projection
+from .storage import snapshots
+
+BATCH_CLUSTER_ZOOM = int(os.getenv("BATCH_CLUSTER_ZOOM", "12"))  # z12 ≈ 10 км по долготе
+PROGRESS_EVERY_S = 5.0
+
+FIELDS = ["id", "snapshot_key", "profile", "area_ha", "score_total", "score_access", "score_flood",
+          "score_slope", "score_infra", "score_power", "score_road", "d_road_m", "d_water_m", "d_power_m",
+          "d_stop_m", "d_place_m", "touches_road", "facade_len_m", "can_house_10x10", "slope_mean_pct",
+          "slope_p90_pct", "rel_lowness_m", "wetness_idx", "error"]
+
+def load_parcels(paths):
+    # [(id, геометрия)]; повторяющиеся id получают суффикс #n
+    seen, out = {}, []
+    for path in paths:
+        for fid, _, geom in metrics.iter_polygons_from_file(path):
+            n = seen.get(fid, 0)
+            seen[fid] = n + 1
+            out.append((fid if n == 0 else f"{fid}#{n}", geom))
+    return out
+
+def cluster_parcels(parcels, zoom=BATCH_CLUSTER_ZOOM):
+    clusters = {}
+    for pid, geom in parcels:
+        c = geom.centroid
+        clusters.setdefault(osm._tile_xy(c.x, c.y, zoom), []).append((pid, geom))
+    return [clusters[k] for k in sorted(clusters)]
+
+def flat_row(pid, m=None, error=None, key=None):
+    row = {k: None for k in FIELDS}
+    row["id"] = pid
+    row["snapshot_key"] = key
+    if m is not None:
+        row["profile"] = m.get("profile")
+        d = m.get("dem") or {}
+        row.update({k: m.get(k) for k in ("area_ha", "d_road_m", "d_water_m", "d_power_m", "d_stop_m",
+                                          "d_place_m", "touches_road", "facade_len_m", "can_house_10x10")})
+        row.update({f"score_{k}": v for k, v in m["score"].items() if f"score_{k}" in row})
+        row.update({k: d.get(k) for k in ("slope_mean_pct", "slope_p90_pct", "rel_lowness_m", "wetness_idx")})
+    row["error"] = error
+    return row
+
+# --- вывод: CSV или GeoJSON FeatureCollection, по одному объекту на строку ---
+
+class CsvWriter:
+    # При дозаписи файл переписывается без строк с ошибкой (они посчитаются заново)
+    # и без оборванной последней строки прерванного запуска
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        rows = []
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, newline="", encoding="utf-8") as f:
+                rows = [r for r in csv.DictReader(f) if None not in r.values() and not r.get("error")]
+            self.done = {r["id"] for r in rows}
+        self.f = open(path, "w", newline="", encoding="utf-8")
+        self.w = csv.DictWriter(self.f, fieldnames=FIELDS)
+        self.w.writeheader()
+        self.w.writerows(rows)
+        self.f.flush()
+
+    def write(self, row, geom):
+        self.w.writerow(row)
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+class GeoJsonWriter:
+    # Первая строка — заголовок коллекции, дальше по Feature на строку (со 2-й — с запятой впереди),
+    # последняя — "]}". При дозаписи закрывающая строка отрезается и возвращается в конце; Feature
+    # с ошибкой выбрасываются (посчитаются заново), оборванная последняя строка — тоже.
+    HEAD, TAIL = '{"type": "FeatureCollection", "features": [\n', "]}\n"
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        lines = []
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        body = [l.lstrip(",") for l in lines[1:] if l.strip() and l.strip() != self.TAIL.strip()]
+        kept = []
+        for i, l in enumerate(body):
+            try:
+                props = json.loads(l)["properties"]
+            except ValueError:
+                if i == len(body) - 1:
+                    logging.warning("%s: dropping truncated last feature", path)
+                    break
+                raise
+            if not props.get("error"):
+                self.done.add(props["id"])
+                kept.append(l)
+        self.count = len(kept)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.HEAD)
+            f.writelines(("," if i else "") + l + "\n" for i, l in enumerate(kept))
+        self.f = open(path, "a", encoding="utf-8")
+
+    def write(self, row, geom):
+        feat = {"type": "Feature", "geometry": mapping(geom), "properties": row}
+        self.f.write(("," if self.count else "") + json.dumps(feat, ensure_ascii=False) + "\n")
+        self.f.flush()
+        self.count += 1
+
+    def close(self):
+        self.f.write(self.TAIL)
+        self.f.close()
+
+def open_writer(path):
+    return GeoJsonWriter(path) if path.lower().endswith(("json", "geojson")) else CsvWriter(path)
+
+# --- расчёт ---
+
+def score_cluster(cluster, osm_data, step_m=30.0, buffer_m=200, profile=scoring.DEFAULT_PROFILE, maps=False):
+    # Одна сетка DEM на bbox всего кластера (с буфером) и один STRtree-индекс OSM
+    # Зона UTM — одна на кластер, по центру его bbox: участки у границы зон не перестраивают индекс
+    minx, miny, maxx, maxy = _cluster_bbox(cluster, 0)
+    epsg = projection.utm_epsg((minx + maxx) / 2, (miny + maxy) / 2)
+    ctxs = projection.contexts([g for _, g in cluster], epsg)
+    b = [x.parcel_utm.buffer(buffer_m).bounds for x in ctxs]
+    bounds = (min(x[0] for x in b), min(x[1] for x in b), max(x[2] for x in b), max(x[3] for x in b))
+    grid = dem.sample_grid(bounds, ctxs[0].to_wgs, step_m)
+    index = metrics.build_osm_index(osm_data, epsg)
+    done = []
+    for (pid, geom), ctx in zip(cluster, ctxs):
+        try:
+            ds = dem.grid_stats(grid, ctx.parcel_utm, buffer_m, (geom.centroid.x, geom.centroid.y))
+            m = metrics.compute_all(geom, osm_data, ds, index, profile, ctx=ctx)
+            key = snapshots.geometry_key(geom)
+            done.append((key, m, geom, pid))
+            yield pid, geom, flat_row(pid, m, key=key), (m, map_render.render_map(geom, osm_data) if maps else None)
+        except Exception as e:
+            logging.exception("parcel %s failed", pid)
+            yield pid, geom, flat_row(pid, error=str(e) or type(e).__name__), None
+    snapshots.save_many(done)
+
+def _cluster_bbox(cluster, meters=2000):
+    b = [g.bounds for _, g in cluster]
+    bbox = (min(x[0] for x in b), min(x[1] for x in b), max(x[2] for x in b), max(x[3] for x in b))
+    return metrics.expand_bbox(bbox, meters=meters) if meters else bbox
+
+async def run_batch(paths, out_path, zoom=BATCH_CLUSTER_ZOOM, step_m=30.0, profile=scoring.DEFAULT_PROFILE,
+                    pdf_path=None, pdf_maps=False):
+    writer = open_writer(out_path)
+    report = []  # (id, metric_set, адрес, карта) для --pdf
+    parcels = load_parcels(paths)
+    todo = [(pid, g) for pid, g in parcels if pid not in writer.done]
+    clusters = cluster_parcels(todo, zoom)
+    logging.info("%d parcels, %d already done, %d clusters", len(parcels), len(parcels) - len(todo), len(clusters))
+    t0 = last = time.perf_counter()
+    n = failed = 0
+    try:
+        # OSM следующего кластера грузится, пока считается текущий
+        nxt = asyncio.ensure_future(osm.fetch_overpass_async(_cluster_bbox(clusters[0]))) if clusters else None
+        for i, cluster in enumerate(clusters):
+            cur = nxt
+            nxt = (asyncio.ensure_future(osm.fetch_overpass_async(_cluster_bbox(clusters[i + 1])))
+                   if i + 1 < len(clusters) else None)
+            try:
+                osm_data = await cur
+            except Exception as e:
+                # Кластер не отмечается сделанным — его участки посчитаются при следующем запуске
+                logging.error("cluster %d/%d: OSM fetch failed: %s", i + 1, len(clusters), e)
+                failed += len(cluster)
+                continue
+            rows = await asyncio.to_thread(lambda: list(score_cluster(cluster, osm_data, step_m, profile=profile,
+                                                                      maps=pdf_path is not None and pdf_maps)))
+            for pid, geom, row, extra in rows:
+                writer.write(row, geom)
+                # Участок с ошибкой не считается сделанным: при повторном запуске посчитается заново
+                failed += row["error"] is not None
+                if pdf_path and extra is not None:
+                    report.append((pid, extra[0], None, extra[1]))
+            n += len(rows)
+            now = time.perf_counter()
+            if now - last >= PROGRESS_EVERY_S or i + 1 == len(clusters):
+                last = now
+                logging.info("%d/%d parcels, %.1f parcels/s", n, len(todo), n / max(now - t0, 1e-9))
+        if nxt is not None:
+            nxt.cancel()
+        if pdf_path and report:
+            t1 = time.perf_counter()
+            data = await asyncio.to_thread(pdf.render_batch_report, report, ", ".join(os.path.basename(p) for p in paths))
+            with open(pdf_path, "wb") as f:
+                f.write(data)
+            logging.info("PDF: %d parcels, %d KB in %.1fs", len(report), len(data) // 1024, time.perf_counter() - t1)
+    finally:
+        writer.close()
+        await http_client.close()
+    dt = time.perf_counter() - t0
+    return {"parcels": n, "skipped": len(parcels) - len(todo), "failed": failed,
+            "seconds": dt, "parcels_per_s": n / dt if dt > 0 else 0.0}
+
+def main(argv=None):
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    ap = argparse.ArgumentParser(prog="python -m bot.batch", description="Пакетный скоринг участков")
+    ap.add_argument("inputs", nargs="+", help="GeoJSON/KML с участками")
+    ap.add_argument("-o", "--out", required=True, help="scores.csv или scores.geojson (дозапись при повторном запуске)")
+    ap.add_argument("--cluster-zoom", type=int, default=BATCH_CLUSTER_ZOOM)
+    ap.add_argument("--step", type=float, default=30.0, help="шаг сетки DEM, м")
+    ap.add_argument("--profile", choices=sorted(scoring.PROFILES), default=scoring.DEFAULT_PROFILE)
+    ap.add_argument("--pdf", help="сводный PDF-отчёт по участкам этого запуска")
+    ap.add_argument("--pdf-maps", action="store_true", help="карта на странице каждого участка (тайлы подложки)")
+    args = ap.parse_args(argv)
+    res = asyncio.run(run_batch(args.inputs, args.out, args.cluster_zoom, args.step, args.profile,
+                                args.pdf, args.pdf_maps))
+    print(f"{res['parcels']} parcels in {res['seconds']:.1f}s ({res['parcels_per_s']:.1f} parcels/s), "
+          f"{res['skipped']} skipped as done, {res['failed']} failed")
+    return 1 if res["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
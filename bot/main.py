@@ -1,21 +1,24 @@
-import os, json, asyncio, logging
+import os, json, time, asyncio, logging
 from dotenv import load_dotenv
-from shapely.geometry import shape
+from shapely.geometry import shape, mapping
 from aiogram import Bot, Dispatcher, F, Router, types
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.filters import Command, CommandStart, StateFilter
 from aiogram.types import (
-    InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo, FSInputFile,
-    ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove, AllowedUpdates
+    InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo, BufferedInputFile,
+    ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
 )
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiohttp import web 
 
 from . import states
-from .services import geocoding, osm, dem, metrics, pdf, map_render
-from .storage.cache import ensure_dirs
+# dem, map_render, heatmap (pyproj, Pillow) импортируются по месту: бот отвечает раньше, модули грузит прогрев
+from .services import (geocoding, osm, metrics, http_client, stages, workers, jobs, scoring,
+                       singleflight, telemetry, profiler, warmup)
+from .storage.cache import ensure_dirs, cache_stats
+from .storage import snapshots, results, geocoder_index
 from .providers.external import get_geometry_by_cadnum
 
 load_dotenv()
@@ -56,11 +59,19 @@ router = Router()
 dp.include_router(router)
 ensure_dirs()
 
+async def health(request):
+    # Жив всегда 200; /health?ready=1 — проба готовности: 503, пока идёт прогрев
+    status = 503 if request.query.get("ready") and not warmup.ready() else 200
+    return web.json_response(warmup.STATE, status=status)
+
 async def start_web():
     app = web.Application()
     # Отдаём папку webapp на корне /
     app.add_routes([
-        web.get("/health", lambda request: web.Response(text="ok")),
+        web.get("/health", health),
+        # Prometheus: стадии пайплайна, upstream'ы, кэши, очередь
+        web.get("/metrics", lambda request: web.Response(body=telemetry.render().encode("utf-8"),
+                                                         headers={"Content-Type": telemetry.CONTENT_TYPE})),
         web.static("/", path="webapp", show_index=True),
     ])
     runner = web.AppRunner(app)
@@ -88,7 +99,10 @@ def main_keyboard() -> InlineKeyboardMarkup:
         InlineKeyboardButton(text="📍 Точка + площадь", callback_data="point_area"),
         InlineKeyboardButton(text="🔎 КН → контур", callback_data="cadnum"),
     ])
-    rows.append([InlineKeyboardButton(text="📊 Компаративы", callback_data="comps")])
+    rows.append([
+        InlineKeyboardButton(text="📊 Компаративы", callback_data="comps"),
+        InlineKeyboardButton(text="🔥 Тепловая карта", callback_data="heatmap"),
+    ])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 @router.callback_query(F.data == "point_area")
@@ -117,7 +131,7 @@ async def webapp_data_fallback(m: types.Message):
             g = shape(payload)
         else:
             raise ValueError("Ожидался GeoJSON Feature/Polygon")
-        await run_pipeline_and_reply(m, g, source="webapp")
+        await submit_pipeline(m, g, source="webapp")
     except Exception as e:
         logging.exception("WEB_APP_DATA error")
         await m.answer(f"Ошибка WebApp данных: {e}")
@@ -157,7 +171,7 @@ async def point_area_area(m: types.Message, state: FSMContext):
         lat, lon = data["lat"], data["lon"]
         poly = metrics.square_from_point_area(lat, lon, area_sot)
         await state.clear()
-        await run_pipeline_and_reply(m, poly, source="point+area")
+        await submit_pipeline(m, poly, source="point+area")
     except Exception as e:
         await m.answer(f"Ошибка: {e}. Попробуйте снова или /start")
         await state.clear()
@@ -181,7 +195,7 @@ async def cadnum_handle(m: types.Message, state: FSMContext):
     if not geom:
         await m.answer("Пока нет подключённого провайдера КН→контур. Нарисуйте участок на карте или пришлите GeoJSON.")
     else:
-        await run_pipeline_and_reply(m, geom, source=f"cadnum:{cad}")
+        await submit_pipeline(m, geom, source=f"cadnum:{cad}")
     await state.clear()
 
 @router.message(F.document)
@@ -194,7 +208,7 @@ async def doc_handler(m: types.Message):
     try:
         await bot.download(doc, destination=path)
         poly = metrics.read_polygon_from_file(path)
-        await run_pipeline_and_reply(m, poly, source=os.path.basename(path))
+        await submit_pipeline(m, poly, source=os.path.basename(path))
     except Exception as e:
         await m.answer(f"Не удалось прочитать геометрию из файла: {e}")
 
@@ -208,10 +222,66 @@ async def webapp_data(m: types.Message):
             g = shape(payload)
         else:
             raise ValueError("Ожидался GeoJSON Feature/Polygon")
-        await run_pipeline_and_reply(m, g, source="webapp")
+        await submit_pipeline(m, g, source="webapp")
     except Exception as e:
         await m.answer(f"Ошибка WebApp данных: {e}")
 
+async def _heatmap_prompt(m: types.Message, state: FSMContext):
+    from .services import heatmap
+    await state.set_state(states.Heatmap.waiting_location)
+    km = heatmap.HEATMAP_SIZE_M / 1000
+    await m.answer(f"Отправьте центр области 📍 геопозицией или текстом «55.75, 37.61» — "
+                   f"оценим каждую клетку квадрата {km:g}×{km:g} км.", reply_markup=location_kb())
+
+@router.message(Command("heatmap"))
+async def heatmap_cmd(m: types.Message, state: FSMContext):
+    await _heatmap_prompt(m, state)
+
+@router.callback_query(F.data == "heatmap")
+async def heatmap_start(c: types.CallbackQuery, state: FSMContext):
+    await _heatmap_prompt(c.message, state)
+    await c.answer()
+
+@router.message(StateFilter(states.Heatmap.waiting_location))
+async def heatmap_loc(m: types.Message, state: FSMContext):
+    try:
+        if m.location:
+            lat, lon = m.location.latitude, m.location.longitude
+        else:
+            lat, lon = (float(v) for v in (m.text or "").replace(";", ",").split(","))
+    except ValueError:
+        await m.answer("Не понял координаты. Пример: 55.75, 37.61")
+        return
+    await state.clear()
+    await m.answer("Считаем тепловую карту…", reply_markup=ReplyKeyboardRemove())
+    job = jobs.Job(m.chat.id, _heatmap_run(m, lat, lon), replace_key="heatmap")
+    try:
+        await job_queue.submit(job)
+    except jobs.QueueFull as e:
+        await m.answer(str(e))
+
+def profile_kb(key, current=None) -> InlineKeyboardMarkup:
+    # Кнопки пересчёта по другим профилям скоринга из сохранённого снимка
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text=("✅ " if name == current else "") + p["title"], callback_data=f"rescore:{name}:{key}")
+        for name, p in scoring.PROFILES.items()
+    ]])
+
+@router.callback_query(F.data.startswith("rescore:"))
+async def rescore(c: types.CallbackQuery):
+    _, profile, key = c.data.split(":", 2)
+    snap = await asyncio.to_thread(snapshots.get, key)
+    if snap is None or profile not in scoring.PROFILES:
+        await c.answer("Данные участка не найдены — пришлите его заново.", show_alert=True)
+        return
+    ms = snapshots.metric_set(snap)
+    ms["profile"] = profile
+    ms["score"] = scoring.score_scalar(snapshots.measures(snap), profile)
+    text = metrics.format_brief(ms, {"display_name": snap["label"] or "нет адреса"})
+    if text != c.message.html_text:
+        await c.message.edit_text(text, reply_markup=profile_kb(key, profile))
+    await c.answer()
+
 @router.callback_query(F.data == "comps")
 async def comps_start(c: types.CallbackQuery, state: FSMContext):
     await state.set_state(states.Comps.collecting)
@@ -257,7 +327,7 @@ async def webapp_data_ct(m: types.Message):
         logging.info("Got WEB_APP_DATA (content_type): %s bytes", len(raw))
         payload = json.loads(raw)
         geom = shape(payload["geometry"]) if payload.get("type") == "Feature" else shape(payload)
-        await run_pipeline_and_reply(m, geom, source="webapp")
+        await submit_pipeline(m, geom, source="webapp")
     except Exception as e:
         logging.exception("WEB_APP_DATA error")
         await m.answer(f"Ошибка WebApp данных: {e}")
@@ -270,7 +340,7 @@ async def webapp_data_any(m: types.Message):
         logging.info("Got WEB_APP_DATA (fallback): %s bytes", len(raw))
         payload = json.loads(raw)
         geom = shape(payload["geometry"]) if payload.get("type") == "Feature" else shape(payload)
-        await run_pipeline_and_reply(m, geom, source="webapp")
+        await submit_pipeline(m, geom, source="webapp")
     except Exception as e:
         logging.exception("WEB_APP_DATA fallback error")
         await m.answer(f"Ошибка WebApp данных: {e}")
@@ -288,34 +358,215 @@ async def debug(m: types.Message):
     wa = getattr(m, "web_app_data", None)
     await m.answer(f"WEBAPP_URL={os.getenv('WEBAPP_URL')}\n"
                    f"Has web_app_data in last msg? {'yes' if wa else 'no'}")
+# Таймауты стадий пайплайна, секунды
+STAGE_TIMEOUTS = {"geocode": 30, "overpass": 120, "dem": 60, "metrics": 60, "map": 60, "pdf": 60, "heatmap": 180}
+
 async def run_pipeline_and_reply(m: types.Message, geom_wgs84, source: str = ""):
+    from .services import dem, map_render
     await m.answer("Обрабатываем участок… это займёт ~5–20 секунд.")
 
-
-    # 1) Адрес
     centroid = geom_wgs84.centroid
-    addr = await asyncio.to_thread(geocoding.reverse_geocode, centroid.y, centroid.x)
-    # 2) OSM по bbox
     bbox = metrics.expand_bbox(geom_wgs84.bounds, meters=2000)
-    osm_data = await asyncio.to_thread(osm.fetch_overpass, bbox)
-    # 3) DEM/уклон
-    dem_stats = await asyncio.to_thread(dem.compute_dem_stats, geom_wgs84)
-    # 4) Метрики
-    metric_set = await asyncio.to_thread(metrics.compute_all, geom_wgs84, osm_data, dem_stats)
-    # 5) Статичная карта
-    map_path = await asyncio.to_thread(map_render.render_static_map, geom_wgs84, osm_data, "cache/maps")
-    # 6) PDF
-    pdf_path = await asyncio.to_thread(pdf.render_report, metric_set, addr, source, map_path)
-    text = metrics.format_brief(metric_set, addr)
-    await m.answer_photo(photo=FSInputFile(map_path), caption=text)
-    if pdf_path and os.path.exists(pdf_path):
-        await m.answer_document(document=FSInputFile(pdf_path))
+    key = snapshots.geometry_key(geom_wgs84)
+    T = STAGE_TIMEOUTS
+
+    # Ответы уходят по мере готовности: краткий итог — сразу после метрик, не дожидаясь карты и PDF
+    async def send_brief(r):
+        kb = profile_kb(r["snapshot"], r["metrics"].get("profile")) if r["snapshot"] else None
+        await m.answer(metrics.format_brief(r["metrics"], r["geocode"]), reply_markup=kb)
+
+    async def save_snapshot(r):
+        # Сырые измерения — для мгновенного пересчёта по другому профилю
+        label = (r["geocode"] or {}).get("display_name", "")
+        await asyncio.to_thread(snapshots.save, key, r["metrics"], geom_wgs84, label)
+        return key
+
+    async def store_result(r):
+        # Полный ответ — в кэш: повторная отправка участка не пойдёт в пайплайн. Ответ, где DEM
+        # или адрес заменены пустым значением по умолчанию (сбой/таймаут стадии), не кэшируется
+        if r["map"] and r["pdf"] and r["dem"] and r["geocode"]:
+            brief = metrics.format_brief(r["metrics"], r["geocode"])
+            await asyncio.to_thread(results.put, results.result_key(key, source), r["metrics"], brief,
+                                    r["map"], f"map.{map_render.MAP_FORMAT}",
+                                    r["pdf"], osm.tiles_for_bbox(bbox), osm.OSM_TILE_ZOOM)
+
+    async def send_map(r):
+        if r["map"]:
+            await m.answer_photo(photo=BufferedInputFile(r["map"], f"map.{map_render.MAP_FORMAT}"))
+
+    async def send_pdf(r):
+        if r["pdf"]:
+            await m.answer_document(document=BufferedInputFile(r["pdf"], "report.pdf"))
+
+    # Граф стадий: geocode ∥ (overpass → metrics/map) ∥ dem ∥ basemap; metrics ждёт и DEM, map — подложку
+    graph = [
+        # 1) Адрес — не критичен: при сбое отчёт уйдёт без адреса
+        stages.Stage("geocode", lambda r: geocoding.reverse_geocode_async(centroid.y, centroid.x),
+                     timeout=T["geocode"], default={}),
+        # 2) OSM по bbox
+        stages.Stage("overpass", lambda r: osm.fetch_overpass_async(bbox), timeout=T["overpass"]),
+        # 3) DEM/уклон
+        stages.Stage("dem", lambda r: dem.compute_dem_stats_async(geom_wgs84), timeout=T["dem"], default={}),
+        # 4) Метрики
+        stages.Stage("metrics", lambda r: workers.compute_all(geom_wgs84, r["overpass"], r["dem"]),
+                     deps=("overpass", "dem"), timeout=T["metrics"]),
+        stages.Stage("snapshot", save_snapshot, deps=("metrics", "geocode"), default=None),
+        stages.Stage("brief", send_brief, deps=("metrics", "geocode", "snapshot")),
+        # 5) Статичная карта — нужны только данные OSM и тайлы подложки; без карты итог всё равно отправим.
+        # Тайлы грузятся здесь, параллельно с OSM (общий пул и лимит); без них — пустая подложка
+        stages.Stage("basemap", lambda r: map_render.fetch_basemap(geom_wgs84), timeout=T["map"], default=({}, {})),
+        stages.Stage("map", lambda r: workers.render_map(geom_wgs84, r["overpass"], r["basemap"]),
+                     deps=("overpass", "basemap"), timeout=T["map"], default=None),
+        # 6) PDF
+        stages.Stage("pdf", lambda r: workers.render_report(r["metrics"], r["geocode"], source, r["map"]),
+                     deps=("metrics", "geocode", "map"), timeout=T["pdf"], default=None),
+        # Порядок сообщений в чате: итог → карта → PDF
+        stages.Stage("send_map", send_map, deps=("brief", "map")),
+        stages.Stage("send_pdf", send_pdf, deps=("send_map", "pdf")),
+        stages.Stage("store", store_result, deps=("metrics", "geocode", "map", "pdf"), default=None),
+    ]
+    timings = {}
+    try:
+        with telemetry.PIPELINE_INFLIGHT.track(), telemetry.PIPELINE_SECONDS.time(), \
+                profiler.profile(f"pipeline {source} {key}"):
+            await stages.run_stages(graph, timings)
+    finally:
+        logging.info("pipeline %s: %s", source, ", ".join(f"{k}={v:.2f}s" for k, v in timings.items()))
+
+class ChatReplier:
+    # Замена types.Message для заданий, восстановленных из хранилища после перезапуска
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+
+    async def answer(self, text, **kwargs):
+        return await bot.send_message(self.chat_id, text, **kwargs)
+
+    async def answer_photo(self, photo, **kwargs):
+        return await bot.send_photo(self.chat_id, photo, **kwargs)
+
+    async def answer_document(self, document, **kwargs):
+        return await bot.send_document(self.chat_id, document, **kwargs)
+
+job_queue = jobs.JobQueue()
+
+@telemetry.collector
+def _queue_metrics():
+    st = job_queue.stats()
+    return [
+        ("job_queue_depth", "gauge", "Jobs waiting in the queue", [({}, st["depth"])]),
+        ("job_queue_running", "gauge", "Jobs running now", [({}, st["running"])]),
+        ("job_queue_wait_seconds", "gauge", "Queue wait over the last 1000 jobs",
+         [({"quantile": "0.5"}, st["wait_p50_s"]), ({"quantile": "0.95"}, st["wait_p95_s"]),
+          ({"quantile": "1"}, st["wait_max_s"])]),
+        ("jobs_total", "counter", "Jobs by event (submitted, started, done, failed, dropped, rejected)",
+         [({"event": k}, st[k]) for k in job_queue.counters]),
+    ]
+
+@telemetry.collector
+def _cache_metrics():
+    st = cache_stats()
+    sf = singleflight.stats()
+    return [
+        ("json_cache_events_total", "counter", "JSON cache of upstream answers by event",
+         [({"event": k}, st[k]) for k in ("mem_hits", "disk_hits", "misses", "expired", "evicted")]),
+        ("json_cache_bytes_total", "counter", "JSON cache bytes read/written",
+         [({"op": "read"}, st["bytes_read"]), ({"op": "written"}, st["bytes_written"])]),
+        ("json_cache_mem_bytes", "gauge", "JSON cache in-memory LRU size", [({}, st["mem_bytes"])]),
+        ("singleflight_calls_total", "counter", "Single-flight calls; coalesced ones waited for a shared result",
+         [({"ns": ns, "kind": k}, v) for ns, c in sf.items() for k, v in c.items()]),
+        ("singleflight_inflight", "gauge", "Shared upstream calls in flight", [({}, singleflight.inflight())]),
+    ]
+
+def _heatmap_run(m, lat, lon):
+    # Задание «тепловая карта»: OSM на квадрат с запасом под дистанции, затем растр в пуле воркеров
+    async def run():
+        from .services import heatmap
+        T = STAGE_TIMEOUTS
+        try:
+            bbox = metrics.expand_bbox(heatmap.square_bbox(lon, lat), meters=2000)
+            osm_data = await asyncio.wait_for(osm.fetch_overpass_async(bbox), T["overpass"])
+            out = await asyncio.wait_for(
+                workers.heatmap_outputs(lon, lat, osm_data, heatmap.HEATMAP_SIZE_M, heatmap.HEATMAP_CELLS),
+                T["heatmap"])
+            b = out["bounds_wgs84"]
+            await m.answer_photo(photo=BufferedInputFile(out["png"], "heatmap.png"),
+                                 caption=f"Пригодность 0–100 (красный → зелёный)\n"
+                                         f"Границы: {b[1]:.5f},{b[0]:.5f} — {b[3]:.5f},{b[2]:.5f}")
+            await m.answer_document(document=BufferedInputFile(out["top"].encode("utf-8"), "top_cells.geojson"),
+                                    caption="Лучшие клетки (GeoJSON)")
+        except Exception as e:
+            logging.exception("heatmap error")
+            await m.answer(f"Ошибка расчёта тепловой карты: {e}")
+    return run
+
+def _pipeline_job(m, geom_wgs84, source, job_id=None):
+    async def run():
+        try:
+            await run_pipeline_and_reply(m, geom_wgs84, source=source)
+        except Exception as e:
+            logging.exception("pipeline error")
+            await m.answer(f"Ошибка обработки участка: {e}")
+
+    async def on_queued(pos):
+        await m.answer(f"Участок в очереди, позиция: {pos}. Начнём, как только освободится место.")
+
+    async def on_dropped():
+        await m.answer("Предыдущий запрос из очереди заменён новым.")
+
+    # Повторная отправка из того же источника (карта, точка, КН) вытесняет ещё не начатое задание;
+    # загруженные файлы уникальны и обрабатываются все
+    chat_id = m.chat_id if isinstance(m, ChatReplier) else m.chat.id
+    return jobs.Job(chat_id, run, replace_key=source,
+                    payload={"geom": mapping(geom_wgs84), "source": source},
+                    on_queued=on_queued, on_dropped=on_dropped, job_id=job_id)
+
+async def reply_cached(m: types.Message, geom_wgs84, source: str = "") -> bool:
+    # Тот же участок из того же источника уже считали и данные OSM с тех пор не обновлялись — ответ из кэша
+    t0 = time.perf_counter()
+    key = snapshots.geometry_key(geom_wgs84)
+    hit = await asyncio.to_thread(results.get, results.result_key(key, source))
+    telemetry.CACHE_REQUESTS.inc(cache="result", result="miss" if hit is None else "hit")
+    if hit is None:
+        return False
+    await m.answer(hit["brief"], reply_markup=profile_kb(key, hit["metrics"].get("profile")))
+    if hit["map"]:
+        await m.answer_photo(photo=BufferedInputFile(hit["map"], hit["map_name"]))
+    if hit["pdf"]:
+        await m.answer_document(document=BufferedInputFile(hit["pdf"], "report.pdf"))
+    logging.info("result cache hit %s: %.1f ms", key, (time.perf_counter() - t0) * 1000)
+    return True
+
+async def submit_pipeline(m: types.Message, geom_wgs84, source: str = ""):
+    if await reply_cached(m, geom_wgs84, source):
+        return
+    try:
+        await job_queue.submit(_pipeline_job(m, geom_wgs84, source))
+    except jobs.QueueFull as e:
+        await m.answer(str(e))
+
+async def restore_jobs():
+    # Задания, не успевшие выполниться до перезапуска (только при JOB_STORE=sqlite)
+    for job_id, chat_id, payload in job_queue.store.load():
+        job_queue.store.remove(job_id)
+        try:
+            await job_queue.submit(_pipeline_job(ChatReplier(chat_id), shape(payload["geom"]), payload["source"]))
+        except Exception:
+            logging.exception("restore job %s failed", job_id)
 
 async def main():
     if not BOT_TOKEN:
         raise RuntimeError("TELEGRAM_BOT_TOKEN не указан")
     await start_web()  # ваш aiohttp-сервер
-    await dp.start_polling(bot, allowed_updates=AllowedUpdates.all())
+    # Прогрев (воркеры, PROJ, DEM, шрифты, индекс геокодера) — фоном: /start отвечает сразу,
+    # готовность видна в /health
+    warm = asyncio.create_task(warmup.run([("geocoder", lambda: asyncio.to_thread(geocoder_index.index))]))
+    await restore_jobs()
+    try:
+        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+    finally:
+        warm.cancel()
+        await http_client.close()
+        workers.shutdown()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -1,61 +1,115 @@
+import hashlib
 import numpy as np
-import srtm
-from shapely.geometry import Polygon, Point
-from shapely.ops import transform
-from pyproj import Transformer, CRS
-from . import metrics as mutils
+import shapely
+from ..storage import dem_tiles
+from . import singleflight, workers, projection
 
-_elev = srtm.get_data()
+def _elevations(lons, lats):
+    # Пакетная выборка высот из memmap-тайлов (билинейно); нет данных → NaN
+    return dem_tiles.sample(lons, lats)
 
-def _utm_crs_for(lon, lat):
-    zone = int((lon + 180) / 6) + 1
-    epsg = 32600 + zone if lat >= 0 else 32700 + zone
-    return CRS.from_epsg(epsg)
+def _horn(z, dx, dy):
+    # Уклон (%) и экспозиция (° от севера по часовой) ядром Хорна 3×3.
+    # z[ix, iy]: ось 0 — на восток, ось 1 — на север
+    p = np.pad(z, 1, mode="edge")
+    nx, ny = z.shape
+    w = lambda i, j: p[1 + i:1 + i + nx, 1 + j:1 + j + ny]
+    dzdx = ((w(1, -1) + 2 * w(1, 0) + w(1, 1)) - (w(-1, -1) + 2 * w(-1, 0) + w(-1, 1))) / (8 * dx)
+    dzdy = ((w(-1, 1) + 2 * w(0, 1) + w(1, 1)) - (w(-1, -1) + 2 * w(0, -1) + w(1, -1))) / (8 * dy)
+    slope = 100.0 * np.hypot(dzdx, dzdy)
+    aspect = np.degrees(np.arctan2(-dzdx, -dzdy)) % 360.0  # куда смотрит склон (вниз)
+    return slope, aspect
 
-def compute_dem_stats(geom_wgs84, step_m=30.0, buffer_m=200):
-    # Буфер для относительной низинности
-    lon, lat = geom_wgs84.centroid.x, geom_wgs84.centroid.y
-    crs_utm = _utm_crs_for(lon, lat)
-    to_utm = Transformer.from_crs("EPSG:4326", crs_utm, always_xy=True).transform
-    to_wgs = Transformer.from_crs(crs_utm, "EPSG:4326", always_xy=True).transform
-
-    g_utm = transform(to_utm, geom_wgs84).buffer(buffer_m)
-    minx, miny, maxx, maxy = g_utm.bounds
-    # Шаг в градусах оценим после обратной трансформации — здесь проще сэмплировать равномерную сетку в UTM и конвертить в WGS
-    nx = max(5, int((maxx - minx) / step_m))
-    ny = max(5, int((maxy - miny) / step_m))
+def _box_mean(z, k):
+    # Среднее в окне (2k+1)×(2k+1) через интегральное изображение
+    n = 2 * k + 1
+    c = np.pad(np.pad(z, k, mode="edge").cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    return (c[n:, n:] - c[:-n, n:] - c[n:, :-n] + c[:-n, :-n]) / (n * n)
+
+def sample_grid(bounds_utm, to_wgs, step_m=30.0, tpi_radius_m=90.0, shape=None):
+    # Регулярная 2D-сетка в UTM по bbox: высоты берём одним вызовом на весь растр,
+    # уклон/экспозицию/низины считаем один раз и дальше только маскируем.
+    # Одну сетку можно использовать для нескольких участков (пакетный режим)
+    minx, miny, maxx, maxy = bounds_utm
+    # shape=(nx, ny) — точный размер сетки (узлы по краям bbox), иначе по шагу step_m
+    nx, ny = shape or (max(5, int((maxx - minx) / step_m)), max(5, int((maxy - miny) / step_m)))
     xs = np.linspace(minx, maxx, nx)
     ys = np.linspace(miny, maxy, ny)
+    dx, dy = xs[1] - xs[0], ys[1] - ys[0]
+    xx, yy = np.meshgrid(xs, ys, indexing="ij")
+    lons, lats = to_wgs(xx.ravel(), yy.ravel())
+    z = _elevations(lons, lats).reshape(nx, ny)
+    ok = ~np.isnan(z)
+    grid = {"xx": xx, "yy": yy, "z": z, "ok": ok, "slope": None}
+    if ok.any():
+        zf = np.where(ok, z, np.nanmedian(z))
+        slope, aspect = _horn(zf, dx, dy)
+        # TPI: высота относительно среднего в окрестности; <0 — понижение рельефа
+        tpi = zf - _box_mean(zf, max(1, int(round(tpi_radius_m / min(dx, dy)))))
+        # Индекс увлажнения в духе TWI: ячейка тем «мокрее», чем она ниже окрестности и положе
+        wet = np.clip(-tpi / 2.0, 0, 1) * np.clip(1 - slope / 5.0, 0, 1)
+        grid.update(slope=slope, aspect=aspect, tpi=tpi, wet=wet)
+    return grid
+
+def grid_stats(grid, parcel_utm, buffer_m=200, centroid_wgs84=None):
+    xx, yy, z, ok = grid["xx"], grid["yy"], grid["z"], grid["ok"]
+    # Буфер для относительной низинности
+    g_utm = parcel_utm.buffer(buffer_m)
+    in_buf = shapely.contains_xy(g_utm, xx, yy) & ok
+    in_parcel = shapely.contains_xy(parcel_utm, xx, yy) & ok
+    if not in_parcel.any() and ok.any():
+        # Участок меньше шага сетки — берём ближайший к центроиду узел
+        c = parcel_utm.centroid
+        d = np.where(ok, np.hypot(xx - c.x, yy - c.y), np.inf)
+        in_parcel = np.zeros_like(ok)
+        in_parcel[np.unravel_index(np.argmin(d), d.shape)] = True
+
+    elev = z[in_buf]
+    elev_in = z[in_parcel]
+    if elev_in.size == 0:  # fallback — пробуем хотя бы центроид
+        h0 = np.nan if centroid_wgs84 is None else _elevations([centroid_wgs84[0]], [centroid_wgs84[1]])[0]
+        elev_in = np.array([0.0 if np.isnan(h0) else h0])
+    if elev.size == 0:
+        elev = elev_in
+
+    if grid["slope"] is not None:
+        slope, aspect = grid["slope"], grid["aspect"]
+        s_in, a_in = slope[in_parcel], np.radians(aspect[in_parcel])
+        slope_mean = float(np.mean(s_in))
+        slope_p90 = float(np.percentile(s_in, 90))
+        share8 = float(np.mean(s_in > 8))
+        share15 = float(np.mean(s_in > 15))
+        aspect_deg = float(np.degrees(np.arctan2(np.sum(s_in * np.sin(a_in)), np.sum(s_in * np.cos(a_in)))) % 360)
+        tpi_med = float(np.median(grid["tpi"][in_parcel]))
+        wetness = float(np.mean(grid["wet"][in_parcel]))
+    else:
+        slope_mean = slope_p90 = share8 = share15 = aspect_deg = tpi_med = wetness = 0.0
 
-    elev = []
-    elev_in = []
-    for x in xs:
-        for y in ys:
-            pt_utm = Point(x, y)
-            if not g_utm.contains(pt_utm):
-                continue
-            lon2, lat2 = transform(to_wgs, pt_utm).x, transform(to_wgs, pt_utm).y
-            h = _elev.get_elevation(lat2, lon2)
-            if h is None:
-                continue
-            elev.append(h)
-            if transform(to_utm, geom_wgs84).contains(pt_utm):
-                elev_in.append(h)
-    if not elev_in:  # fallback — пробуем хотя бы центроид
-        h0 = _elev.get_elevation(lat, lon)
-        elev_in = [h0] if h0 is not None else [0]
-
-    elev = np.array(elev) if elev else np.array(elev_in)
-    elev_in = np.array(elev_in)
-    # Уклон: оценим по градиенту на внутренней сетке
-    # Примитивно: возьмём 3x3 окрестности — упростим до std перепада на шаг
-    slope_pct = float(np.clip(np.std(np.diff(np.sort(elev_in))) if len(elev_in) > 3 else 0.0, 0, 100))  # очень грубо
     stats = {
         "elev_min": float(np.min(elev_in)),
         "elev_max": float(np.max(elev_in)),
         "elev_med": float(np.median(elev_in)),
         "elev_p95": float(np.percentile(elev_in, 95)),
-        "slope_indicative_pct": slope_pct,
+        "slope_indicative_pct": float(np.clip(slope_mean, 0, 100)),
         "rel_lowness_m": float(np.median(elev_in) - float(np.median(elev))),  # <0 → низина
+        "slope_mean_pct": slope_mean,
+        "slope_p90_pct": slope_p90,
+        "slope_gt8_share": share8,
+        "slope_gt15_share": share15,
+        "aspect_deg": aspect_deg,
+        "tpi_med_m": tpi_med,  # <0 → участок ниже окрестности
+        "wetness_idx": wetness,  # 0..1, доля «низких и плоских» ячеек
     }
-    return stats
\ No newline at end of file
+    return stats
+
+def compute_dem_stats(geom_wgs84, step_m=30.0, buffer_m=200, tpi_radius_m=90.0, epsg=None):
+    # Контекст проекции общий со стадией метрик (bot/services/projection.py)
+    ctx = projection.context(geom_wgs84, epsg)
+    c = geom_wgs84.centroid
+    grid = sample_grid(ctx.parcel_utm.buffer(buffer_m).bounds, ctx.to_wgs, step_m, tpi_radius_m)
+    return grid_stats(grid, ctx.parcel_utm, buffer_m, (c.x, c.y))
+
+async def compute_dem_stats_async(geom_wgs84, step_m=30.0, buffer_m=200):
+    # Одинаковые геометрии, пришедшие одновременно, считаются один раз
+    key = f"{hashlib.md5(geom_wgs84.wkb).hexdigest()}_{step_m}_{buffer_m}"
+    return await singleflight.do("dem", key, lambda: workers.compute_dem_stats(geom_wgs84, step_m, buffer_m))
@@ -1,18 +1,46 @@
-import os, time, requests
+# Обратное геокодирование: сначала локальный индекс (bot/storage/geocoder_index.py, микросекунды),
+# Nominatim — только если точка вне его покрытия. Кэш ответов Nominatim — по ячейке сетки
+# GEOCODE_GRID_DEG (~200 м): соседние участки делят одну запись, а запрос идёт в центр ячейки,
+# чтобы ответ не зависел от того, какой участок пришёл первым.
+import os, math, asyncio
 from ..storage.cache import get_cache_json, set_cache_json
+from ..storage import geocoder_index
+from . import http_client, singleflight, telemetry
 
 NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/reverse")
-USER_AGENT_EMAIL = os.getenv("USER_AGENT_EMAIL", "youremail@example.com")  # укажите свой email
+GEOCODE_GRID_DEG = float(os.getenv("GEOCODE_GRID_DEG", "0.002"))
+GEOCODE_LOCAL = os.getenv("GEOCODE_LOCAL", "1").strip().lower() in ("1", "true", "yes", "on")
 
-def reverse_geocode(lat, lon):
+def snap(v, step=None):
+    # Центр ячейки сетки, в которую попадает координата
+    step = step or GEOCODE_GRID_DEG
+    return (math.floor(v / step) + 0.5) * step
+
+async def reverse_geocode_async(lat, lon):
+    if GEOCODE_LOCAL:
+        # Первое обращение строит индекс из SQLite (секунды на большой выгрузке) — не в event loop;
+        # дальше поиск — микросекунды, прямо здесь
+        if geocoder_index.loaded():
+            local = geocoder_index.lookup(lat, lon)
+        else:
+            local = await asyncio.to_thread(geocoder_index.lookup, lat, lon)
+        telemetry.CACHE_REQUESTS.inc(cache="geocode_local", result="miss" if local is None else "hit")
+        if local is not None:
+            return local
+    lat, lon = snap(lat), snap(lon)
     key = f"nominatim_{lat:.5f}_{lon:.5f}"
-    cached = get_cache_json(key, ttl=7*24*3600)
+    return await singleflight.do("nominatim", key, lambda: _reverse_geocode(key, lat, lon))
+
+async def _reverse_geocode(key, lat, lon):
+    # Кэш — SQLite и распаковка, как и кэш тайлов OSM, — в потоке, не в event loop
+    cached = await asyncio.to_thread(get_cache_json, key, 7*24*3600)
+    telemetry.CACHE_REQUESTS.inc(cache="geocode", result="hit" if cached else "miss")
     if cached: return cached
     params = {"lat": lat, "lon": lon, "format": "jsonv2", "zoom": 14, "addressdetails": 1}
-    headers = {"User-Agent": f"LandScoreBot/0.1 ({USER_AGENT_EMAIL})"}
-    time.sleep(1.0)  # соблюдаем политику
-    r = requests.get(NOMINATIM_URL, params=params, headers=headers, timeout=20)
-    r.raise_for_status()
-    data = r.json()
-    set_cache_json(key, data)
-    return data
\ No newline at end of file
+    # Политика 1 req/s соблюдается общим token bucket в http_client
+    data = await http_client.request_json("nominatim", "GET", NOMINATIM_URL, params=params)
+    await asyncio.to_thread(set_cache_json, key, data)
+    return data
+
+def reverse_geocode(lat, lon):
+    return http_client.run_sync(reverse_geocode_async(lat, lon))
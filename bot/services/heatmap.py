@@ -0,0 +1,118 @@
+# «Тепловая карта пригодности»: скоринг каждой ячейки квадрата size_m×size_m за один векторный проход.
+# Те же слагаемые, что в metrics.compute_all (доступ, вода/подтопление, уклон, остановки, ЛЭП),
+# но для всех центров ячеек сразу: расстояния — пакетным query_nearest по STRtree,
+# рельеф — одной сеткой DEM (dem.sample_grid) на весь растр.
+import io, os, json
+import numpy as np
+import shapely
+from shapely.geometry import Polygon, mapping
+from PIL import Image
+from . import metrics, dem, scoring, projection
+
+HEATMAP_SIZE_M = float(os.getenv("HEATMAP_SIZE_M", "5000"))
+HEATMAP_CELLS = int(os.getenv("HEATMAP_CELLS", "100"))  # ячеек по стороне; 100 → 50 м при 5 км
+# Слои для полей расстояний и радиус поиска. Радиус ускоряет поиск только по редким слоям:
+# для плотной дорожной сети query_nearest с max_distance в разы медленнее, чем без него.
+# Вода дальше 50 м на подтопление не влияет
+_MAX_DIST = {"roads_major": None, "roads_all": None, "waters": 50, "powers": None, "stops": None}
+
+def square_bbox(lon, lat, size_m=HEATMAP_SIZE_M):
+    return metrics.expand_bbox((lon, lat, lon, lat), meters=size_m / 2)
+
+def _nearest_field(tree, points, max_distance):
+    # Расстояние от каждой точки до ближайшего объекта; NaN — ничего ближе max_distance
+    out = np.full(len(points), np.nan)
+    if tree is None:
+        return out
+    idx, d = tree.query_nearest(points, max_distance=max_distance, return_distance=True, all_matches=False)
+    out[idx[0]] = d
+    return out
+
+def compute_heatmap(lon, lat, osm_data, size_m=HEATMAP_SIZE_M, n=HEATMAP_CELLS, index=None,
+                    profile=scoring.DEFAULT_PROFILE):
+    epsg = projection.utm_epsg(lon, lat)
+    to_utm = projection.transformer(projection.WGS84, epsg).transform
+    to_wgs = projection.transformer(epsg, projection.WGS84).transform
+    cx, cy = to_utm(lon, lat)
+    cell = size_m / n
+    minx, miny = cx - size_m / 2, cy - size_m / 2
+    # Узлы сетки DEM совпадают с центрами ячеек; xx[ix, iy]: ось 0 — восток, ось 1 — север
+    grid = dem.sample_grid((minx + cell / 2, miny + cell / 2, minx + size_m - cell / 2, miny + size_m - cell / 2),
+                           to_wgs, cell, shape=(n, n))
+    xx, yy = grid["xx"], grid["yy"]
+    points = shapely.points(xx.ravel(), yy.ravel())
+
+    if index is None or index["epsg"] != epsg:
+        index = metrics.build_osm_index(osm_data, epsg)
+    d = {k: _nearest_field(index["trees"][k], points, md).reshape(n, n) for k, md in _MAX_DIST.items()}
+    d_road = np.where(np.isnan(d["roads_major"]), d["roads_all"], d["roads_major"])
+    # «Касание дороги» для ячейки: дорога проходит через неё
+    touches = np.nan_to_num(d["roads_all"], nan=np.inf) <= max(10.0, cell / 2)
+
+    if grid["slope"] is not None:
+        zf = np.where(grid["ok"], grid["z"], np.nanmedian(grid["z"]))
+        # Низинность ячейки относительно окрестности ~200 м, как буфер в compute_dem_stats
+        rel_low = zf - dem._box_mean(zf, max(1, int(round(200 / cell))))
+        slope, wet = grid["slope"], grid["wet"]
+    else:
+        rel_low, slope, wet = np.zeros((n, n)), np.full((n, n), 5.0), np.zeros((n, n))
+
+    score = scoring.score({"d_road_m": d_road, "d_stop_m": d["stops"], "d_power_m": d["powers"],
+                           "d_water_m": d["waters"], "touches_road": touches, "slope_pct": slope,
+                           "rel_lowness_m": rel_low, "wetness_idx": wet}, profile)
+    bx, by = to_wgs(np.array([minx, minx + size_m]), np.array([miny, miny + size_m]))
+    return {
+        "crs": epsg,
+        "cell_m": cell,
+        "origin_utm": (minx, miny),
+        "bounds_wgs84": (float(bx[0]), float(by[0]), float(bx[1]), float(by[1])),
+        "xx": xx, "yy": yy,
+        "score": score,
+        "d_road_m": d_road, "d_water_m": d["waters"], "d_power_m": d["powers"], "d_stop_m": d["stops"],
+        "slope_pct": slope,
+    }
+
+# Красный (0) → жёлтый (50) → зелёный (100)
+_STOPS = np.array([0, 50, 100])
+_COLORS = np.array([[215, 48, 39], [254, 224, 139], [26, 152, 80]])
+
+def render_overlay_png(hm, alpha=160):
+    # PNG с прозрачностью для наложения на карту в границах hm["bounds_wgs84"] (север сверху)
+    total = hm["score"]["total"].T[::-1]  # строки — с севера на юг, столбцы — с запада на восток
+    rgba = np.empty(total.shape + (4,), dtype=np.uint8)
+    for ch in range(3):
+        rgba[..., ch] = np.interp(total, _STOPS, _COLORS[:, ch])
+    rgba[..., 3] = alpha
+    buf = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buf, format="PNG")
+    return buf.getvalue()
+
+def top_cells_geojson(hm, top_n=20):
+    total = hm["score"]["total"].ravel()
+    top_n = min(top_n, total.size)
+    idx = np.argpartition(-total, top_n - 1)[:top_n]
+    idx = idx[np.argsort(-total[idx], kind="stable")]
+    # Углы всех выбранных ячеек перепроецируются одним вызовом
+    h = hm["cell_m"] / 2
+    cx, cy = hm["xx"].ravel()[idx], hm["yy"].ravel()[idx]
+    to_wgs = projection.transformer(hm["crs"], projection.WGS84).transform
+    lons, lats = to_wgs(np.stack([cx - h, cx + h, cx + h, cx - h], 1), np.stack([cy - h, cy - h, cy + h, cy + h], 1))
+
+    def val(a, i):
+        v = float(a.ravel()[i])
+        return None if np.isnan(v) else round(v, 1)
+
+    feats = []
+    for rank, (i, lo, la) in enumerate(zip(idx, lons, lats), 1):
+        props = {"rank": rank, "score": int(total[i])}
+        props.update({f"score_{k}": float(v.ravel()[i]) for k, v in hm["score"].items() if k != "total"})
+        props.update({k: val(hm[k], i) for k in ("d_road_m", "d_water_m", "d_power_m", "d_stop_m", "slope_pct")})
+        feats.append({"type": "Feature", "properties": props, "geometry": mapping(Polygon(zip(lo, la)))})
+    return {"type": "FeatureCollection", "features": feats}
+
+def heatmap_outputs(lon, lat, osm_data, size_m=HEATMAP_SIZE_M, n=HEATMAP_CELLS, top_n=20,
+                    profile=scoring.DEFAULT_PROFILE):
+    # Для воркера: только сериализуемые результаты — PNG (bytes), GeoJSON (str) и границы наложения
+    hm = compute_heatmap(lon, lat, osm_data, size_m, n, profile=profile)
+    return {"png": render_overlay_png(hm), "bounds_wgs84": hm["bounds_wgs84"],
+            "top": json.dumps(top_cells_geojson(hm, top_n), ensure_ascii=False)}
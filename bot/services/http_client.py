@@ -0,0 +1,140 @@
+# Асинхронный HTTP-слой для внешних сервисов (Nominatim, Overpass, растровые тайлы).
+# На каждый upstream — один пул соединений (aiohttp.ClientSession с ограничением
+# одновременных соединений) и общий token bucket, который действует на все запросы
+# процесса, включая разные потоки и event loop'ы. 429/5xx повторяются с джиттером.
+import os, time, random, asyncio, logging, threading
+import aiohttp
+from . import telemetry
+
+USER_AGENT_EMAIL = os.getenv("USER_AGENT_EMAIL", "youremail@example.com")
+USER_AGENT = f"LandScoreBot/0.1 ({USER_AGENT_EMAIL})"
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF_S = float(os.getenv("HTTP_BACKOFF_S", "1.0"))
+
+class UpstreamError(RuntimeError):
+    def __init__(self, upstream, status, message=""):
+        super().__init__(f"{upstream}: HTTP {status} {message}".strip())
+        self.upstream = upstream
+        self.status = status
+
+class TokenBucket:
+    # rate — запросов в секунду, burst — сколько можно выпустить подряд.
+    # Токен резервируется сразу под lock'ом, ожидание — обычный asyncio.sleep
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= 1.0
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+class Upstream:
+    def __init__(self, name, rate, burst=1, concurrency=1, timeout=60):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+def _env_upstream(name, rate, concurrency, timeout, burst=1):
+    p = name.upper()
+    return Upstream(name,
+                    rate=float(os.getenv(f"{p}_RPS", str(rate))),
+                    burst=int(os.getenv(f"{p}_BURST", str(burst))),
+                    concurrency=int(os.getenv(f"{p}_CONCURRENCY", str(concurrency))),
+                    timeout=float(os.getenv(f"{p}_TIMEOUT", str(timeout))))
+
+# Политики: Nominatim — не чаще 1 req/s; публичные Overpass — 1–2 одновременных запроса;
+# тайлы tile.openstreetmap.org — не больше 2 соединений
+UPSTREAMS = {
+    "nominatim": _env_upstream("nominatim", rate=1.0, concurrency=1, timeout=20),
+    "overpass": _env_upstream("overpass", rate=1.0, concurrency=2, timeout=60),
+    "tiles": _env_upstream("tiles", rate=10.0, concurrency=2, timeout=15, burst=20),  # один рендер ≈ 12–20 тайлов
+}
+
+_sessions = {}  # (имя upstream, event loop) → ClientSession; сессия aiohttp живёт в одном loop
+
+def _session(up: Upstream) -> aiohttp.ClientSession:
+    key = (up.name, asyncio.get_running_loop())
+    cur = _sessions.get(key)
+    if cur is not None and not cur.closed:
+        return cur
+    s = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=up.concurrency, ttl_dns_cache=300),
+        timeout=aiohttp.ClientTimeout(total=up.timeout),
+        headers={"User-Agent": USER_AGENT},
+    )
+    _sessions[key] = s
+    return s
+
+def _backoff(attempt, retry_after=None):
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return HTTP_BACKOFF_S * (2 ** attempt) * (0.5 + random.random())
+
+async def _request(upstream: str, method: str, url: str, read, **kwargs):
+    # read(response) — корутина, читающая успешный (< 400) ответ
+    with telemetry.UPSTREAM_INFLIGHT.track(upstream=upstream), telemetry.UPSTREAM_SECONDS.time(upstream=upstream):
+        return await _attempts(upstream, method, url, read, **kwargs)
+
+async def _attempts(upstream, method, url, read, **kwargs):
+    up = UPSTREAMS[upstream]
+    for attempt in range(HTTP_RETRIES + 1):
+        await up.bucket.acquire()
+        retry_after = None
+        try:
+            async with _session(up).request(method, url, **kwargs) as r:
+                if r.status == 429 or r.status >= 500:
+                    retry_after = r.headers.get("Retry-After")
+                    err = UpstreamError(upstream, r.status, r.reason or "")
+                else:
+                    if r.status >= 400:
+                        telemetry.UPSTREAM_ERRORS.inc(upstream=upstream, status=r.status)
+                        raise UpstreamError(upstream, r.status, r.reason or "")
+                    return await read(r)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            err = UpstreamError(upstream, type(e).__name__, str(e))
+        telemetry.UPSTREAM_ERRORS.inc(upstream=upstream, status=err.status)
+        if attempt == HTTP_RETRIES:
+            raise err
+        delay = _backoff(attempt, retry_after)
+        logging.warning("%s, retry %d in %.1fs", err, attempt + 1, delay)
+        await asyncio.sleep(delay)
+
+async def request_json(upstream: str, method: str, url: str, **kwargs):
+    return await _request(upstream, method, url, lambda r: r.json(content_type=None), **kwargs)
+
+async def request_bytes(upstream: str, method: str, url: str, **kwargs):
+    # (статус, заголовки без учёта регистра, тело); 304 Not Modified — успех с пустым телом
+    async def read(r):
+        return r.status, r.headers.copy(), (await r.read() if r.status != 304 else b"")
+    return await _request(upstream, method, url, read, **kwargs)
+
+async def close():
+    # Закрыть пулы текущего event loop (вызывается при остановке бота)
+    loop = asyncio.get_running_loop()
+    for key in [k for k in list(_sessions) if k[1] is loop]:
+        await _sessions.pop(key).close()
+
+def run_sync(coro):
+    # Для CLI/потоков без своего event loop: выполнить корутину и закрыть её сессии
+    async def _main():
+        try:
+            return await coro
+        finally:
+            await close()
+    return asyncio.run(_main())
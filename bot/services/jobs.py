@@ -0,0 +1,150 @@
+# Очередь заданий пайплайна: общий лимит одновременных заданий, лимит на чат,
+# честная очередь (round-robin по чатам), отбрасывание устаревших заданий при повторной
+# отправке и метрики глубины очереди / времени ожидания.
+import os, time, uuid, asyncio, logging
+from collections import OrderedDict, deque
+
+from ..storage.job_store import make_job_store
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+JOB_PER_CHAT = int(os.getenv("JOB_PER_CHAT", "1"))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "200"))
+JOB_CHAT_QUEUE_MAX = int(os.getenv("JOB_CHAT_QUEUE_MAX", "10"))
+
+class QueueFull(RuntimeError):
+    pass
+
+class Job:
+    def __init__(self, chat_id, run, replace_key=None, payload=None, on_queued=None, on_dropped=None, job_id=None):
+        # run() — корутина задания; payload — сериализуемые данные для постоянного хранилища
+        self.id = job_id or uuid.uuid4().hex
+        self.chat_id = chat_id
+        self.run = run
+        self.replace_key = replace_key
+        self.payload = payload
+        self.on_queued = on_queued
+        self.on_dropped = on_dropped
+        self.enqueued_at = time.monotonic()
+
+class JobQueue:
+    def __init__(self, concurrency=JOB_CONCURRENCY, per_chat=JOB_PER_CHAT,
+                 max_pending=JOB_QUEUE_MAX, max_chat_pending=JOB_CHAT_QUEUE_MAX, store=None):
+        self.concurrency = concurrency
+        self.per_chat = per_chat
+        self.max_pending = max_pending
+        self.max_chat_pending = max_chat_pending
+        self.store = store or make_job_store()
+        self._pending = OrderedDict()  # chat_id → deque[Job]; порядок ключей — очередь round-robin
+        self._inflight = {}            # chat_id → число выполняемых заданий
+        self._tasks = set()
+        self._waits = deque(maxlen=1000)
+        self.counters = {"submitted": 0, "started": 0, "done": 0, "failed": 0, "dropped": 0, "rejected": 0}
+
+    # --- состояние ---
+
+    def depth(self):
+        return sum(len(q) for q in self._pending.values())
+
+    def running(self):
+        return sum(self._inflight.values())
+
+    def _order(self):
+        # Порядок запуска ожидающих заданий при round-robin по чатам
+        queues = [list(q) for q in self._pending.values()]
+        out, i = [], 0
+        while any(i < len(q) for q in queues):
+            out.extend(q[i] for q in queues if i < len(q))
+            i += 1
+        return out
+
+    def position(self, job):
+        for i, j in enumerate(self._order()):
+            if j is job:
+                return i + 1
+        return 0
+
+    def stats(self):
+        waits = sorted(self._waits)
+        pct = lambda p: waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+        return {**self.counters, "depth": self.depth(), "running": self.running(),
+                "wait_p50_s": pct(0.5), "wait_p95_s": pct(0.95), "wait_max_s": waits[-1] if waits else 0.0}
+
+    # --- постановка ---
+
+    async def submit(self, job):
+        q = self._pending.setdefault(job.chat_id, deque())
+        # Повторная отправка того же (replace_key) вытесняет ещё не начатое задание
+        if job.replace_key is not None:
+            for old in [j for j in q if j.replace_key == job.replace_key]:
+                q.remove(old)
+                self._forget(old)
+                self.counters["dropped"] += 1
+                if old.on_dropped:
+                    await old.on_dropped()
+        if self.depth() >= self.max_pending or len(q) >= self.max_chat_pending:
+            if not q:
+                del self._pending[job.chat_id]
+            self.counters["rejected"] += 1
+            raise QueueFull("Очередь переполнена, попробуйте чуть позже.")
+        q.append(job)
+        self.counters["submitted"] += 1
+        if job.payload is not None:
+            self.store.save(job.id, job.chat_id, job.payload)
+        self._pump()
+        pos = self.position(job)
+        if pos and job.on_queued:
+            await job.on_queued(pos)
+        return pos
+
+    def _forget(self, job):
+        if job.payload is not None:
+            self.store.remove(job.id)
+
+    # --- диспетчер ---
+
+    def _pump(self):
+        progressed = True
+        while progressed and self.running() < self.concurrency:
+            progressed = False
+            for chat_id in list(self._pending):
+                if self.running() >= self.concurrency:
+                    break
+                q = self._pending[chat_id]
+                if not q or self._inflight.get(chat_id, 0) >= self.per_chat:
+                    continue
+                job = q.popleft()
+                if not q:
+                    del self._pending[chat_id]
+                else:
+                    self._pending.move_to_end(chat_id)
+                self._start(job)
+                progressed = True
+
+    def _start(self, job):
+        self._inflight[job.chat_id] = self._inflight.get(job.chat_id, 0) + 1
+        self._waits.append(time.monotonic() - job.enqueued_at)
+        self.counters["started"] += 1
+        task = asyncio.ensure_future(job.run())
+        self._tasks.add(task)
+        task.add_done_callback(lambda t: self._finish(job, t))
+
+    def _finish(self, job, task):
+        self._tasks.discard(task)
+        n = self._inflight.get(job.chat_id, 1) - 1
+        if n:
+            self._inflight[job.chat_id] = n
+        else:
+            self._inflight.pop(job.chat_id, None)
+        if task.cancelled() or task.exception() is not None:
+            self.counters["failed"] += 1
+            if not task.cancelled():
+                logging.error("job %s failed", job.id, exc_info=task.exception())
+        else:
+            self.counters["done"] += 1
+        self._forget(job)
+        self._pump()
+
+    async def join(self):
+        while self._tasks or self.depth():
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+            await asyncio.sleep(0)
@@ -1,30 +1,156 @@
-import os, uuid
-from staticmap import StaticMap, CircleMarker, Polygon as SMPolygon, Line
-from shapely.geometry import mapping
-from shapely.ops import transform
-from pyproj import Transformer
-
-def _extract_ring_coords(geom):
-    # Возвращает один внешний контур координат
-    g = geom
-    if g.geom_type == "MultiPolygon":
-        g = list(g.geoms)[0]
-    return list(g.exterior.coords)
-
-def render_static_map(geom_wgs84, osm_data, out_dir="cache/maps"):
-    os.makedirs(out_dir, exist_ok=True)
-    m = StaticMap(800, 600, url_template="https://a.tile.openstreetmap.org/{z}/{x}/{y}.png")
-    # Участок
-    coords = _extract_ring_coords(geom_wgs84)
-    poly = SMPolygon(coords, fill_color="#3388ff80", outline_color="#1f78b4", width=2)
-    m.add_polygon(poly)
-    # Простейшая дорога рядом (визуально)
-    for el in osm_data.get("elements", [])[:500]:
-        if el.get("type")=="way" and el.get("tags",{}).get("highway"):
-            if "geometry" in el:
-                line = [(p["lon"], p["lat"]) for p in el["geometry"]]
-                m.add_line(Line(line, "#444444", 1))
-    image = m.render(zoom=None)  # авто‑зум по слоям
-    path = os.path.join(out_dir, f"map_{uuid.uuid4().hex}.png")
-    image.save(path)
-    return path
\ No newline at end of file
+# Карта участка: подложка из кэша тайлов (bot/services/tiles.py) собирается один раз, все линии
+# и полигоны OSM переводятся в пиксели одним векторным вызовом и рисуются за один проход Pillow
+# на слое с 2× суперсэмплингом (сглаживание). Результат — байты PNG/WebP, без файлов на диске.
+import os, io, math, time, logging
+import numpy as np
+from PIL import Image, ImageDraw
+from . import tiles, metrics, osm_columns
+
+MAP_WIDTH, MAP_HEIGHT = 800, 600
+MAP_FORMAT = os.getenv("MAP_FORMAT", "png").strip().lower()  # png | webp
+MAP_MAX_ZOOM = 18
+TILE_SIZE = 256
+SUPERSAMPLE = 2
+PADDING_PX = 40
+# Цвет пустой подложки (нет тайла в офлайн-режиме или сеть недоступна) — как фон суши OSM
+BLANK_COLOR = "#f2efe9"
+
+# Стили слоёв в порядке отрисовки: (заливка, цвет линии, толщина в px итоговой картинки)
+STYLES = {
+    "water_area": ((59, 139, 212, 90), (59, 139, 212, 200), 1),
+    "water": (None, (59, 139, 212, 230), 2),
+    "road": (None, (90, 90, 90, 200), 1),
+    "road_major": (None, (60, 60, 60, 230), 3),
+    "power": (None, (212, 59, 59, 230), 1),
+}
+PARCEL_FILL = (51, 136, 255, 110)
+PARCEL_OUTLINE = (31, 120, 180, 255)
+PARCEL_WIDTH = 3
+
+def _world_px(lons, lats, z):
+    # Web Mercator → глобальные пиксели на зуме z
+    n = TILE_SIZE * 2.0 ** z
+    lats = np.clip(np.asarray(lats, dtype=float), -85.0511, 85.0511)
+    x = (np.asarray(lons, dtype=float) + 180.0) / 360.0 * n
+    y = (1.0 - np.arcsinh(np.tan(np.radians(lats))) / math.pi) / 2.0 * n
+    return x, y
+
+def _view(geom_wgs84, width, height):
+    # Участок с контекстом вокруг: не меньше 200 м и не меньше половины размера участка
+    minx, miny, maxx, maxy = geom_wgs84.bounds
+    lat = (miny + maxy) / 2
+    span_m = max((maxx - minx) * 111_000 * math.cos(math.radians(lat)), (maxy - miny) * 111_000)
+    bbox = metrics.expand_bbox(geom_wgs84.bounds, meters=max(200.0, span_m / 2))
+    for z in range(MAP_MAX_ZOOM, 0, -1):
+        x, y = _world_px([bbox[0], bbox[2]], [bbox[3], bbox[1]], z)
+        if x[1] - x[0] <= width - 2 * PADDING_PX and y[1] - y[0] <= height - 2 * PADDING_PX:
+            break
+    cx, cy = (x[0] + x[1]) / 2, (y[0] + y[1]) / 2
+    return z, cx - width / 2, cy - height / 2
+
+def _tile_xys(z, ox, oy, width, height):
+    # Тайлы подложки под окном; x может перейти через линию перемены дат (tx вне 0..n-1)
+    n = 2 ** z
+    tx0, ty0 = int(ox // TILE_SIZE), int(oy // TILE_SIZE)
+    tx1, ty1 = int((ox + width - 1) // TILE_SIZE), int((oy + height - 1) // TILE_SIZE)
+    return [(tx, ty) for tx in range(tx0, tx1 + 1) for ty in range(max(ty0, 0), min(ty1, n - 1) + 1)]
+
+async def fetch_basemap(geom_wgs84, width=MAP_WIDTH, height=MAP_HEIGHT):
+    # Тайлы подложки карты участка — в основном процессе бота, через общий пул соединений и token
+    # bucket "tiles"; в воркер уходят готовые байты: render_map(..., basemap=результат)
+    z, ox, oy = _view(geom_wgs84, width, height)
+    n = 2 ** z
+    return await tiles.fetch_tiles(z, sorted({(tx % n, ty) for tx, ty in _tile_xys(z, ox, oy, width, height)}))
+
+def _basemap(z, ox, oy, width, height, timings, basemap=None):
+    t0 = time.perf_counter()
+    n = 2 ** z
+    wanted = _tile_xys(z, ox, oy, width, height)
+    if basemap is None:
+        # CLI, пакетный режим, бенчмарки: тайлы догружаются здесь же
+        basemap = tiles.fetch_tiles_sync(z, sorted({(tx % n, ty) for tx, ty in wanted}))
+    got, timings["tile_stats"] = basemap
+    timings["tiles"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    img = Image.new("RGBA", (width, height), BLANK_COLOR)
+    for tx, ty in wanted:
+        data = got.get((tx % n, ty))
+        if data:
+            tile = Image.open(io.BytesIO(data)).convert("RGBA")
+            img.paste(tile, (int(round(tx * TILE_SIZE - ox)), int(round(ty * TILE_SIZE - oy))), tile)
+    timings["compose"] = time.perf_counter() - t0
+    return img
+
+def _collect_lines(osm_data):
+    # Все way со стилем: координаты подряд в одном массиве + границы (offsets) и стиль каждой линии —
+    # прямо из колонок OSM (bot/services/osm_columns.py)
+    return osm_columns.of(osm_data).lines()
+
+def _polygons(geom):
+    return list(geom.geoms) if geom.geom_type == "MultiPolygon" else [geom]
+
+def _draw_overlay(geom_wgs84, osm_data, z, ox, oy, width, height):
+    s = SUPERSAMPLE
+    overlay = Image.new("RGBA", (width * s, height * s), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    lons, lats, offsets, styles = _collect_lines(osm_data)
+    if styles:
+        x, y = _world_px(lons, lats, z)
+        x, y = (x - ox) * s, (y - oy) * s
+        starts, ends = offsets[:-1], offsets[1:]
+        # Видимость линии — по её bbox в пикселях, тоже векторно
+        visible = ((np.maximum.reduceat(x, starts) >= 0) & (np.minimum.reduceat(x, starts) <= width * s) &
+                   (np.maximum.reduceat(y, starts) >= 0) & (np.minimum.reduceat(y, starts) <= height * s))
+        xy = np.column_stack((x, y))
+        order = {k: i for i, k in enumerate(STYLES)}
+        for i in sorted(np.flatnonzero(visible), key=lambda i: order[styles[i]]):
+            fill, color, w = STYLES[styles[i]]
+            pts = xy[starts[i]:ends[i]].ravel().tolist()
+            if fill is not None and len(pts) >= 6:
+                draw.polygon(pts, fill=fill, outline=color)
+            else:
+                draw.line(pts, fill=color, width=w * s, joint="curve")
+
+    # Участок: заливка через маску (дыры вычитаются), контур — по всем кольцам
+    rings = [(r, k > 0) for p in _polygons(geom_wgs84) for k, r in enumerate([p.exterior, *p.interiors])]
+    coords = [np.asarray(r.coords) for r, _ in rings]
+    x, y = _world_px(np.concatenate([c[:, 0] for c in coords]), np.concatenate([c[:, 1] for c in coords]), z)
+    xy = np.column_stack(((x - ox) * s, (y - oy) * s))
+    bounds = np.cumsum([0] + [len(c) for c in coords])
+    mask = Image.new("L", overlay.size, 0)
+    mdraw = ImageDraw.Draw(mask)
+    ring_pts = [xy[bounds[i]:bounds[i + 1]].ravel().tolist() for i in range(len(coords))]
+    for pts, is_hole in zip(ring_pts, (h for _, h in rings)):
+        mdraw.polygon(pts, fill=0 if is_hole else PARCEL_FILL[3])
+    fill = Image.new("RGBA", overlay.size, PARCEL_FILL[:3] + (0,))
+    fill.putalpha(mask)
+    overlay.alpha_composite(fill)
+    for pts in ring_pts:
+        draw.line(pts, fill=PARCEL_OUTLINE, width=PARCEL_WIDTH * s, joint="curve")
+    return overlay.reduce(s)
+
+def _encode(img, fmt):
+    buf = io.BytesIO()
+    if fmt == "webp":
+        img.convert("RGB").save(buf, format="WEBP", quality=80, method=4)
+    else:
+        # Быстрое сжатие: optimize/уровень 9 почти не уменьшают такую картинку, но в разы дольше
+        img.convert("RGB").save(buf, format="PNG", compress_level=3)
+    return buf.getvalue()
+
+def render_map(geom_wgs84, osm_data, width=MAP_WIDTH, height=MAP_HEIGHT, fmt=None, basemap=None):
+    # Байты картинки (PNG по умолчанию) — сразу в Telegram/PDF.
+    # basemap — ({(x, y): байты}, счётчики) из fetch_basemap; None — загрузить тайлы самому
+    timings = {}
+    z, ox, oy = _view(geom_wgs84, width, height)
+    img = _basemap(z, ox, oy, width, height, timings, basemap)
+    t0 = time.perf_counter()
+    img.alpha_composite(_draw_overlay(geom_wgs84, osm_data, z, ox, oy, width, height))
+    timings["draw"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    data = _encode(img, fmt or MAP_FORMAT)
+    timings["encode"] = time.perf_counter() - t0
+    logging.info("map render z%d: tiles=%.3fs %s compose=%.3fs draw=%.3fs encode=%.3fs (%d KB)",
+                 z, timings["tiles"], timings["tile_stats"], timings["compose"], timings["draw"],
+                 timings["encode"], len(data) // 1024)
+    return data
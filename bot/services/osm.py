@@ -1,15 +1,124 @@
-import os, time, requests
-from shapely.geometry import shape
-from ..storage.cache import get_cache_json, set_cache_json
+import os, math, asyncio
+from ..storage.cache import get_cache_bytes, set_cache_bytes
+from ..storage import osm_store, results
+from . import http_client, singleflight, telemetry, osm_columns
 
 OVERPASS_URL = os.getenv("OVERPASS_URL", "https://overpass.kumi.systems/api/interpreter")
-USER_AGENT_EMAIL = os.getenv("USER_AGENT_EMAIL", "youremail@example.com")
+# Кэш OSM ведётся по фиксированной сетке slippy-тайлов; z14 ≈ 2.4 км по долготе
+OSM_TILE_ZOOM = int(os.getenv("OSM_TILE_ZOOM", "14"))
+OSM_TTL = 24*3600
+# OSM_SOURCE=local — отвечаем из локального хранилища (bot/storage/osm_store.py), без Overpass
+OSM_SOURCE = os.getenv("OSM_SOURCE", "overpass").strip().lower()
+
+def _tile_xy(lon, lat, z):
+    n = 2 ** z
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def tile_bbox(x, y, z):
+    n = 2 ** z
+    minx = x / n * 360.0 - 180.0
+    maxx = (x + 1) / n * 360.0 - 180.0
+    maxy = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    miny = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return (minx, miny, maxx, maxy)
+
+def tiles_for_bbox(bbox, z=None):
+    z = OSM_TILE_ZOOM if z is None else z
+    (minx, miny, maxx, maxy) = bbox
+    x0, y0 = _tile_xy(minx, maxy, z)
+    x1, y1 = _tile_xy(maxx, miny, z)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+def _tile_key(x, y, z):
+    # Тайл — колонки OSM в .npz (bot/services/osm_columns.py); прежние записи (JSON overpass_t…,
+    # колонки без номера части overpass_c…) больше не читаются и уходят из кэша по возрасту
+    return f"overpass_p{z}_{x}_{y}"
+
+def _element_bounds(el):
+    if "geometry" in el:
+        lons = [p["lon"] for p in el["geometry"] if p]
+        lats = [p["lat"] for p in el["geometry"] if p]
+        if lons:
+            return (min(lons), min(lats), max(lons), max(lats))
+    if "lat" in el and "lon" in el:
+        return (el["lon"], el["lat"], el["lon"], el["lat"])
+    b = el.get("bounds")
+    if b:
+        return (b["minlon"], b["minlat"], b["maxlon"], b["maxlat"])
+    return None
+
+def _split_by_tiles(data, tiles, z):
+    # Раскладываем ответ по тайлам: элемент попадает во все тайлы, которые задевает его bbox.
+    # Диапазон тайлов элемента обрезается по запрошенным: длинная ЛЭП или река через полрегиона
+    # не перебирает сотни тысяч тайлов z14
+    out = {t: [] for t in tiles}
+    tx0, tx1 = min(x for x, _ in tiles), max(x for x, _ in tiles)
+    ty0, ty1 = min(y for _, y in tiles), max(y for _, y in tiles)
+    for el in data.get("elements", []):
+        b = _element_bounds(el)
+        if b is None:
+            continue
+        x0, y0 = _tile_xy(b[0], b[3], z)
+        x1, y1 = _tile_xy(b[2], b[1], z)
+        for x in range(max(x0, tx0), min(x1, tx1) + 1):
+            for y in range(max(y0, ty0), min(y1, ty1) + 1):
+                t = (x, y)
+                if t in out:
+                    out[t].append(el)
+    return out
+
+# bbox = (minx, miny, maxx, maxy) в WGS84; ответ — osm_columns.Columns
+async def fetch_overpass_async(bbox):
+    if OSM_SOURCE == "local":
+        return await asyncio.to_thread(lambda: osm_columns.from_elements(osm_store.query(bbox)["elements"]))
+    # Ответ собирается из закэшированных тайлов сетки; из сети догружаются только недостающие.
+    # Одновременные запросы с тем же набором тайлов ждут одну общую загрузку
+    z = OSM_TILE_ZOOM
+    tiles = tiles_for_bbox(bbox, z)
+    key = f"t{z}:" + ";".join(f"{x},{y}" for x, y in tiles)
+    return await singleflight.do("overpass", key, lambda: _fetch_tiles(tiles, z))
+
+def _load_tiles(tiles, z):
+    # {тайл: колонки} для тайлов, найденных в кэше (SQLite + распаковка .npz)
+    parts = {}
+    for t in tiles:
+        cached = get_cache_bytes(_tile_key(t[0], t[1], z), ttl=OSM_TTL, decode=osm_columns.from_npz)
+        if cached is not None:
+            parts[t] = cached
+    return parts
+
+def _store_tiles(data, missing, z):
+    # Раскладка ответа по тайлам, перевод в колонки и запись в кэш
+    parts = {}
+    for t, els in _split_by_tiles(data, missing, z).items():
+        part = osm_columns.from_elements(els)
+        set_cache_bytes(_tile_key(t[0], t[1], z), part.to_npz(), part)
+        parts[t] = part
+    # Ответы, посчитанные на прежнем содержимом этих тайлов, сбрасываются
+    results.invalidate_tiles(missing, z)
+    return parts
+
+async def _fetch_tiles(tiles, z):
+    # Кэш, разбор, запись и склейка — в потоке: event loop бота не ждёт SQLite и numpy
+    parts = await asyncio.to_thread(_load_tiles, tiles, z)
+    missing = [t for t in tiles if t not in parts]
+    telemetry.CACHE_REQUESTS.inc(len(parts), cache="osm_tile", result="hit")
+    telemetry.CACHE_REQUESTS.inc(len(missing), cache="osm_tile", result="miss")
+    if missing:
+        # Один запрос на охватывающий bbox недостающих тайлов, затем раскладка по тайлам
+        bbs = [tile_bbox(x, y, z) for x, y in missing]
+        need = (min(b[0] for b in bbs), min(b[1] for b in bbs), max(b[2] for b in bbs), max(b[3] for b in bbs))
+        data = await _query_overpass_async(need)
+        parts.update(await asyncio.to_thread(_store_tiles, data, missing, z))
+    return await asyncio.to_thread(osm_columns.merge, [parts[t] for t in tiles])
 
-# bbox = (minx, miny, maxx, maxy) в WGS84
 def fetch_overpass(bbox):
-    key = f"overpass_{','.join([f'{x:.5f}' for x in bbox])}"
-    cached = get_cache_json(key, ttl=24*3600)
-    if cached: return cached
+    return http_client.run_sync(fetch_overpass_async(bbox))
+
+async def _query_overpass_async(bbox):
     (minx, miny, maxx, maxy) = bbox
     # Используем out geom; включаем дороги, ЛЭП, подстанции, вода, населённые пункты, соцобъекты
     query = f"""
@@ -29,10 +138,8 @@ def fetch_overpass(bbox):
     );
     out body geom;
     """
-    headers = {"User-Agent": f"LandScoreBot/0.1 ({USER_AGENT_EMAIL})"}
-    time.sleep(1.0)  # этика и защита от банов
-    r = requests.post(OVERPASS_URL, data={"data": query}, headers=headers, timeout=60)
-    r.raise_for_status()
-    data = r.json()
-    set_cache_json(key, data)
-    return data
\ No newline at end of file
+    # Темп и число одновременных запросов ограничивает http_client (этика и защита от банов)
+    return await http_client.request_json("overpass", "POST", OVERPASS_URL, data={"data": query})
+
+def _query_overpass(bbox):
+    return http_client.run_sync(_query_overpass_async(bbox))
\ No newline at end of file
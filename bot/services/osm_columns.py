@@ -0,0 +1,166 @@
+# Колоночное представление ответа Overpass: вместо списка dict с {"lat", "lon"} на каждую вершину —
+# плоские массивы numpy. Теги разбираются один раз при загрузке (категории метрик — битовая маска,
+# стиль карты — код), сами теги не хранятся. Вершины всех элементов лежат подряд в coords (lon, lat),
+# вершины элемента i — coords[offsets[i]:offsets[i + 1]]. Геометрии shapely строятся пакетно
+# (shapely.from_ragged_array) прямо из этих массивов, карта рисует линии из них же.
+# В кэше тайлов OSM хранится как .npz (to_npz/from_npz) — на попадании нет разбора JSON;
+# в пул процессов передаётся несколькими массивами вместо дерева Python-объектов.
+import io
+import numpy as np
+import shapely
+from . import metrics
+
+NODE, WAY = 0, 1
+# Тип геометрии для метрик (как metrics._element_geom); NONE — геометрию построить нельзя
+NONE, POINT, LINE, POLYGON = -1, 0, 1, 2
+# Стили карты (bot/services/map_render.py: STYLES)
+STYLES = ("water_area", "water", "road", "road_major", "power")
+FIELDS = ("kind", "ids", "part", "cats", "style", "gtype", "offsets", "coords", "cat_names")
+
+def style_of(tags):
+    if tags.get("natural") == "water" or tags.get("landuse") == "reservoir":
+        return "water_area"
+    if tags.get("waterway"):
+        return "water"
+    if tags.get("power") == "line":
+        return "power"
+    hw = tags.get("highway")
+    if hw in metrics.ROAD_TAGS_MAJOR:
+        return "road_major"
+    if hw:
+        return "road"
+    return None
+
+def _osm_id(v):
+    # (id, номер части): части мультигеометрий из osm_store ("123:0") — (123, 0), целый объект — (id, -1);
+    # id, который не разобрать, — -1 (такие элементы merge не дедуплицирует)
+    oid, _, part = str(v).partition(":")
+    try:
+        return int(oid), int(part) if part else -1
+    except ValueError:
+        return -1, -1
+
+class Columns:
+    def __init__(self, kind, ids, part, cats, style, gtype, offsets, coords, cat_names):
+        self.kind, self.ids, self.part, self.cats, self.style, self.gtype = kind, ids, part, cats, style, gtype
+        self.offsets, self.coords, self.cat_names = offsets, coords, cat_names
+
+    def __len__(self):
+        return len(self.kind)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, f).nbytes for f in FIELDS)
+
+    def take(self, idx):
+        # Подмножество элементов (в порядке idx) с их вершинами
+        idx = np.asarray(idx, dtype=np.int64)
+        starts, lens = self.offsets[:-1][idx], np.diff(self.offsets)[idx]
+        offsets = np.concatenate(([0], np.cumsum(lens))).astype(np.int64)
+        pick = np.repeat(starts - offsets[:-1], lens) + np.arange(offsets[-1])
+        return Columns(self.kind[idx], self.ids[idx], self.part[idx], self.cats[idx], self.style[idx], self.gtype[idx],
+                       offsets, self.coords[pick], self.cat_names)
+
+    def geoms(self):
+        # Геометрии всех элементов (None — NONE): по одному вызову на тип
+        out = np.full(len(self), None, dtype=object)
+        for code in (POINT, LINE, POLYGON):
+            idx = np.flatnonzero(self.gtype == code)
+            if not len(idx):
+                continue
+            sub = self.take(idx)
+            if code == POINT:
+                out[idx] = shapely.points(sub.coords)
+            elif code == LINE:
+                out[idx] = shapely.from_ragged_array(shapely.GeometryType.LINESTRING, sub.coords, (sub.offsets,))
+            else:
+                out[idx] = shapely.from_ragged_array(shapely.GeometryType.POLYGON, sub.coords,
+                                                     (sub.offsets, np.arange(len(idx) + 1)))
+        return out
+
+    def layers(self):
+        # {категория metrics.CATEGORIES: массив геометрий} — как прежний metrics.classify_osm
+        bits = {name: 1 << i for i, name in enumerate(self.cat_names)}
+        idx = np.flatnonzero((self.cats != 0) & (self.gtype != NONE))
+        cats, geoms = self.cats[idx], self.take(idx).geoms()
+        return {k: geoms[(cats & bits[k]) != 0] if k in bits else np.array([], dtype=object)
+                for k in metrics.CATEGORIES}
+
+    def lines(self):
+        # Линии карты: (lons, lats, offsets, стили) для всех way со стилем
+        sub = self.take(np.flatnonzero((self.kind == WAY) & (self.style >= 0)))
+        return sub.coords[:, 0], sub.coords[:, 1], sub.offsets, [STYLES[s] for s in sub.style]
+
+    def to_npz(self, compress=True):
+        buf = io.BytesIO()
+        (np.savez_compressed if compress else np.savez)(buf, **{f: getattr(self, f) for f in FIELDS})
+        return buf.getvalue()
+
+def from_npz(blob):
+    with np.load(io.BytesIO(blob)) as z:
+        return Columns(**{f: z[f] for f in FIELDS})
+
+def from_elements(elements):
+    # Один проход по элементам Overpass (`out body geom`); элементы без категории и стиля отбрасываются
+    cat_fns = list(metrics.CATEGORIES.values())
+    kind, ids, part, cats, style, gtype, lens, coords = [], [], [], [], [], [], [], []
+    for el in elements:
+        typ, tags = el.get("type"), el.get("tags", {})
+        mask = 0
+        for i, f in enumerate(cat_fns):
+            if f(tags, typ):
+                mask |= 1 << i
+        if "geometry" in el:
+            if typ != "way":
+                continue
+            pts = [(p["lon"], p["lat"]) for p in el["geometry"] if p]
+            st = style_of(tags)
+            # Полигоны — по тем же тегам, что в metrics._element_geom; кольцо замыкается
+            if tags.get("area") == "yes" or tags.get("natural") == "water" or tags.get("landuse") == "reservoir":
+                if len(pts) >= 3 and pts[0] != pts[-1]:
+                    pts.append(pts[0])
+                gt = POLYGON if len(pts) >= 4 else NONE
+            else:
+                gt = LINE if len(pts) >= 2 else NONE
+            if len(pts) < 2 or (st is None and not (mask and gt != NONE)):
+                continue
+            kind.append(WAY)
+            style.append(STYLES.index(st) if st else -1)
+        elif typ == "node" and "lat" in el and "lon" in el:
+            if not mask:
+                continue
+            pts, gt = [(el["lon"], el["lat"])], POINT
+            kind.append(NODE)
+            style.append(-1)
+        else:
+            continue
+        oid, pt = _osm_id(el.get("id"))
+        ids.append(oid)
+        part.append(pt)
+        cats.append(mask)
+        gtype.append(gt)
+        lens.append(len(pts))
+        coords.extend(pts)
+    return Columns(np.array(kind, dtype=np.uint8), np.array(ids, dtype=np.int64), np.array(part, dtype=np.int32),
+                   np.array(cats, dtype=np.uint16), np.array(style, dtype=np.int8), np.array(gtype, dtype=np.int8),
+                   np.concatenate(([0], np.cumsum(lens, dtype=np.int64))).astype(np.int64),
+                   np.array(coords, dtype=np.float64).reshape(-1, 2), np.array(list(metrics.CATEGORIES)))
+
+def of(osm_data):
+    # Колонки как есть либо из ответа Overpass (dict)
+    return osm_data if isinstance(osm_data, Columns) else from_elements(osm_data.get("elements", []))
+
+def merge(parts):
+    # Склейка соседних тайлов с дедупликацией по (тип, id, часть) — первое вхождение, порядок сохраняется;
+    # элементы без id (< 0) не дедуплицируются
+    parts = list(parts)
+    if len(parts) == 1:
+        return parts[0]
+    shift = np.cumsum([0] + [len(p.coords) for p in parts[:-1]])
+    cat = lambda f: np.concatenate([getattr(p, f) for p in parts])
+    both = Columns(cat("kind"), cat("ids"), cat("part"), cat("cats"), cat("style"), cat("gtype"),
+                   np.concatenate([[0]] + [p.offsets[1:] + s for p, s in zip(parts, shift)]).astype(np.int64),
+                   cat("coords"), parts[0].cat_names)
+    known = np.flatnonzero(both.ids >= 0)
+    _, first = np.unique(np.column_stack((both.ids, both.kind, both.part))[known], axis=0, return_index=True)
+    return both.take(np.sort(np.concatenate((known[first], np.flatnonzero(both.ids < 0)))))
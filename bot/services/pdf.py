@@ -1,13 +1,64 @@
+# PDF-отчёт на reportlab. Разметка страницы — Jinja-шаблон templates/report_pdf.txt (строка = блок),
+# здесь только раскладка блоков по странице. Шрифты с кириллицей регистрируются и шаблон
+# компилируется один раз на процесс; карта встраивается из байтов, без файлов.
+# Результат — байты PDF (отправляются в Telegram как есть).
 import os
+import io
+import re
 import datetime
 import logging
+from functools import lru_cache
 from jinja2 import Environment, FileSystemLoader, select_autoescape
+from . import scoring
+
+def _one_line(v):
+    # Подстановки в построчный шаблон: перевод строки в адресе/источнике/названии иначе рвёт блок
+    return re.sub(r"[\r\n]+", " ", v) if isinstance(v, str) else v
 
 env = Environment(
     loader=FileSystemLoader("templates"),
-    autoescape=select_autoescape(["html"])
+    autoescape=select_autoescape(["html"]),
+    finalize=_one_line
 )
 
+# Шрифты с кириллицей: из PDF_FONT/PDF_FONT_BOLD или первый найденный из системных
+PDF_FONT = os.getenv("PDF_FONT", "")
+PDF_FONT_BOLD = os.getenv("PDF_FONT_BOLD", "")
+FONT_CANDIDATES = [
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/dejavu/DejaVuSans.ttf", "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+     "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf"),
+    ("C:/Windows/Fonts/arial.ttf", "C:/Windows/Fonts/arialbd.ttf"),
+    ("/Library/Fonts/Arial Unicode.ttf", "/Library/Fonts/Arial Unicode.ttf"),
+]
+PDF_COMPRESS = os.getenv("PDF_COMPRESS", "1").strip().lower() in ("1", "true", "yes", "on")
+
+# Раскладка A4, пункты
+MARGIN = 40
+LEADING = {"h1": 22, "h2": 18, "text": 14, "muted": 12, "row": 14}
+SIZES = {"h1": 16, "h2": 12, "text": 10, "muted": 8, "row": 10}
+MAP_MAX_H = 240  # участок с картой помещается на одну страницу
+SUMMARY_ROWS_PER_PAGE = 50
+
+@lru_cache(maxsize=None)
+def fonts():
+    # (обычный, жирный) — имена зарегистрированных в reportlab шрифтов
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    pairs = ([(PDF_FONT, PDF_FONT_BOLD or PDF_FONT)] if PDF_FONT else []) + FONT_CANDIDATES
+    for regular, bold in pairs:
+        if os.path.exists(regular) and os.path.exists(bold):
+            pdfmetrics.registerFont(TTFont("Report", regular))
+            pdfmetrics.registerFont(TTFont("Report-Bold", bold))
+            return "Report", "Report-Bold"
+    logging.warning("PDF: no TTF font with Cyrillic found (set PDF_FONT), falling back to Helvetica")
+    return "Helvetica", "Helvetica-Bold"
+
+@lru_cache(maxsize=None)
+def _template():
+    return env.get_template("report_pdf.txt")
+
 def _wrap(c, text, max_width, font_name="Helvetica", font_size=10):
     from reportlab.pdfbase.pdfmetrics import stringWidth
     words = (text or "").split()
@@ -24,5 +75,114 @@ def _wrap(c, text, max_width, font_name="Helvetica", font_size=10):
         lines.append(line)
     return lines
 
-def render_report(*args, **kwargs):
-    return None
\ No newline at end of file
+def _blocks(metric_set, addr, source, has_map, title=""):
+    text = _template().render(
+        m=metric_set, addr=addr or {}, source=source, has_map=has_map, title=title,
+        profile_title=scoring.PROFILES.get(metric_set.get("profile"), {}).get("title"),
+        generated_at=datetime.datetime.now().strftime("%Y-%m-%d %H:%M"))
+    out = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            kind, _, rest = line.partition("|")
+            out.append((kind, rest))
+    return out
+
+class _Layout:
+    # Курсор по странице: переносы строк и страниц
+    def __init__(self, c):
+        from reportlab.lib.pagesizes import A4
+        self.c = c
+        self.w, self.h = A4
+        self.font, self.bold = fonts()
+        self.y = self.h - MARGIN
+
+    def need(self, dy):
+        if self.y - dy < MARGIN:
+            self.c.showPage()
+            self.y = self.h - MARGIN
+
+    def page(self):
+        self.c.showPage()
+        self.y = self.h - MARGIN
+
+    def text(self, kind, s):
+        font = self.bold if kind in ("h1", "h2") else self.font
+        size, lead = SIZES[kind], LEADING[kind]
+        self.c.setFillColorRGB(*((0.4, 0.4, 0.4) if kind == "muted" else (0, 0, 0)))
+        for line in _wrap(self.c, s, self.w - 2 * MARGIN, font, size) or [""]:
+            self.need(lead)
+            self.y -= lead
+            self.c.setFont(font, size)
+            self.c.drawString(MARGIN, self.y + 4, line)
+
+    def row(self, s):
+        label, _, value = s.rpartition("|")
+        lead, size = LEADING["row"], SIZES["row"]
+        self.need(lead)
+        self.y -= lead
+        base = self.y + 4
+        self.c.setFillColorRGB(0, 0, 0)
+        self.c.setFont(self.font, size)
+        self.c.drawString(MARGIN + 4, base, label)
+        self.c.drawRightString(self.w - MARGIN - 4, base, value)
+        self.c.setStrokeColorRGB(0.9, 0.9, 0.9)
+        self.c.line(MARGIN, self.y, self.w - MARGIN, self.y)
+
+    def image(self, img):
+        iw, ih = img.getSize()
+        w = self.w - 2 * MARGIN
+        h = min(MAP_MAX_H, w * ih / iw)
+        w = h * iw / ih
+        self.need(h + 8)
+        self.y -= h + 4
+        self.c.drawImage(img, MARGIN + (self.w - 2 * MARGIN - w) / 2, self.y, w, h)
+        self.y -= 4
+
+def _draw_report(lay, metric_set, addr, source, map_bytes, title=""):
+    from reportlab.lib.utils import ImageReader
+    img = ImageReader(io.BytesIO(map_bytes)) if map_bytes else None
+    for kind, s in _blocks(metric_set, addr, source, img is not None, title):
+        if kind == "map":
+            lay.image(img)
+        elif kind == "row":
+            lay.row(s)
+        elif kind == "gap":
+            lay.y -= 8
+        elif kind in SIZES:
+            lay.text(kind, s)
+
+def _canvas(buf, title):
+    from reportlab.pdfgen import canvas
+    c = canvas.Canvas(buf, pageCompression=1 if PDF_COMPRESS else 0)
+    c.setTitle(title)
+    return c
+
+def render_report(metric_set, addr, source="", map_bytes=None):
+    # Отчёт по одному участку → байты PDF
+    buf = io.BytesIO()
+    c = _canvas(buf, "Скоринг земельного участка")
+    _draw_report(_Layout(c), metric_set, addr, source, map_bytes)
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+def render_batch_report(items, source=""):
+    # Сводный отчёт: таблица всех участков, затем по странице на участок.
+    # items: [(id, metric_set, addr или None, байты карты или None)]
+    buf = io.BytesIO()
+    c = _canvas(buf, f"Скоринг участков: {len(items)}")
+    lay = _Layout(c)
+    lay.text("h1", f"Скоринг участков: {len(items)}")
+    lay.text("muted", f"Источник: {source or '—'} · Отчёт: {datetime.datetime.now():%Y-%m-%d %H:%M}")
+    ranked = sorted(items, key=lambda it: -it[1]["score"]["total"])
+    for i, (pid, m, _, _) in enumerate(ranked):
+        if i and i % SUMMARY_ROWS_PER_PAGE == 0:
+            lay.page()
+        lay.row(f"{i + 1}. {pid} · {m['area_ha']:.2f} га|{m['score']['total']}/100")
+    for pid, m, addr, map_bytes in items:
+        lay.page()
+        _draw_report(lay, m, addr, source, map_bytes, title=str(pid))
+    c.showPage()
+    c.save()
+    return buf.getvalue()
@@ -0,0 +1,102 @@
+# Сэмплирующий профайлер для медленных запросов. Пока идёт хотя бы один профилируемый запрос,
+# фоновый поток раз в PROFILE_INTERVAL_S снимает стеки всех потоков процесса (sys._current_frames)
+# в кольцевой буфер. Если запрос длился дольше PROFILE_SLOW_S, его отрезок буфера сохраняется
+# в PROFILE_DIR в формате collapsed stacks («кадр;кадр;… N» — вход flamegraph.pl, speedscope, inferno).
+# Стеки общие для процесса: параллельные запросы попадают в профиль друг друга; код в пуле
+# процессов (workers) виден только как ожидание результата.
+#
+# PROFILE_SLOW_S=0 (по умолчанию) — выключен, накладных расходов нет.
+import os, sys, time, logging, threading
+from collections import deque, Counter
+from contextlib import contextmanager
+
+from . import telemetry
+
+PROFILE_SLOW_S = float(os.getenv("PROFILE_SLOW_S", "0"))
+PROFILE_INTERVAL_S = float(os.getenv("PROFILE_INTERVAL_S", "0.005"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.getenv("CACHE_DIR", "./cache"), "profiles"))
+PROFILE_MAX_SAMPLES = 200_000  # ~15 минут при 5 мс
+
+# Листовые кадры простаивающих потоков (select event loop'а, пустые пулы) — в профиль не идут
+IDLE = {("selectors.py", "select"), ("threading.py", "wait"), ("thread.py", "_worker"), ("queue.py", "get")}
+
+_samples = deque(maxlen=PROFILE_MAX_SAMPLES)  # (время, свёрнутый стек)
+_active = 0
+_cond = threading.Condition()
+_thread = None
+
+def _frame_name(f):
+    c = f.f_code
+    return f"{os.path.basename(c.co_filename)}:{c.co_name}:{f.f_lineno}"
+
+def _fold(f):
+    c = f.f_code
+    if (os.path.basename(c.co_filename), c.co_name) in IDLE:
+        return None
+    names = []
+    while f is not None:
+        names.append(_frame_name(f))
+        f = f.f_back
+    return ";".join(reversed(names))
+
+def _loop():
+    me = threading.get_ident()
+    while True:
+        with _cond:
+            while not _active:
+                _cond.wait()
+        threads = {t.ident: t.name for t in threading.enumerate()}
+        now = time.perf_counter()
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = _fold(frame)
+            if stack:
+                _samples.append((now, f"{threads.get(ident, ident)};{stack}"))
+        time.sleep(PROFILE_INTERVAL_S)
+
+def _start():
+    global _thread, _active
+    with _cond:
+        _active += 1
+        if _thread is None:
+            _thread = threading.Thread(target=_loop, name="profiler", daemon=True)
+            _thread.start()
+        _cond.notify()
+
+def _stop():
+    global _active
+    with _cond:
+        _active -= 1
+
+def dump(t0, t1, label):
+    # Отрезок буфера [t0, t1] → файл collapsed stacks; путь или None, если сэмплов нет
+    stacks = Counter(s for t, s in list(_samples) if t0 <= t <= t1)
+    if not stacks:
+        return None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in label)[:40]
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{safe}_{(t1 - t0) * 1000:.0f}ms.folded")
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, n in stacks.most_common():
+            f.write(f"{stack} {n}\n")
+    return path
+
+@contextmanager
+def profile(label, slow_s=None):
+    # with profile("pipeline kml"): ... — профиль сохраняется, только если блок оказался медленным
+    slow_s = PROFILE_SLOW_S if slow_s is None else slow_s
+    if not slow_s:
+        yield
+        return
+    _start()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        t1 = time.perf_counter()
+        _stop()
+        if t1 - t0 > slow_s:
+            telemetry.SLOW_REQUESTS.inc(kind=label.split()[0])
+            path = dump(t0, t1, label)
+            logging.warning("slow request %s: %.2fs, profile %s", label, t1 - t0, path)
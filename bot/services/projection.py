@@ -0,0 +1,54 @@
+# Общий контекст проекции участка: зона UTM, Transformer'ы и уже спроецированный участок.
+# Transformer'ы кэшируются на всё время жизни процесса (по паре EPSG), контексты — по WKB участка,
+# поэтому стадии DEM и метрик одного запроса (в одном воркере или потоке) проецируют участок один раз.
+# Перепроецирование — пакетное: shapely.transform отдаёт все координаты массива геометрий
+# одним вызовом векторного pyproj, без shapely.ops.transform с Python-функцией на каждую вершину.
+#
+# Зона UTM выбирается один раз по центроиду участка (для пакета — по центру кластера) и дальше
+# передаётся явно: участок у границы зон считается в одной зоне на всех стадиях, а индекс OSM
+# из build_osm_index не перестраивается из-за того, что центроид соседа попал в другую зону.
+import os, functools
+import numpy as np
+import shapely
+
+WGS84 = 4326
+PROJ_CONTEXT_CACHE = int(os.getenv("PROJ_CONTEXT_CACHE", "64"))
+
+def utm_epsg(lon, lat):
+    zone = min(60, max(1, int((lon + 180) / 6) + 1))
+    return (32600 if lat >= 0 else 32700) + zone
+
+@functools.lru_cache(maxsize=None)
+def transformer(src, dst):
+    from pyproj import Transformer
+    return Transformer.from_crs(f"EPSG:{src}", f"EPSG:{dst}", always_xy=True)
+
+def project(geoms, tr):
+    # Геометрия или массив геометрий → та же форма в другой СК (tr — pyproj.Transformer)
+    if isinstance(geoms, np.ndarray) and len(geoms) == 0:
+        return geoms
+    return shapely.transform(geoms, lambda c: np.column_stack(tr.transform(c[:, 0], c[:, 1])))
+
+class Context:
+    def __init__(self, geom_wgs84, epsg, parcel_utm=None):
+        self.geom = geom_wgs84
+        self.epsg = epsg
+        self.to_utm = transformer(WGS84, epsg).transform
+        self.to_wgs = transformer(epsg, WGS84).transform
+        self.parcel_utm = parcel_utm if parcel_utm is not None else project(geom_wgs84, transformer(WGS84, epsg))
+
+@functools.lru_cache(maxsize=PROJ_CONTEXT_CACHE)
+def _context(wkb, epsg):
+    return Context(shapely.from_wkb(wkb), epsg)
+
+def context(geom_wgs84, epsg=None):
+    # epsg=None — зона по центроиду участка
+    if epsg is None:
+        c = geom_wgs84.centroid
+        epsg = utm_epsg(c.x, c.y)
+    return _context(geom_wgs84.wkb, epsg)
+
+def contexts(geoms_wgs84, epsg):
+    # Контексты для группы участков в одной зоне (пакетный режим): все участки — одним вызовом
+    geoms = np.array(geoms_wgs84, dtype=object)
+    return [Context(g, epsg, u) for g, u in zip(geoms, project(geoms, transformer(WGS84, epsg)))]
@@ -0,0 +1,113 @@
+# Профили скоринга: веса и пороги заданы декларативно и применяются к «сырым» измерениям
+# участка (дистанции, фасад, рельеф), поэтому смена профиля не требует пересчёта OSM/DEM.
+# Все функции работают и со скалярами (один участок), и с массивами NumPy
+# (растр heatmap, пакетный пересчёт миллиона снимков).
+import numpy as np
+
+# Виды слагаемых:
+#   dist  — ≤good м → 100, ≥bad м → 0, между — линейно; нет объекта (NaN) → 0
+#   flood — 100 − риск подтопления (низинность + близость воды + увлажнение) × 100
+#   slope — 100 − |уклон − optimum| × k
+#   flag  — yes/no по логическому признаку
+PROFILES = {
+    "izhs": {
+        "title": "ИЖС",
+        "terms": {
+            "access": {"kind": "dist", "measure": "d_road_m", "good": 300, "bad": 5000},
+            "flood": {"kind": "flood"},
+            "slope": {"kind": "slope", "optimum": 3, "k": 15},  # лучше около 0–5%
+            "infra": {"kind": "dist", "measure": "d_stop_m", "good": 500, "bad": 4000},
+            "power": {"kind": "dist", "measure": "d_power_m", "good": 300, "bad": 5000},
+            "road": {"kind": "flag", "measure": "touches_road", "yes": 100, "no": 40},
+        },
+        "weights": {"access": 0.25, "flood": 0.20, "slope": 0.20, "infra": 0.15, "power": 0.10, "road": 0.10},
+    },
+    "agri": {
+        "title": "Сельхоз",
+        "terms": {
+            "access": {"kind": "dist", "measure": "d_road_m", "good": 500, "bad": 8000},
+            "flood": {"kind": "flood"},
+            "slope": {"kind": "slope", "optimum": 2, "k": 10},
+            "infra": {"kind": "dist", "measure": "d_stop_m", "good": 2000, "bad": 10000},
+            "power": {"kind": "dist", "measure": "d_power_m", "good": 500, "bad": 8000},
+            "road": {"kind": "flag", "measure": "touches_road", "yes": 100, "no": 60},
+        },
+        "weights": {"access": 0.20, "flood": 0.30, "slope": 0.30, "infra": 0.05, "power": 0.10, "road": 0.05},
+    },
+    "commercial": {
+        "title": "Коммерция",
+        "terms": {
+            "access": {"kind": "dist", "measure": "d_road_m", "good": 100, "bad": 3000},
+            "flood": {"kind": "flood"},
+            "slope": {"kind": "slope", "optimum": 1, "k": 20},
+            "infra": {"kind": "dist", "measure": "d_stop_m", "good": 200, "bad": 2000},
+            "power": {"kind": "dist", "measure": "d_power_m", "good": 200, "bad": 3000},
+            "road": {"kind": "flag", "measure": "touches_road", "yes": 100, "no": 0},
+        },
+        "weights": {"access": 0.35, "flood": 0.15, "slope": 0.15, "infra": 0.15, "power": 0.10, "road": 0.10},
+    },
+}
+DEFAULT_PROFILE = "izhs"
+
+def norm_inv_dist(d, good, bad):
+    # ≤good → 100, ≥bad → 0, между — линейно
+    return np.clip(100 * (bad - np.asarray(d, dtype=float)) / (bad - good), 0, 100)
+
+def flood_risk(rel_low, d_water, wetness):
+    # d_water = NaN — воды рядом нет; NaN в рельефе — нет данных DEM
+    rel_low = np.nan_to_num(np.asarray(rel_low, dtype=float))
+    d_water = np.asarray(d_water, dtype=float)
+    risk = np.where(rel_low < -1.5, np.minimum(1.0, np.abs(rel_low) / 3.0), 0.0)  # до 1.0
+    near = np.maximum(0.0, (50 - np.minimum(np.nan_to_num(d_water, nan=50.0), 50)) / 50.0)
+    risk = risk + near * 0.7  # ближе 50м — высокий риск
+    risk = risk + 0.5 * np.nan_to_num(np.asarray(wetness, dtype=float))
+    return np.clip(risk, 0.0, 1.0)
+
+def measures_of(metric_set):
+    # Сырые измерения из результата metrics.compute_all (None → NaN)
+    dem = metric_set.get("dem") or {}
+    f = lambda v: np.nan if v is None else float(v)
+    return {
+        "d_road_m": f(metric_set.get("d_road_m")),
+        "d_stop_m": f(metric_set.get("d_stop_m")),
+        "d_power_m": f(metric_set.get("d_power_m")),
+        "d_water_m": f(metric_set.get("d_water_m")),
+        "touches_road": bool(metric_set.get("touches_road")),
+        "slope_pct": f(dem.get("slope_indicative_pct")),
+        "rel_lowness_m": f(dem.get("rel_lowness_m")),
+        "wetness_idx": f(dem.get("wetness_idx")),
+    }
+
+def score(measures, profile=DEFAULT_PROFILE):
+    # measures: d_road_m, d_stop_m, d_power_m, d_water_m, touches_road, slope_pct,
+    # rel_lowness_m, wetness_idx (скаляры или массивы одной формы; NaN — нет данных)
+    p = PROFILES[profile]
+    out, total = {}, 0.0
+    for name, t in p["terms"].items():
+        kind = t["kind"]
+        if kind == "dist":
+            d = np.asarray(measures[t["measure"]], dtype=float)
+            s = norm_inv_dist(np.nan_to_num(d, nan=t["bad"]), t["good"], t["bad"])
+        elif kind == "flood":
+            risk = measures.get("flood_risk")
+            if risk is None:
+                risk = flood_risk(measures["rel_lowness_m"], measures["d_water_m"], measures["wetness_idx"])
+            s = 100 - np.floor(np.asarray(risk) * 100)
+        elif kind == "slope":
+            # Нет данных о рельефе — считаем уклон умеренным (5%)
+            sl = np.nan_to_num(np.asarray(measures["slope_pct"], dtype=float), nan=5.0)
+            s = np.maximum(0, 100 - np.minimum(100, np.abs(sl - t["optimum"]) * t["k"]))
+        elif kind == "flag":
+            s = np.where(np.asarray(measures[t["measure"]], dtype=bool), float(t["yes"]), float(t["no"]))
+        else:
+            raise ValueError(f"Неизвестный вид слагаемого: {kind}")
+        out[name] = s
+        total = total + p["weights"].get(name, 0.0) * s
+    total = np.round(total)
+    out["total"] = total.astype(int) if np.ndim(total) else int(total)
+    return out
+
+def score_scalar(measures, profile=DEFAULT_PROFILE):
+    # Для одного участка: обычные float/int вместо 0-мерных массивов
+    s = score(measures, profile)
+    return {k: (v if k == "total" else float(v)) for k, v in s.items()}
@@ -0,0 +1,34 @@
+# Single-flight: одновременные одинаковые вызовы (один и тот же ключ кэша) ждут один общий
+# результат вместо того, чтобы каждый шёл в Nominatim/Overpass/DEM.
+import asyncio
+from collections import defaultdict
+
+_tasks = {}  # (event loop, ключ) → asyncio.Task ведущего вызова
+_counters = defaultdict(lambda: {"calls": 0, "coalesced": 0})
+
+def _done(k, task):
+    if _tasks.get(k) is task:
+        del _tasks[k]
+    if not task.cancelled():
+        task.exception()  # исключение получат ожидающие; здесь только гасим предупреждение asyncio
+
+async def do(ns: str, key: str, fn):
+    # fn — функция без аргументов, возвращающая корутину; выполняется один раз на ключ.
+    # Ведущий вызов идёт отдельной задачей: отмена одного ожидающего не отменяет остальных
+    c = _counters[ns]
+    c["calls"] += 1
+    k = (asyncio.get_running_loop(), f"{ns}:{key}")
+    task = _tasks.get(k)
+    if task is None:
+        task = asyncio.ensure_future(fn())
+        _tasks[k] = task
+        task.add_done_callback(lambda t: _done(k, t))
+    else:
+        c["coalesced"] += 1
+    return await asyncio.shield(task)
+
+def stats():
+    return {ns: dict(c) for ns, c in _counters.items()}
+
+def inflight():
+    return len(_tasks)
@@ -0,0 +1,66 @@
+# Минимальный планировщик стадий: граф зависимостей, каждая стадия стартует,
+# как только готовы её зависимости; у стадии свой таймаут и, при желании, значение
+# по умолчанию на случай ошибки (тогда сбой стадии не валит весь пайплайн).
+import asyncio, logging, time
+from . import telemetry
+
+_NO_DEFAULT = object()
+
+class Stage:
+    def __init__(self, name, fn, deps=(), timeout=None, default=_NO_DEFAULT):
+        # fn(results) — корутина; results — dict с результатами уже выполненных зависимостей
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.default = default
+
+class StageError(RuntimeError):
+    def __init__(self, stage, cause):
+        msg = "превышено время ожидания" if isinstance(cause, asyncio.TimeoutError) else str(cause)
+        super().__init__(f"{stage}: {msg}")
+        self.stage = stage
+        self.cause = cause
+
+async def run_stages(stages, timings=None):
+    by_name = {s.name: s for s in stages}
+    for s in stages:
+        for d in s.deps:
+            if d not in by_name:
+                raise ValueError(f"Стадия {s.name} зависит от неизвестной {d}")
+    results, tasks = {}, {}
+
+    async def run(s):
+        if s.deps:
+            await asyncio.gather(*(tasks[d] for d in s.deps))
+        t0 = time.perf_counter()
+        telemetry.STAGE_INFLIGHT.inc(stage=s.name)
+        try:
+            res = await asyncio.wait_for(s.fn(results), s.timeout)
+        except Exception as e:
+            reason = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+            if s.default is _NO_DEFAULT:
+                telemetry.STAGE_FAILURES.inc(stage=s.name, reason=reason, outcome="raised")
+                raise StageError(s.name, e) from e
+            telemetry.STAGE_FAILURES.inc(stage=s.name, reason=reason, outcome="default")
+            logging.warning("stage %s failed, using default: %r", s.name, e)
+            res = s.default
+        finally:
+            dt = time.perf_counter() - t0
+            telemetry.STAGE_INFLIGHT.dec(stage=s.name)
+            telemetry.STAGE_SECONDS.observe(dt, stage=s.name)
+            if timings is not None:
+                timings[s.name] = dt
+        results[s.name] = res
+        return res
+
+    for s in stages:
+        tasks[s.name] = asyncio.ensure_future(run(s))
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for t in tasks.values():
+            t.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    return results
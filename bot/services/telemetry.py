@@ -0,0 +1,146 @@
+# Метрики процесса в текстовом формате Prometheus (GET /metrics на aiohttp-сервере бота).
+# Без внешних зависимостей: счётчики, gauge и гистограммы с метками, потокобезопасные
+# (стадии идут в event loop, кэши и SQLite — в asyncio.to_thread). Значения из других
+# подсистем (очередь заданий, JSON-кэш, single-flight) снимаются в момент запроса — collector().
+# Работа внутри пула процессов (workers) видна только как длительность стадии в основном процессе.
+import time, threading
+from contextlib import contextmanager
+
+PREFIX = "landscore_"
+# Границы гистограмм, секунды: от быстрых попаданий в кэш до таймаутов стадий
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+_lock = threading.Lock()
+_metrics = []     # в порядке объявления
+_collectors = []  # fn() → [(имя, тип, описание, [(метки, значение)])]
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+def _fmt_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+def _fmt_value(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help):
+        self.name, self.help = PREFIX + name, help
+        self.values = {}
+        _metrics.append(self)
+
+    def inc(self, n=1, **labels):
+        k = _key(labels)
+        with _lock:
+            self.values[k] = self.values.get(k, 0) + n
+
+    def samples(self):
+        return [(self.name, k, v) for k, v in self.values.items()]
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, v, **labels):
+        with _lock:
+            self.values[_key(labels)] = v
+
+    def dec(self, n=1, **labels):
+        self.inc(-n, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        # В работе сейчас: +1 на время блока
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, buckets=BUCKETS):
+        self.name, self.help = PREFIX + name, help
+        self.buckets = tuple(buckets)
+        self.values = {}  # метки → [счётчики по корзинам..., сумма, количество]
+        _metrics.append(self)
+
+    def observe(self, v, **labels):
+        k = _key(labels)
+        with _lock:
+            row = self.values.get(k)
+            if row is None:
+                row = self.values[k] = [0] * len(self.buckets) + [0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if v <= b:
+                    row[i] += 1
+                    break
+            row[-2] += v
+            row[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def samples(self):
+        out = []
+        for k, row in self.values.items():
+            acc = 0
+            for b, n in zip(self.buckets, row):
+                acc += n
+                out.append((self.name + "_bucket", k, acc, (("le", _fmt_value(float(b))),)))
+            out.append((self.name + "_bucket", k, row[-1], (("le", "+Inf"),)))
+            out.append((self.name + "_sum", k, row[-2]))
+            out.append((self.name + "_count", k, row[-1]))
+        return out
+
+def collector(fn):
+    # fn() вызывается при каждом запросе /metrics; годится как декоратор
+    _collectors.append(fn)
+    return fn
+
+def render():
+    lines = []
+    with _lock:
+        for m in _metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.type}")
+            for name, k, v, *extra in m.samples():
+                lines.append(f"{name}{_fmt_labels(k, extra[0] if extra else ())} {_fmt_value(v)}")
+    for fn in _collectors:
+        for name, typ, help, samples in fn():
+            lines.append(f"# HELP {PREFIX}{name} {help}")
+            lines.append(f"# TYPE {PREFIX}{name} {typ}")
+            for labels, v in samples:
+                lines.append(f"{PREFIX}{name}{_fmt_labels(_key(labels))} {_fmt_value(v)}")
+    return "\n".join(lines) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- метрики бота ---
+
+PIPELINE_SECONDS = Histogram("pipeline_seconds", "Full parcel pipeline duration")
+PIPELINE_INFLIGHT = Gauge("pipeline_inflight", "Parcel pipelines running now")
+STAGE_SECONDS = Histogram("stage_seconds", "Pipeline stage duration (geocode, overpass, dem, metrics, map, pdf, ...)")
+STAGE_INFLIGHT = Gauge("stage_inflight", "Pipeline stages running now")
+STAGE_FAILURES = Counter("stage_failures_total", "Failed stages; outcome=default means the stage fell back")
+UPSTREAM_SECONDS = Histogram("upstream_request_seconds", "Upstream HTTP request duration including retries")
+UPSTREAM_INFLIGHT = Gauge("upstream_inflight", "Upstream HTTP requests in flight")
+UPSTREAM_ERRORS = Counter("upstream_errors_total", "Upstream HTTP errors per attempt (429/5xx/network are retried)")
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by cache and result (hit/miss)")
+SLOW_REQUESTS = Counter("slow_requests_total", "Requests over PROFILE_SLOW_S (profile dumped)")
+WARMUP_SECONDS = Gauge("warmup_seconds", "Warm-up phase duration by step (bot/services/warmup.py)")
+READY = Gauge("ready", "1 once the warm-up phase has finished")
+READY.set(0)
@@ -0,0 +1,81 @@
+# Загрузка растровых тайлов подложки через кэш bot/storage/tile_cache.py.
+# Свежий тайл (моложе TILE_TTL_S) отдаётся с диска; устаревший ревалидируется условным запросом
+# (If-None-Match / If-Modified-Since); сеть — через общий пул и token bucket upstream'а "tiles".
+# TILE_OFFLINE=1 — только кэш: чего нет на диске, то рисуется пустой подложкой.
+#
+#   python -m bot.services.tiles seed minlon minlat maxlon maxlat zmin zmax   # засеять кэш
+import os, sys, time, asyncio, logging
+from ..storage import tile_cache
+from . import http_client, singleflight, osm
+
+TILE_URL = os.getenv("TILE_URL", "https://tile.openstreetmap.org/{z}/{x}/{y}.png")
+TILE_SOURCE = os.getenv("TILE_SOURCE", "osm")  # имя источника = подкаталог кэша
+TILE_TTL_S = int(os.getenv("TILE_TTL_S", str(7 * 24 * 3600)))
+TILE_OFFLINE = os.getenv("TILE_OFFLINE", "0").strip().lower() in ("1", "true", "yes", "on")
+TILE_EVICT_INTERVAL_S = 600
+
+_last_evict = 0.0
+
+async def fetch_tile(z, x, y):
+    # (байты или None, как получен: hit | fetched | revalidated | stale | missing)
+    return await singleflight.do("tile", f"{TILE_SOURCE}/{z}/{x}/{y}", lambda: _fetch_tile(z, x, y))
+
+async def _fetch_tile(z, x, y):
+    cached = await asyncio.to_thread(tile_cache.get, TILE_SOURCE, z, x, y)
+    if cached is not None and (TILE_OFFLINE or time.time() - cached[1]["fetched"] < TILE_TTL_S):
+        return cached[0], "hit"
+    if TILE_OFFLINE:
+        return None, "missing"
+    headers = {}
+    if cached is not None:
+        if cached[1]["etag"]:
+            headers["If-None-Match"] = cached[1]["etag"]
+        if cached[1]["last_modified"]:
+            headers["If-Modified-Since"] = cached[1]["last_modified"]
+    try:
+        status, h, body = await http_client.request_bytes("tiles", "GET", TILE_URL.format(z=z, x=x, y=y), headers=headers)
+    except Exception as e:
+        logging.warning("tile %s/%s/%s: %s", z, x, y, e)
+        # Нет сети — лучше устаревший тайл, чем дыра в подложке
+        return (cached[0], "stale") if cached is not None else (None, "missing")
+    if status == 304 and cached is not None:
+        await asyncio.to_thread(tile_cache.revalidated, TILE_SOURCE, z, x, y)
+        return cached[0], "revalidated"
+    await asyncio.to_thread(tile_cache.put, TILE_SOURCE, z, x, y, body, h.get("ETag"), h.get("Last-Modified"))
+    return body, "fetched"
+
+async def fetch_tiles(z, xys):
+    # {(x, y): байты или None} и счётчики по способу получения
+    res = await asyncio.gather(*(fetch_tile(z, x, y) for x, y in xys))
+    counts = {}
+    for _, how in res:
+        counts[how] = counts.get(how, 0) + 1
+    await asyncio.to_thread(_after_fetch)
+    return {xy: data for xy, (data, _) in zip(xys, res)}, counts
+
+def _after_fetch():
+    global _last_evict
+    tile_cache.flush_access()
+    if time.time() - _last_evict > TILE_EVICT_INTERVAL_S:
+        _last_evict = time.time()
+        tile_cache.evict()
+
+def fetch_tiles_sync(z, xys):
+    # Для рендера в воркере/потоке без своего event loop
+    return http_client.run_sync(fetch_tiles(z, xys))
+
+def seed(bbox, zmin, zmax):
+    total = {}
+    for z in range(zmin, zmax + 1):
+        _, counts = fetch_tiles_sync(z, osm.tiles_for_bbox(bbox, z))
+        for k, v in counts.items():
+            total[k] = total.get(k, 0) + v
+    return total
+
+if __name__ == "__main__":
+    if len(sys.argv) == 8 and sys.argv[1] == "seed":
+        bbox = tuple(float(v) for v in sys.argv[2:6])
+        print(seed(bbox, int(sys.argv[6]), int(sys.argv[7])), tile_cache.stats())
+    else:
+        print("usage: python -m bot.services.tiles seed minlon minlat maxlon maxlat zmin zmax")
+        sys.exit(2)
@@ -0,0 +1,36 @@
+# Фаза прогрева: запускается фоном сразу после старта web-сервера, бот в это время уже отвечает.
+# Поднимает пул воркеров и ждёт их инициализации (в каждом: импорты, PROJ для частых зон UTM,
+# memmap тайлов DEM, шрифты и шаблон PDF), то же — в основном процессе, плюс индекс геокодера.
+# Время каждого шага — в STATE (отдаётся /health) и в метрике landscore_warmup_seconds.
+import time, asyncio, logging
+from . import telemetry, workers
+
+STATE = {"status": "starting", "steps": {}, "total_s": None}
+
+def ready():
+    return STATE["status"] == "ready"
+
+async def _step(name, fn):
+    t0 = time.perf_counter()
+    try:
+        await fn()
+    except Exception:
+        # Прогрев — оптимизация: сбой шага не мешает работе, стадия просто сделает это сама
+        logging.exception("warm-up step %s failed", name)
+    dt = time.perf_counter() - t0
+    STATE["steps"][name] = round(dt, 3)
+    telemetry.WARMUP_SECONDS.set(dt, step=name)
+
+async def run(extra=()):
+    # extra — дополнительные шаги [(имя, корутинная функция)] из вызывающего кода
+    STATE["status"] = "warming"
+    t0 = time.perf_counter()
+    # Основной процесс: модули и PROJ нужны обработчикам (квадрат по точке, bbox) и режиму без пула
+    await _step("main", lambda: asyncio.to_thread(workers.warm))
+    await _step("workers", workers.wait_ready)
+    for name, fn in extra:
+        await _step(name, fn)
+    STATE["total_s"] = round(time.perf_counter() - t0, 3)
+    STATE["status"] = "ready"
+    telemetry.READY.set(1)
+    logging.info("warm-up done in %.2fs: %s", STATE["total_s"], STATE["steps"])
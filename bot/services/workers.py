@@ -0,0 +1,159 @@
+# Пул процессов для CPU-тяжёлых стадий (DEM, метрики, карта, PDF), чтобы они не делили GIL
+# с event loop'ом бота. Геометрии передаются как WKB, результаты — обычные dict/str.
+# WORKER_PROCESSES=0 — считать в потоках текущего процесса, как раньше.
+import os, time, asyncio, logging, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", str(max(1, (os.cpu_count() or 2) - 1))))
+# forkserver: не форкаем процесс бота с его потоками и открытыми соединениями
+WORKER_START_METHOD = os.getenv("WORKER_START_METHOD", "forkserver")
+# Зоны UTM (EPSG), для которых воркер заранее строит Transformer'ы; по умолчанию — Москва и окрестности
+WARM_UTM_EPSG = [int(x) for x in os.getenv("WARM_UTM_EPSG", "32636,32637,32638").split(",") if x.strip()]
+
+_pool = None
+
+def warm_imports():
+    from . import dem, metrics, map_render, heatmap, pdf
+    import reportlab.pdfgen.canvas
+
+def warm_proj():
+    # Transformer'ы попадают в кэш процесса (bot/services/projection.py) и переиспользуются запросами
+    from . import projection
+    for epsg in WARM_UTM_EPSG:
+        projection.transformer(projection.WGS84, epsg)
+        projection.transformer(epsg, projection.WGS84)
+
+def warm_dem_tiles():
+    # memmap уже засеянных тайлов DEM
+    from ..storage import dem_tiles
+    if os.path.isdir(dem_tiles.DEM_TILE_DIR):
+        for name in os.listdir(dem_tiles.DEM_TILE_DIR):
+            if len(name) == 11 and name.endswith(".hgt"):
+                lat = int(name[1:3]) * (1 if name[0] == "N" else -1)
+                lon = int(name[4:7]) * (1 if name[3] == "E" else -1)
+                dem_tiles.open_tile(lat, lon)
+
+def warm_pdf():
+    # Шрифты PDF и скомпилированный шаблон — один раз на процесс
+    from . import pdf
+    pdf.fonts()
+    pdf._template()
+
+def warm():
+    # Тяжёлые импорты, PROJ-трансформации, тайлы DEM, шрифты и шаблон PDF; {шаг: секунды}
+    timings = {}
+    def step(name, fn):
+        t0 = time.perf_counter()
+        fn()
+        timings[name] = time.perf_counter() - t0
+    step("imports", warm_imports)
+    step("proj", warm_proj)
+    step("dem_tiles", warm_dem_tiles)
+    step("pdf", warm_pdf)
+    return timings
+
+def _warm_worker():
+    # Инициализация воркера пула
+    warm()
+
+def _pool_or_none():
+    global _pool
+    if WORKER_PROCESSES <= 0:
+        return None
+    if _pool is None:
+        ctx = multiprocessing.get_context(WORKER_START_METHOD)
+        _pool = ProcessPoolExecutor(max_workers=WORKER_PROCESSES, mp_context=ctx, initializer=_warm_worker)
+        logging.info("worker pool: %d processes (%s)", WORKER_PROCESSES, WORKER_START_METHOD)
+    return _pool
+
+def _noop():
+    return os.getpid()
+
+def start():
+    # Поднять воркеры заранее (при старте бота), чтобы первый запрос не ждал их инициализации
+    pool = _pool_or_none()
+    if pool is None:
+        return []
+    return [pool.submit(_noop) for _ in range(WORKER_PROCESSES)]
+
+async def wait_ready(timeout=120):
+    # Дождаться, пока каждый воркер пройдёт инициализацию (_warm_worker): пустые задания
+    # отвечают pid'ом только после неё; первый готовый воркер забирает их все, поэтому раундами
+    pool = _pool_or_none()
+    if pool is None:
+        return 0
+    loop = asyncio.get_running_loop()
+    seen, deadline = set(), loop.time() + timeout
+    while len(seen) < WORKER_PROCESSES and loop.time() < deadline:
+        seen.update(await asyncio.gather(*(asyncio.wrap_future(f) for f in start())))
+        if len(seen) < WORKER_PROCESSES:
+            await asyncio.sleep(0.05)
+    return len(seen)
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+# --- задачи: выполняются в воркере, аргументы и результаты сериализуемы ---
+
+def _dem_task(wkb, step_m, buffer_m):
+    from shapely import wkb as swkb
+    from . import dem
+    return dem.compute_dem_stats(swkb.loads(wkb), step_m, buffer_m)
+
+def _metrics_task(wkb, osm_data, dem_stats):
+    from shapely import wkb as swkb
+    from . import metrics
+    return metrics.compute_all(swkb.loads(wkb), osm_data, dem_stats)
+
+def _map_task(wkb, osm_data, basemap):
+    from shapely import wkb as swkb
+    from . import map_render
+    return map_render.render_map(swkb.loads(wkb), osm_data, basemap=basemap)
+
+def _pdf_task(metric_set, addr, source, map_bytes):
+    from . import pdf
+    return pdf.render_report(metric_set, addr, source, map_bytes)
+
+def _batch_pdf_task(items, source):
+    from . import pdf
+    return pdf.render_batch_report(items, source)
+
+def _heatmap_task(lon, lat, osm_data, size_m, n, top_n):
+    from . import heatmap
+    return heatmap.heatmap_outputs(lon, lat, osm_data, size_m, n, top_n)
+
+async def _submit(fn, *args):
+    pool = _pool_or_none()
+    if pool is None:
+        return await asyncio.to_thread(fn, *args)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        # Воркер упал (OOM и т.п.) — пересоздадим пул при следующем вызове
+        shutdown()
+        raise
+
+async def compute_dem_stats(geom_wgs84, step_m=30.0, buffer_m=200):
+    return await _submit(_dem_task, geom_wgs84.wkb, step_m, buffer_m)
+
+async def compute_all(geom_wgs84, osm_data, dem_stats):
+    return await _submit(_metrics_task, geom_wgs84.wkb, osm_data, dem_stats)
+
+async def render_map(geom_wgs84, osm_data, basemap):
+    # Байты PNG/WebP карты участка; тайлы подложки (map_render.fetch_basemap) грузит основной процесс —
+    # у воркеров нет своих соединений и лимитов к серверу тайлов
+    return await _submit(_map_task, geom_wgs84.wkb, osm_data, basemap)
+
+async def render_report(metric_set, addr, source="", map_bytes=None):
+    # Байты PDF-отчёта
+    return await _submit(_pdf_task, metric_set, addr, source, map_bytes)
+
+async def render_batch_report(items, source=""):
+    return await _submit(_batch_pdf_task, items, source)
+
+async def heatmap_outputs(lon, lat, osm_data, size_m, n, top_n=20):
+    return await _submit(_heatmap_task, lon, lat, osm_data, size_m, n, top_n)
@@ -8,4 +8,7 @@ class Cadnum(StatesGroup):
     waiting_text = State()
 
 class Comps(StatesGroup):
-    collecting = State()
\ No newline at end of file
+    collecting = State()
+
+class Heatmap(StatesGroup):
+    waiting_location = State()
\ No newline at end of file
@@ -1,29 +1,298 @@
-import os, json, time, hashlib
+# Кэш JSON-ответов внешних сервисов. Уровни:
+#  1) LRU декодированных объектов в памяти процесса (лимит в байтах);
+#  2) встраиваемое хранилище: SQLite (WAL) со сжатыми значениями — по умолчанию,
+#     либо прежние JSON-файлы (CACHE_BACKEND=files);
+#  3) фоновая очистка: удаление записей старше CACHE_MAX_AGE_S и ужатие до CACHE_MAX_BYTES.
+# Объекты из кэша общие для всех вызывающих — их нельзя модифицировать.
+import os, json, time, hashlib, sqlite3, threading, zlib, logging
+from collections import OrderedDict
+
+try:
+    import zstandard as _zstd  # опционально: быстрее и плотнее zlib
+except ImportError:
+    _zstd = None
 
 CACHE_DIR = os.getenv("CACHE_DIR", "./cache")
 TILE_CACHE_DIR = os.getenv("TILE_CACHE_DIR", "./cache/tiles")
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite").strip().lower()
+CACHE_MEM_BYTES = int(os.getenv("CACHE_MEM_BYTES", str(64 * 1024 * 1024)))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+CACHE_MAX_AGE_S = int(os.getenv("CACHE_MAX_AGE_S", str(7 * 24 * 3600)))
+CACHE_EVICT_INTERVAL_S = int(os.getenv("CACHE_EVICT_INTERVAL_S", "600"))
+
+_stats = {"mem_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0,
+          "bytes_read": 0, "bytes_written": 0, "evicted": 0}
+_stats_lock = threading.Lock()
+
+def _count(name, n=1):
+    with _stats_lock:
+        _stats[name] += n
 
 def ensure_dirs():
     os.makedirs(CACHE_DIR, exist_ok=True)
     os.makedirs(TILE_CACHE_DIR, exist_ok=True)
     os.makedirs(os.path.join(CACHE_DIR, "uploads"), exist_ok=True)
 
-def _path_for(key: str):
-    h = hashlib.md5(key.encode()).hexdigest()
-    return os.path.join(CACHE_DIR, f"{h}.json")
+# --- сжатие: первый байт значения — кодек. Размер для LRU считаем по несжатому JSON ---
 
-def get_cache_json(key: str, ttl: int):
-    path = _path_for(key)
-    try:
-        st = os.stat(path)
-        if time.time() - st.st_mtime > ttl:
+def _encode(data, compress=True):
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if not compress:
+        return raw, len(raw)
+    if _zstd is not None:
+        return b"z" + _zstd.ZstdCompressor(level=3).compress(raw), len(raw)
+    return b"g" + zlib.compress(raw, 6), len(raw)
+
+def _decode(blob: bytes):
+    codec, body = blob[:1], blob[1:]
+    if codec == b"z":
+        raw = _zstd.ZstdDecompressor().decompress(body)
+    elif codec == b"g":
+        raw = zlib.decompress(body)
+    else:
+        raw = blob
+    return json.loads(raw), len(raw)
+
+# --- уровень 1: LRU в памяти ---
+
+class _MemLRU:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items = OrderedDict()  # key → (ts, obj, size)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            v = self.items.get(key)
+            if v is not None:
+                self.items.move_to_end(key)
+            return v
+
+    def put(self, key, ts, obj, size):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.size -= old[2]
+            self.items[key] = (ts, obj, size)
+            self.size += size
+            while self.size > self.max_bytes and self.items:
+                _, (_, _, s) = self.items.popitem(last=False)
+                self.size -= s
+
+    def drop(self, key):
+        with self.lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.size -= old[2]
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.size = 0
+
+_mem = _MemLRU(CACHE_MEM_BYTES)
+
+# --- уровень 2: хранилища ---
+
+class SqliteBackend:
+    # Один файл SQLite в режиме WAL: запись — одна транзакция (атомарно), читатели не блокируются
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            c = sqlite3.connect(self.path, timeout=30)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, ts REAL, size INTEGER, value BLOB)")
+            c.execute("CREATE INDEX IF NOT EXISTS kv_ts ON kv(ts)")
+            self._local.conn = c
+        return c
+
+    def get(self, key):
+        row = self._conn().execute("SELECT ts, value FROM kv WHERE key=?", (key,)).fetchone()
+        return (row[0], bytes(row[1])) if row else None
+
+    def put(self, key, ts, blob):
+        with self._conn() as c:
+            c.execute("INSERT OR REPLACE INTO kv (key, ts, size, value) VALUES (?, ?, ?, ?)", (key, ts, len(blob), blob))
+
+    def delete(self, key):
+        with self._conn() as c:
+            c.execute("DELETE FROM kv WHERE key=?", (key,))
+
+    def evict(self, max_age_s, max_bytes):
+        c = self._conn()
+        with c:
+            n = c.execute("DELETE FROM kv WHERE ts < ?", (time.time() - max_age_s,)).rowcount
+            total = c.execute("SELECT COALESCE(SUM(size), 0) FROM kv").fetchone()[0]
+            if total > max_bytes:
+                # Удаляем самые старые записи, пока не уложимся в лимит
+                cut, acc = None, 0
+                for ts, size in c.execute("SELECT ts, size FROM kv ORDER BY ts DESC"):
+                    acc += size
+                    if acc > max_bytes:
+                        cut = ts
+                        break
+                if cut is not None:
+                    n += c.execute("DELETE FROM kv WHERE ts <= ?", (cut,)).rowcount
+        return n
+
+class FileBackend:
+    # Прежний формат: один файл на ключ; запись через временный файл + os.replace (атомарно)
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{hashlib.md5(key.encode()).hexdigest()}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            ts = os.stat(path).st_mtime
+            with open(path, "rb") as f:
+                return ts, f.read()
+        except FileNotFoundError:
             return None
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
+
+    def put(self, key, ts, blob):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self, max_age_s, max_bytes):
+        files = []
+        for name in os.listdir(self.root):
+            if name.endswith(".json"):
+                p = os.path.join(self.root, name)
+                try:
+                    st = os.stat(p)
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, p))
+        files.sort(reverse=True)
+        now, acc, n = time.time(), 0, 0
+        for mtime, size, p in files:
+            acc += size
+            if now - mtime > max_age_s or acc > max_bytes:
+                try:
+                    os.remove(p)
+                    n += 1
+                except FileNotFoundError:
+                    pass
+        return n
+
+def _make_backend():
+    if CACHE_BACKEND == "files":
+        return FileBackend(CACHE_DIR)
+    return SqliteBackend(os.path.join(CACHE_DIR, "cache.sqlite"))
+
+_backend = None
+_evictor = None
+_backend_lock = threading.Lock()
+
+def _get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                _backend = _make_backend()
+                _start_evictor()
+    return _backend
+
+def _start_evictor():
+    global _evictor
+    if _evictor is not None or CACHE_EVICT_INTERVAL_S <= 0:
+        return
+    def loop():
+        while True:
+            time.sleep(CACHE_EVICT_INTERVAL_S)
+            try:
+                evict()
+            except Exception:
+                logging.exception("cache eviction failed")
+    _evictor = threading.Thread(target=loop, name="cache-evictor", daemon=True)
+    _evictor.start()
+
+def evict():
+    n = _get_backend().evict(CACHE_MAX_AGE_S, CACHE_MAX_BYTES)
+    _count("evicted", n)
+    return n
+
+# --- публичный интерфейс (не менялся) ---
+
+def _get(key, ttl, decode):
+    now = time.time()
+    hit = _mem.get(key)
+    if hit is not None:
+        if now - hit[0] <= ttl:
+            _count("mem_hits")
+            return hit[1]
+    row = _get_backend().get(key)
+    if row is None:
+        _count("misses")
+        return None
+    ts, blob = row
+    if now - ts > ttl:
+        _count("expired")
         return None
+    data, size = decode(blob)
+    _count("disk_hits")
+    _count("bytes_read", len(blob))
+    _mem.put(key, ts, data, size)
+    return data
+
+def get_cache_json(key: str, ttl: int):
+    return _get(key, ttl, _decode)
 
 def set_cache_json(key: str, data):
-    path = _path_for(key)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False)
\ No newline at end of file
+    ts = time.time()
+    blob, raw_len = _encode(data, compress=CACHE_BACKEND != "files")
+    _get_backend().put(key, ts, blob)
+    _count("bytes_written", len(blob))
+    _mem.put(key, ts, data, raw_len)
+
+# Двоичные значения (колонки OSM в .npz): в хранилище — как есть, в LRU — результат decode(blob).
+# Размер для LRU — obj.nbytes, если есть, иначе длина blob
+
+def _size(obj, blob):
+    return getattr(obj, "nbytes", len(blob))
+
+def get_cache_bytes(key: str, ttl: int, decode=None):
+    def dec(blob):
+        obj = decode(blob) if decode else blob
+        return obj, _size(obj, blob)
+    return _get(key, ttl, dec)
+
+def set_cache_bytes(key: str, blob: bytes, obj=None):
+    ts = time.time()
+    _get_backend().put(key, ts, blob)
+    _count("bytes_written", len(blob))
+    obj = blob if obj is None else obj
+    _mem.put(key, ts, obj, _size(obj, blob))
+
+def delete_cache(key: str):
+    _mem.drop(key)
+    _get_backend().delete(key)
+
+def cache_stats():
+    with _stats_lock:
+        s = dict(_stats)
+    s["mem_items"] = len(_mem.items)
+    s["mem_bytes"] = _mem.size
+    return s
@@ -0,0 +1,110 @@
+# Локальное хранилище тайлов DEM (SRTM .hgt: big-endian int16, строки с севера на юг).
+# Тайлы открываются через numpy.memmap — воркеры делят страницы через page cache ОС,
+# а не держат каждый свою декодированную копию. Высоты считаются пакетно, билинейно.
+import os, sys, math, time, logging
+import numpy as np
+
+DEM_TILE_DIR = os.getenv("DEM_TILE_DIR", os.path.join(os.getenv("CACHE_DIR", "./cache"), "dem"))
+# DEM_OFFLINE=1 — работаем только с уже засеянным каталогом, без скачивания
+DEM_OFFLINE = os.getenv("DEM_OFFLINE", "0").strip().lower() in ("1", "true", "yes", "on")
+# После ошибки скачивания тайл не ищем повторно столько секунд (сеть могла быть недоступна)
+DEM_RETRY_S = float(os.getenv("DEM_RETRY_S", "300"))
+
+VOID = -32768
+_tiles = {}   # имя тайла → np.memmap | None (None = тайла нет в SRTM, повторно не ищем)
+_failed = {}  # имя тайла → время ошибки скачивания
+_srtm = None
+
+def tile_name(lat_i: int, lon_i: int) -> str:
+    ns = "N" if lat_i >= 0 else "S"
+    ew = "E" if lon_i >= 0 else "W"
+    return f"{ns}{abs(lat_i):02d}{ew}{abs(lon_i):03d}.hgt"
+
+def _download(name: str):
+    # Догружаем отсутствующий тайл через srtm.py: он распаковывает .hgt прямо в DEM_TILE_DIR.
+    # True — тайл на диске, False — его нет (офлайн или нет в SRTM), None — ошибка скачивания
+    global _srtm
+    if DEM_OFFLINE:
+        return False
+    try:
+        if _srtm is None:
+            import srtm
+            os.makedirs(DEM_TILE_DIR, exist_ok=True)
+            _srtm = srtm.get_data(local_cache_dir=DEM_TILE_DIR)
+        return bool(_srtm.retrieve_or_load_file_data(name))
+    except Exception:
+        logging.exception("DEM tile download failed: %s", name)
+        return None
+
+def open_tile(lat_i: int, lon_i: int):
+    name = tile_name(lat_i, lon_i)
+    if name in _tiles:
+        return _tiles[name]
+    t = _failed.get(name)
+    if t is not None and time.monotonic() - t < DEM_RETRY_S:
+        return None
+    path = os.path.join(DEM_TILE_DIR, name)
+    if not os.path.exists(path):
+        ok = _download(name)
+        if ok is None:
+            _failed[name] = time.monotonic()
+            return None
+        if not ok:
+            _tiles[name] = None
+            return None
+        _failed.pop(name, None)
+    side = math.isqrt(os.path.getsize(path) // 2)
+    mm = np.memmap(path, dtype=">i2", mode="r", shape=(side, side))
+    _tiles[name] = mm
+    return mm
+
+def close_all():
+    _tiles.clear()
+    _failed.clear()
+
+def sample(lons, lats):
+    # Билинейная интерполяция по массивам координат; нет данных/void → NaN
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    out = np.full(lons.shape, np.nan)
+    if lons.size == 0:
+        return out
+    lat_i = np.floor(lats).astype(int)
+    lon_i = np.floor(lons).astype(int)
+    keys = lat_i * 1000 + lon_i
+    for k in np.unique(keys):
+        sel = keys == k
+        la, lo = int(lat_i[sel][0]), int(lon_i[sel][0])
+        mm = open_tile(la, lo)
+        if mm is None:
+            continue
+        side = mm.shape[0]
+        fr = (la + 1 - lats[sel]) * (side - 1)
+        fc = (lons[sel] - lo) * (side - 1)
+        r0 = np.clip(np.floor(fr).astype(int), 0, side - 2)
+        c0 = np.clip(np.floor(fc).astype(int), 0, side - 2)
+        dr = np.clip(fr - r0, 0.0, 1.0)
+        dc = np.clip(fc - c0, 0.0, 1.0)
+        q = [mm[r0, c0], mm[r0, c0 + 1], mm[r0 + 1, c0], mm[r0 + 1, c0 + 1]]
+        q = [np.where(v == VOID, np.nan, v.astype(float)) for v in q]
+        out[sel] = (q[0] * (1 - dr) * (1 - dc) + q[1] * (1 - dr) * dc
+                    + q[2] * dr * (1 - dc) + q[3] * dr * dc)
+    return out
+
+def seed(bbox):
+    # Засеять каталог тайлами, покрывающими bbox = (minx, miny, maxx, maxy) в WGS84
+    minx, miny, maxx, maxy = bbox
+    got = []
+    for la in range(math.floor(miny), math.floor(maxy) + 1):
+        for lo in range(math.floor(minx), math.floor(maxx) + 1):
+            if open_tile(la, lo) is not None:
+                got.append(tile_name(la, lo))
+    return got
+
+if __name__ == "__main__":
+    # python -m bot.storage.dem_tiles minlon minlat maxlon maxlat
+    if len(sys.argv) != 5:
+        print("usage: python -m bot.storage.dem_tiles minlon minlat maxlon maxlat")
+        sys.exit(2)
+    names = seed(tuple(float(v) for v in sys.argv[1:]))
+    print(f"{len(names)} tiles in {DEM_TILE_DIR}: {' '.join(names)}")
@@ -0,0 +1,226 @@
+# Локальный обратный геокодер: населённые пункты, именованные улицы и административные границы
+# из выгрузки OSM (osmium export → GeoJSON или Overpass JSON `out geom`, границы — relation'ами)
+# в SQLite; в памяти процесса — STRtree
+# по каждому слою. Поиск: точка-в-полигоне по границам + ближайший н.п. в пределах радиуса его типа
+# + ближайшая улица. Ответ — dict как у Nominatim jsonv2 (display_name, address), его читают
+# format_brief и шаблоны отчёта. Нет границы под точкой — None (вне покрытия, спросить Nominatim).
+#
+#   python -m bot.storage.geocoder_index import region.geojson   # (пере)загрузка выгрузки
+#   python -m bot.storage.geocoder_index lookup lat lon
+#   python -m bot.storage.geocoder_index count
+import os, sys, json, math, sqlite3, threading
+import numpy as np
+import shapely
+from shapely.geometry import shape, Point, LineString, Polygon
+from shapely.ops import polygonize, unary_union
+
+GEOCODER_INDEX_PATH = os.getenv("GEOCODER_INDEX_PATH", os.path.join(os.getenv("CACHE_DIR", "./cache"), "geocoder.sqlite"))
+GEOCODER_LANG = os.getenv("GEOCODER_LANG", "ru")
+STREET_MAX_M = 150.0
+
+# Тип н.п. → (поле address, радиус «принадлежности» точки, м)
+PLACES = {
+    "city": ("city", 15000), "town": ("town", 6000), "village": ("village", 2500),
+    "hamlet": ("hamlet", 1200), "suburb": ("suburb", 1500), "isolated_dwelling": ("hamlet", 500),
+    "locality": ("locality", 800),
+}
+# admin_level → поле address (как у Nominatim для России)
+ADMIN_FIELDS = {2: "country", 3: "region", 4: "state", 5: "state_district", 6: "county",
+                8: "municipality", 9: "city_district", 10: "suburb"}
+STREET_TAGS = {"motorway", "trunk", "primary", "secondary", "tertiary", "unclassified", "residential",
+               "living_street", "service", "pedestrian", "track"}
+
+_local = threading.local()
+_index = None
+_index_lock = threading.Lock()
+
+def _conn():
+    c = getattr(_local, "conn", None)
+    if c is None:
+        d = os.path.dirname(GEOCODER_INDEX_PATH)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        c = sqlite3.connect(GEOCODER_INDEX_PATH)
+        c.execute("PRAGMA journal_mode=WAL")
+        # kind: place | street | admin; rank: admin_level либо тип н.п.
+        c.execute("CREATE TABLE IF NOT EXISTS features (kind TEXT, rank TEXT, name TEXT, wkb BLOB)")
+        _local.conn = c
+    return c
+
+def _name(tags):
+    return tags.get(f"name:{GEOCODER_LANG}") or tags.get("name")
+
+def _classify(tags, geom):
+    # (kind, rank) или None — объект не нужен геокодеру
+    if not _name(tags):
+        return None
+    if tags.get("boundary") == "administrative" and str(tags.get("admin_level", "")).isdigit() \
+            and geom.geom_type in ("Polygon", "MultiPolygon"):
+        return "admin", tags["admin_level"]
+    if tags.get("place") in PLACES:
+        return "place", tags["place"]
+    if tags.get("highway") in STREET_TAGS and geom.geom_type in ("LineString", "MultiLineString"):
+        return "street", tags["highway"]
+    return None
+
+def _relation_polygon(el):
+    # Граница-relation из `out geom`: кольца собираются из линий-членов (polygonize),
+    # внутренние (role=inner) вычитаются; None — кольца не замкнулись (relation обрезан bbox'ом)
+    lines = {"outer": [], "inner": []}
+    for m in el.get("members", []):
+        pts = [(p["lon"], p["lat"]) for p in m.get("geometry") or [] if p]
+        if m.get("type") == "way" and len(pts) >= 2:
+            lines["inner" if m.get("role") == "inner" else "outer"].append(LineString(pts))
+    if not lines["outer"]:
+        return None
+    poly = unary_union(list(polygonize(unary_union(lines["outer"]))))
+    if lines["inner"]:
+        poly = poly.difference(unary_union(list(polygonize(unary_union(lines["inner"])))))
+    return None if poly.is_empty else poly
+
+def _overpass_geom(el):
+    if el.get("type") == "node":
+        return Point(el["lon"], el["lat"])
+    tags = el.get("tags", {})
+    if el.get("type") == "relation":
+        return _relation_polygon(el) if tags.get("boundary") == "administrative" or tags.get("place") else None
+    pts = [(p["lon"], p["lat"]) for p in el.get("geometry") or [] if p]
+    if len(pts) < 2:
+        return None
+    if len(pts) >= 4 and pts[0] == pts[-1] and tags.get("boundary") == "administrative":
+        return Polygon(pts)
+    return LineString(pts)
+
+def _iter_features(path):
+    # (теги, геометрия) из GeoJSON (свойства = теги OSM) или Overpass JSON (`out geom`: узлы, линии,
+    # relation'ы границ)
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if "elements" in data:
+        for el in data["elements"]:
+            g = _overpass_geom(el)
+            if g is not None:
+                yield el.get("tags", {}), g
+        return
+    for feat in data.get("features", [data] if data.get("type") == "Feature" else []):
+        if feat.get("geometry"):
+            yield feat.get("properties") or {}, shape(feat["geometry"])
+
+def load(path):
+    # Полная замена индекса содержимым выгрузки
+    rows = []
+    for tags, g in _iter_features(path):
+        kr = _classify(tags, g)
+        if kr is not None:
+            # Для н.п.-полигонов (place=* на границе) достаточно точки
+            if kr[0] == "place" and g.geom_type != "Point":
+                g = g.representative_point()
+            rows.append((kr[0], kr[1], _name(tags), shapely.to_wkb(g)))
+    with _conn() as c:
+        c.execute("DELETE FROM features")
+        c.executemany("INSERT INTO features VALUES (?, ?, ?, ?)", rows)
+    reset()
+    return len(rows)
+
+def count():
+    return dict(_conn().execute("SELECT kind, COUNT(*) FROM features GROUP BY kind").fetchall())
+
+class _Layer:
+    def __init__(self, rows):
+        self.rank = [r[0] for r in rows]
+        self.name = [r[1] for r in rows]
+        self.geoms = shapely.from_wkb([r[2] for r in rows]) if rows else np.array([], dtype=object)
+        shapely.prepare(self.geoms)
+        self.tree = shapely.STRtree(self.geoms)
+        # Для точек (н.п.): координаты и радиус типа — расстояния считаются векторно
+        if rows and all(r[0] in PLACES for r in rows):
+            self.xy = shapely.get_coordinates(self.geoms)
+            self.radius = np.array([PLACES[r[0]][1] for r in rows], dtype=float)
+
+def index():
+    # {kind: _Layer} — строится при первом обращении и живёт до reset(); None, если индекс пуст
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                if not os.path.exists(GEOCODER_INDEX_PATH):
+                    _index = {}
+                else:
+                    rows = _conn().execute("SELECT kind, rank, name, wkb FROM features").fetchall()
+                    _index = {k: _Layer([r[1:] for r in rows if r[0] == k]) for k in ("admin", "place", "street")}
+                    if not rows:
+                        _index = {}
+    return _index or None
+
+def loaded():
+    # Индекс уже в памяти: lookup не пойдёт в SQLite
+    return _index is not None
+
+def reset():
+    global _index
+    _index = None
+
+def _deg(m, lat):
+    # Метры → градусы долготы на широте lat (запас: по долготе градус короче)
+    return m / (111_320.0 * max(0.1, math.cos(math.radians(lat))))
+
+def _dist_m(lon, lat, lon2, lat2):
+    # Равнопромежуточное приближение: на сотнях метров–километрах точнее, чем нужно
+    kx = 111_320.0 * math.cos(math.radians(lat))
+    return np.hypot((np.asarray(lon2) - lon) * kx, (np.asarray(lat2) - lat) * 110_574.0)
+
+def lookup(lat, lon):
+    idx = index()
+    if idx is None:
+        return None
+    pt = Point(lon, lat)
+    admins = idx["admin"]
+    hits = admins.tree.query(pt, predicate="within")
+    if not len(hits):
+        return None
+    address = {}
+    # Границы — от самой мелкой (больший admin_level) к стране
+    levels = sorted(((int(admins.rank[i]), admins.name[i]) for i in hits), reverse=True)
+    for level, name in levels:
+        field = ADMIN_FIELDS.get(level)
+        if field and field not in address:
+            address[field] = name
+    parts = []
+    places = idx["place"]
+    if len(places.name):
+        r_max = max(r for _, r in PLACES.values())
+        dx, dy = _deg(r_max, lat), r_max / 110_574.0
+        cand = places.tree.query(shapely.box(lon - dx, lat - dy, lon + dx, lat + dy))
+        if len(cand):
+            d = _dist_m(lon, lat, places.xy[cand, 0], places.xy[cand, 1])
+            d[d > places.radius[cand]] = np.inf
+            j = int(np.argmin(d))
+            if np.isfinite(d[j]):
+                i = cand[j]
+                address[PLACES[places.rank[i]][0]] = places.name[i]
+                parts.append(places.name[i])
+    streets = idx["street"]
+    if len(streets.name):
+        # Ближайшая в градусах (долгота «короче») — для выбора одной улицы из соседних достаточно
+        near = streets.tree.query_nearest(pt, max_distance=_deg(STREET_MAX_M, lat))
+        if len(near):
+            address["road"] = streets.name[near[0]]
+            parts.insert(0, streets.name[near[0]])
+    for _, name in levels:
+        if name not in parts:
+            parts.append(name)
+    return {"display_name": ", ".join(parts), "address": address, "lat": f"{lat:.7f}", "lon": f"{lon:.7f}",
+            "source": "local"}
+
+if __name__ == "__main__":
+    cmd, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else ("", [])
+    if cmd == "import" and len(args) == 1:
+        print(f"{load(args[0])} features written to {GEOCODER_INDEX_PATH}: {count()}")
+    elif cmd == "lookup" and len(args) == 2:
+        print(json.dumps(lookup(float(args[0]), float(args[1])), ensure_ascii=False, indent=1))
+    elif cmd == "count":
+        print(count())
+    else:
+        print("usage: python -m bot.storage.geocoder_index import <region.geojson|overpass.json>\n"
+              "       python -m bot.storage.geocoder_index lookup lat lon | count")
+        sys.exit(2)
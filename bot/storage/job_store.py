@@ -0,0 +1,44 @@
+# Хранилища очереди заданий. По умолчанию очередь живёт только в памяти;
+# JOB_STORE=sqlite сохраняет ожидающие задания, и после перезапуска они продолжаются.
+import os, json, time, sqlite3, threading
+
+JOB_STORE = os.getenv("JOB_STORE", "memory").strip().lower()
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(os.getenv("CACHE_DIR", "./cache"), "jobs.sqlite"))
+
+class MemoryJobStore:
+    def save(self, job_id, chat_id, payload):
+        pass
+
+    def remove(self, job_id):
+        pass
+
+    def load(self):
+        return []
+
+class SqliteJobStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, chat_id INTEGER, ts REAL, payload TEXT)")
+
+    def save(self, job_id, chat_id, payload):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?)",
+                               (job_id, chat_id, time.time(), json.dumps(payload, ensure_ascii=False)))
+
+    def remove(self, job_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM jobs WHERE id=?", (job_id,))
+
+    def load(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT id, chat_id, payload FROM jobs ORDER BY ts").fetchall()
+        return [(r[0], r[1], json.loads(r[2])) for r in rows]
+
+def make_job_store():
+    if JOB_STORE == "sqlite":
+        return SqliteJobStore(JOB_STORE_PATH)
+    return MemoryJobStore()
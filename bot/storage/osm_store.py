@@ -0,0 +1,165 @@
+# Локальное хранилище OSM-объектов: SQLite + R*Tree по bbox элементов.
+# Элементы хранятся в том же виде, что отдаёт Overpass (`out body geom`),
+# поэтому ответ на bbox-запрос подставляется в пайплайн без изменений.
+#
+#   python -m bot.storage.osm_store import region.geojson   # первичная загрузка выгрузки
+#   python -m bot.storage.osm_store update changes.json     # инкрементальное обновление
+#   python -m bot.storage.osm_store fetch minlon minlat maxlon maxlat  # дотянуть bbox из Overpass
+import os, sys, json, re, hashlib, logging, sqlite3, threading
+
+OSM_STORE_PATH = os.getenv("OSM_STORE_PATH", os.path.join(os.getenv("CACHE_DIR", "./cache"), "osm.sqlite"))
+
+_local = threading.local()
+
+# Те же фильтры тегов, что в запросе Overpass (bot/services/osm.py): (тип, ключ, значение, regex);
+# значение None — только наличие ключа, regex=False — точное равенство (`=`), True — `~`
+_FILTERS = [
+    ("way", "highway", None, False),
+    ("way", "power", "line", False),
+    ("node", "power", "substation", False),
+    ("way", "waterway", None, False),
+    ("way", "natural", "water", False),
+    ("way", "landuse", "reservoir", False),
+    ("node", "amenity", "school|kindergarten|clinic|hospital", True),
+    ("way", "amenity", "school|kindergarten|clinic|hospital", True),
+    ("node", "public_transport", "stop_position", False),
+    ("node", "highway", "bus_stop", False),
+    ("node", "place", "town|village|hamlet", True),
+]
+
+def matches_query(el):
+    tags = el.get("tags", {})
+    for typ, key, val, regex in _FILTERS:
+        if el.get("type") != typ or key not in tags:
+            continue
+        if val is None or (re.search(val, tags[key]) if regex else tags[key] == val):
+            return True
+    return False
+
+def _conn():
+    c = getattr(_local, "conn", None)
+    if c is None:
+        d = os.path.dirname(OSM_STORE_PATH)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        c = sqlite3.connect(OSM_STORE_PATH)
+        c.execute("PRAGMA journal_mode=WAL")
+        c.execute("CREATE TABLE IF NOT EXISTS elements (rid INTEGER PRIMARY KEY, okey TEXT UNIQUE, body TEXT)")
+        c.execute("CREATE VIRTUAL TABLE IF NOT EXISTS elements_idx USING rtree(rid, minx, maxx, miny, maxy)")
+        _local.conn = c
+    return c
+
+def _bounds(el):
+    if "geometry" in el:
+        pts = [p for p in el["geometry"] if p]
+        if pts:
+            lons = [p["lon"] for p in pts]
+            lats = [p["lat"] for p in pts]
+            return (min(lons), min(lats), max(lons), max(lats))
+    if "lat" in el and "lon" in el:
+        return (el["lon"], el["lat"], el["lon"], el["lat"])
+    return None
+
+def upsert(elements):
+    # Добавить/заменить элементы по (type, id); элемент с "action": "delete" удаляется.
+    # Объект заменяется целиком: при первой встрече его ключа удаляются и все прежние части "id:i"
+    c = _conn()
+    n = 0
+    cleared = set()
+    with c:
+        for el in elements:
+            okey = f"{el.get('type')}/{el.get('id')}"
+            base = okey.split(":", 1)[0]
+            if base in cleared:
+                rows = c.execute("SELECT rid FROM elements WHERE okey=?", (okey,))
+            else:
+                cleared.add(base)
+                # okey в (base + ":", base + ";") — ровно части base:…, по индексу UNIQUE
+                rows = c.execute("SELECT rid FROM elements WHERE okey=? OR (okey>? AND okey<?)",
+                                 (base, base + ":", base + ";"))
+            rids = [(r[0],) for r in rows.fetchall()]
+            c.executemany("DELETE FROM elements_idx WHERE rid=?", rids)
+            c.executemany("DELETE FROM elements WHERE rid=?", rids)
+            if el.get("action") == "delete" or not matches_query(el):
+                continue
+            b = _bounds(el)
+            if b is None:
+                continue
+            cur = c.execute("INSERT INTO elements (okey, body) VALUES (?, ?)",
+                            (okey, json.dumps(el, ensure_ascii=False, separators=(",", ":"))))
+            c.execute("INSERT INTO elements_idx VALUES (?, ?, ?, ?, ?)", (cur.lastrowid, b[0], b[2], b[1], b[3]))
+            n += 1
+    return n
+
+def query(bbox):
+    (minx, miny, maxx, maxy) = bbox
+    rows = _conn().execute(
+        "SELECT e.body FROM elements_idx i JOIN elements e ON e.rid = i.rid "
+        "WHERE i.maxx >= ? AND i.minx <= ? AND i.maxy >= ? AND i.miny <= ?",
+        (minx, maxx, miny, maxy)).fetchall()
+    # Один json.loads на весь ответ заметно быстрее построчного разбора
+    return {"elements": json.loads("[" + ",".join(r[0] for r in rows) + "]")}
+
+def count():
+    return _conn().execute("SELECT count(*) FROM elements").fetchone()[0]
+
+def _feature_elements(feat):
+    # GeoJSON-фича (osmium export / ogr2ogr) → Overpass-подобные элементы
+    props = dict(feat.get("properties") or {})
+    osm_id = props.pop("@id", None) or props.pop("osm_id", None) or feat.get("id")
+    if isinstance(osm_id, str) and "/" in osm_id:
+        osm_id = osm_id.split("/", 1)[1]
+    tags = {k: str(v) for k, v in props.items() if v is not None and not k.startswith("@")}
+    g = feat.get("geometry") or {}
+    if osm_id is None:
+        # Выгрузка без id: устойчивый id по геометрии, иначе все такие фичи затрут одна другую
+        osm_id = "g" + hashlib.sha1(json.dumps(g, sort_keys=True).encode()).hexdigest()[:16]
+    gtype, coords = g.get("type"), g.get("coordinates")
+    if gtype == "Point":
+        return [{"type": "node", "id": osm_id, "lat": coords[1], "lon": coords[0], "tags": tags}]
+    if gtype in ("LineString", "Polygon"):
+        parts = [coords if gtype == "LineString" else coords[0]]
+    elif gtype in ("MultiLineString", "MultiPolygon"):
+        parts = coords if gtype == "MultiLineString" else [p[0] for p in coords]
+    else:
+        return []
+    out = []
+    for i, ring in enumerate(parts):
+        el_id = osm_id if len(parts) == 1 else f"{osm_id}:{i}"
+        out.append({"type": "way", "id": el_id, "tags": tags,
+                    "geometry": [{"lat": p[1], "lon": p[0]} for p in ring]})
+    return out
+
+def load_file(path):
+    # GeoJSON FeatureCollection или дамп в формате Overpass JSON
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if "elements" in data:
+        return data["elements"]
+    feats = data.get("features", [data] if data.get("type") == "Feature" else [])
+    no_id = sum(1 for f in feats if not ((f.get("properties") or {}).get("@id")
+                                         or (f.get("properties") or {}).get("osm_id") or f.get("id")))
+    if no_id:
+        logging.warning("%s: %d features without OSM id, using geometry-based ids", path, no_id)
+    return [el for feat in feats for el in _feature_elements(feat)]
+
+if __name__ == "__main__":
+    cmd, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else ("", [])
+    if cmd in ("import", "update") and len(args) == 1:
+        els = load_file(args[0])
+        n = upsert(els)
+    elif cmd == "fetch" and len(args) == 4:
+        from ..services import osm
+        els = osm._query_overpass(tuple(float(v) for v in args)).get("elements", [])
+        n = upsert(els)
+    else:
+        print("usage: python -m bot.storage.osm_store import|update <file.geojson|overpass.json>\n"
+              "       python -m bot.storage.osm_store fetch minlon minlat maxlon maxlat")
+        sys.exit(2)
+    # Готовые ответы бота по обновлённой области пересчитаются заново
+    bs = [b for b in map(_bounds, els) if b is not None]
+    if bs:
+        from . import results
+        results.invalidate_bbox((min(b[0] for b in bs), min(b[1] for b in bs),
+                                 max(b[2] for b in bs), max(b[3] for b in bs)))
+    print(f"{n} elements written, {count()} in {OSM_STORE_PATH}")
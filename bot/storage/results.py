@@ -0,0 +1,122 @@
+# Кэш готовых ответов пайплайна по ключу геометрии (snapshots.geometry_key — нормализованный контур)
+# и источнику геометрии (result_key):
+# метрики, текст краткого итога, байты карты и PDF. Повторная отправка того же участка (тот же KML,
+# тот же рисунок в webapp, тот же КН) отвечается из кэша без OSM/DEM/рендера.
+# Срок жизни — как у кэша OSM (RESULT_TTL_S, по умолчанию osm.OSM_TTL); запись также сбрасывается,
+# когда перекачивается любой тайл OSM, на котором она посчитана (invalidate_tiles / invalidate_bbox).
+#
+#   python -m bot.storage.results stats | evict | clear
+import os, sys, json, time, sqlite3, threading, logging
+
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join(os.getenv("CACHE_DIR", "./cache"), "results.sqlite"))
+# Пусто — срок как у тайлов OSM (osm.OSM_TTL): дольше ответ всё равно опирается на устаревшие данные
+RESULT_TTL_S = int(os.getenv("RESULT_TTL_S") or 0) or None
+RESULT_CACHE = os.getenv("RESULT_CACHE", "1").strip().lower() in ("1", "true", "yes", "on")
+RESULT_EVICT_INTERVAL_S = 3600
+
+_local = threading.local()
+_last_evict = 0.0
+
+def _conn():
+    c = getattr(_local, "conn", None)
+    if c is None:
+        d = os.path.dirname(RESULT_CACHE_PATH)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        c = sqlite3.connect(RESULT_CACHE_PATH, timeout=30)
+        c.execute("PRAGMA journal_mode=WAL")
+        c.execute("PRAGMA synchronous=NORMAL")
+        c.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, ts REAL, metrics TEXT, brief TEXT, "
+                  "map BLOB, map_name TEXT, pdf BLOB)")
+        # Тайлы OSM (z/x/y), из которых посчитан ответ — для сброса при их обновлении
+        c.execute("CREATE TABLE IF NOT EXISTS result_tiles (tile TEXT, key TEXT, PRIMARY KEY (tile, key))")
+        c.execute("CREATE INDEX IF NOT EXISTS result_tiles_key ON result_tiles(key)")
+        _local.conn = c
+    return c
+
+def result_key(geometry_key, source=""):
+    # Источник геометрии входит в ключ: он напечатан в PDF («Источник геометрии»)
+    return f"{geometry_key}|{source}" if source else geometry_key
+
+def _tile_ids(tiles, z):
+    return [f"{z}/{x}/{y}" for x, y in tiles]
+
+def _ttl():
+    if RESULT_TTL_S:
+        return RESULT_TTL_S
+    from ..services import osm
+    return osm.OSM_TTL
+
+def get(key, ttl=None):
+    # dict(metrics, brief, map, map_name, pdf, ts) или None (нет, устарел или выключен)
+    if not RESULT_CACHE:
+        return None
+    ttl = _ttl() if ttl is None else ttl
+    r = _conn().execute("SELECT ts, metrics, brief, map, map_name, pdf FROM results WHERE key=?", (key,)).fetchone()
+    if r is None or time.time() - r[0] > ttl:
+        return None
+    return {"ts": r[0], "metrics": json.loads(r[1]), "brief": r[2], "map": r[3], "map_name": r[4], "pdf": r[5]}
+
+def put(key, metric_set, brief, map_bytes, map_name, pdf_bytes, tiles, z):
+    global _last_evict
+    if not RESULT_CACHE:
+        return
+    if time.time() - _last_evict > RESULT_EVICT_INTERVAL_S:
+        _last_evict = time.time()
+        evict()
+    with _conn() as c:
+        c.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                  (key, time.time(), json.dumps(metric_set, ensure_ascii=False), brief, map_bytes, map_name, pdf_bytes))
+        c.execute("DELETE FROM result_tiles WHERE key=?", (key,))
+        c.executemany("INSERT OR IGNORE INTO result_tiles VALUES (?, ?)", [(t, key) for t in _tile_ids(tiles, z)])
+
+def _drop(c, keys):
+    c.executemany("DELETE FROM results WHERE key=?", [(k,) for k in keys])
+    c.executemany("DELETE FROM result_tiles WHERE key=?", [(k,) for k in keys])
+
+def invalidate_tiles(tiles, z):
+    # Тайлы OSM перекачаны — ответы, посчитанные на их старом содержимом, больше не годятся
+    ids = _tile_ids(tiles, z)
+    if not ids:
+        return 0
+    with _conn() as c:
+        q = f"SELECT DISTINCT key FROM result_tiles WHERE tile IN ({', '.join('?' * len(ids))})"
+        keys = [r[0] for r in c.execute(q, ids)]
+        _drop(c, keys)
+    if keys:
+        logging.info("result cache: %d entries invalidated by %d refreshed OSM tiles", len(keys), len(ids))
+    return len(keys)
+
+def invalidate_bbox(bbox):
+    from ..services import osm
+    return invalidate_tiles(osm.tiles_for_bbox(bbox), osm.OSM_TILE_ZOOM)
+
+def evict(ttl=None):
+    ttl = _ttl() if ttl is None else ttl
+    with _conn() as c:
+        keys = [r[0] for r in c.execute("SELECT key FROM results WHERE ts < ?", (time.time() - ttl,))]
+        _drop(c, keys)
+    return len(keys)
+
+def clear():
+    with _conn() as c:
+        c.execute("DELETE FROM results")
+        c.execute("DELETE FROM result_tiles")
+
+def stats():
+    n, size = _conn().execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(map) + LENGTH(pdf) + LENGTH(metrics)), 0) "
+                              "FROM results").fetchone()
+    return {"entries": n, "bytes": size}
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "stats":
+        print(stats())
+    elif cmd == "evict":
+        print(f"{evict()} expired entries removed")
+    elif cmd == "clear":
+        clear()
+        print("result cache cleared")
+    else:
+        print("usage: python -m bot.storage.results stats | evict | clear")
+        sys.exit(2)
@@ -0,0 +1,138 @@
+# Снимки «сырых» измерений участков (не зависят от весов скоринга): дистанции, фасад, рельеф.
+# Ключ — хэш геометрии. Одна строка SQLite на участок, числовые столбцы (NULL — нет данных),
+# поэтому весь набор читается в NumPy-столбцы и пересчитывается по любому профилю векторно.
+#
+#   python -m bot.storage.snapshots rescore <профиль> [out.csv]   # пересчитать все снимки
+#   python -m bot.storage.snapshots count
+import os, sys, csv, time, sqlite3, hashlib, threading
+import numpy as np
+import shapely
+
+SNAPSHOT_STORE_PATH = os.getenv("SNAPSHOT_STORE_PATH", os.path.join(os.getenv("CACHE_DIR", "./cache"), "snapshots.sqlite"))
+
+# Столбцы снимка: (имя, откуда брать в результате metrics.compute_all)
+COLUMNS = [
+    ("lon", None), ("lat", None),
+    ("area_m2", "area_m2"), ("facade_len_m", "facade_len_m"),
+    ("touches_road", "touches_road"), ("can_house_10x10", "can_house_10x10"),
+    ("d_road_m", "d_road_m"), ("d_water_m", "d_water_m"), ("d_power_m", "d_power_m"),
+    ("d_stop_m", "d_stop_m"), ("d_place_m", "d_place_m"),
+    ("elev_med", "dem.elev_med"), ("slope_pct", "dem.slope_indicative_pct"),
+    ("slope_p90_pct", "dem.slope_p90_pct"), ("slope_gt8_share", "dem.slope_gt8_share"),
+    ("slope_gt15_share", "dem.slope_gt15_share"), ("aspect_deg", "dem.aspect_deg"),
+    ("tpi_med_m", "dem.tpi_med_m"), ("rel_lowness_m", "dem.rel_lowness_m"), ("wetness_idx", "dem.wetness_idx"),
+]
+NAMES = [c for c, _ in COLUMNS]
+# Столбцы, от которых зависит скоринг (bot/services/scoring.py)
+SCORE_NAMES = ["d_road_m", "d_stop_m", "d_power_m", "d_water_m", "touches_road", "slope_pct",
+               "rel_lowness_m", "wetness_idx"]
+
+_local = threading.local()
+
+def geometry_key(geom_wgs84):
+    # Одинаковый контур → одинаковый ключ: высоты (KML) отбрасываются, координаты — до ~1 см,
+    # направление обхода, начальная вершина и порядок дыр/частей нормализуются
+    g = shapely.normalize(shapely.set_precision(shapely.force_2d(geom_wgs84), 1e-7))
+    return hashlib.sha1(g.wkb).hexdigest()[:20]
+
+def _conn():
+    c = getattr(_local, "conn", None)
+    if c is None:
+        d = os.path.dirname(SNAPSHOT_STORE_PATH)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        c = sqlite3.connect(SNAPSHOT_STORE_PATH)
+        c.execute("PRAGMA journal_mode=WAL")
+        cols = ", ".join(f"{n} REAL" for n in NAMES)
+        c.execute(f"CREATE TABLE IF NOT EXISTS snapshots (key TEXT PRIMARY KEY, ts REAL, label TEXT, {cols})")
+        _local.conn = c
+    return c
+
+def row_from_metrics(metric_set, geom_wgs84):
+    dem = metric_set.get("dem") or {}
+    c = geom_wgs84.centroid
+    row = []
+    for name, src in COLUMNS:
+        if name == "lon":
+            v = c.x
+        elif name == "lat":
+            v = c.y
+        elif src.startswith("dem."):
+            v = dem.get(src[4:])
+        else:
+            v = metric_set.get(src)
+        row.append(None if v is None else float(v))
+    return row
+
+def save(key, metric_set, geom_wgs84, label=""):
+    save_many([(key, metric_set, geom_wgs84, label)])
+
+def save_many(items):
+    # items: (key, metric_set, geom_wgs84, label)
+    ts = time.time()
+    rows = [(k, ts, label, *row_from_metrics(m, g)) for k, m, g, label in items]
+    q = f"INSERT OR REPLACE INTO snapshots (key, ts, label, {', '.join(NAMES)}) VALUES ({', '.join('?' * (len(NAMES) + 3))})"
+    with _conn() as c:
+        c.executemany(q, rows)
+
+def get(key):
+    # Снимок как dict столбцов (NULL → None) плюс label; None — снимка нет
+    r = _conn().execute(f"SELECT label, {', '.join(NAMES)} FROM snapshots WHERE key=?", (key,)).fetchone()
+    if r is None:
+        return None
+    out = dict(zip(NAMES, r[1:]))
+    out["label"] = r[0]
+    return out
+
+def count():
+    return _conn().execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+
+def load_columns(names=NAMES):
+    # Все снимки столбцами NumPy (NULL → NaN) и список ключей в том же порядке.
+    # Ключи и числа читаются отдельными запросами: так числовые строки сразу ложатся в float-массив
+    c = _conn()
+    keys = [r[0] for r in c.execute("SELECT key FROM snapshots ORDER BY rowid")]
+    rows = c.execute(f"SELECT {', '.join(names)} FROM snapshots ORDER BY rowid").fetchall()
+    arr = np.array(rows, dtype=float).reshape(len(rows), len(names))
+    return keys, {n: arr[:, i] for i, n in enumerate(names)}
+
+def measures(cols):
+    # Столбцы снимков → аргументы scoring.score (d_* NaN — объект не найден)
+    out = dict(cols)
+    out["touches_road"] = np.nan_to_num(np.asarray(cols["touches_road"], dtype=float)) > 0
+    return out
+
+def metric_set(snap):
+    # Снимок → структура metrics.compute_all без score (для format_brief/отчёта после пересчёта)
+    area = snap.get("area_m2") or 0.0
+    dem = {src[4:]: snap[name] for name, src in COLUMNS if src and src.startswith("dem.") and snap[name] is not None}
+    out = {k: snap[k] for k in ("d_road_m", "d_water_m", "d_power_m", "d_stop_m", "d_place_m", "facade_len_m")}
+    out.update(area_m2=area, area_ha=area / 10_000.0, dem=dem,
+               touches_road=bool(snap.get("touches_road")), can_house_10x10=bool(snap.get("can_house_10x10")))
+    return out
+
+def rescore_all(profile):
+    # Пересчёт всех снимков по профилю: одно чтение столбцами + векторный скоринг
+    from ..services import scoring
+    keys, cols = load_columns(SCORE_NAMES)
+    return keys, scoring.score(measures(cols), profile)
+
+if __name__ == "__main__":
+    cmd, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else ("", [])
+    if cmd == "rescore" and len(args) in (1, 2):
+        t0 = time.perf_counter()
+        keys, sc = rescore_all(args[0])
+        dt = time.perf_counter() - t0
+        if len(args) == 2:
+            terms = [k for k in sc if k != "total"]
+            with open(args[1], "w", newline="", encoding="utf-8") as f:
+                w = csv.writer(f)
+                w.writerow(["key", "total"] + terms)
+                w.writerows(zip(keys, sc["total"].tolist(), *(np.round(sc[k], 1).tolist() for k in terms)))
+        print(f"{len(keys)} snapshots rescored with '{args[0]}' in {dt:.2f}s")
+    elif cmd == "count":
+        print(f"{count()} snapshots in {SNAPSHOT_STORE_PATH}")
+    else:
+        print("usage: python -m bot.storage.snapshots rescore <izhs|agri|commercial> [out.csv]\n"
+              "       python -m bot.storage.snapshots count")
+        sys.exit(2)
@@ -0,0 +1,97 @@
+# Постоянный кэш растровых XYZ-тайлов подложки: файлы TILE_CACHE_DIR/<источник>/<z>/<x>/<y>.png
+# и индекс SQLite (ETag/Last-Modified для условной ревалидации, время обращения для LRU, размер).
+# Сеть здесь не используется — загрузка в bot/services/tiles.py.
+import os, time, sqlite3, threading, logging
+from .cache import TILE_CACHE_DIR
+
+TILE_CACHE_MAX_BYTES = int(os.getenv("TILE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+_local = threading.local()
+_touch_lock = threading.Lock()
+_touched = {}  # (src, z, x, y) → время обращения; сбрасывается в индекс пачкой
+
+def _conn():
+    c = getattr(_local, "conn", None)
+    if c is None:
+        os.makedirs(TILE_CACHE_DIR, exist_ok=True)
+        c = sqlite3.connect(os.path.join(TILE_CACHE_DIR, "tiles.sqlite"), timeout=30)
+        c.execute("PRAGMA journal_mode=WAL")
+        c.execute("PRAGMA synchronous=NORMAL")
+        c.execute("CREATE TABLE IF NOT EXISTS tiles (src TEXT, z INTEGER, x INTEGER, y INTEGER, fetched REAL, "
+                  "accessed REAL, size INTEGER, etag TEXT, last_modified TEXT, PRIMARY KEY (src, z, x, y))")
+        c.execute("CREATE INDEX IF NOT EXISTS tiles_accessed ON tiles(accessed)")
+        _local.conn = c
+    return c
+
+def _path(src, z, x, y):
+    return os.path.join(TILE_CACHE_DIR, src, str(z), str(x), f"{y}.png")
+
+def get(src, z, x, y):
+    # (байты, метаданные) или None; метаданные: fetched, etag, last_modified
+    row = _conn().execute("SELECT fetched, etag, last_modified FROM tiles WHERE src=? AND z=? AND x=? AND y=?",
+                          (src, z, x, y)).fetchone()
+    if row is None:
+        return None
+    try:
+        with open(_path(src, z, x, y), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    with _touch_lock:
+        _touched[(src, z, x, y)] = time.time()
+    return data, {"fetched": row[0], "etag": row[1], "last_modified": row[2]}
+
+def put(src, z, x, y, data, etag=None, last_modified=None):
+    path = _path(src, z, x, y)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    now = time.time()
+    with _conn() as c:
+        c.execute("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                  (src, z, x, y, now, now, len(data), etag, last_modified))
+
+def revalidated(src, z, x, y):
+    # Сервер ответил 304 — тайл свежий, продлеваем
+    with _conn() as c:
+        c.execute("UPDATE tiles SET fetched=? WHERE src=? AND z=? AND x=? AND y=?", (time.time(), src, z, x, y))
+
+def flush_access():
+    # Время обращения пишется в индекс не на каждый get, а пачкой (после рендера и перед очисткой)
+    with _touch_lock:
+        items = list(_touched.items())
+        _touched.clear()
+    if items:
+        with _conn() as c:
+            c.executemany("UPDATE tiles SET accessed=? WHERE src=? AND z=? AND x=? AND y=?",
+                          [(ts, *k) for k, ts in items])
+
+def evict(max_bytes=None):
+    # LRU: удаляем давно не использованные тайлы, пока суммарный размер не уложится в лимит
+    max_bytes = TILE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    flush_access()
+    c = _conn()
+    total = c.execute("SELECT COALESCE(SUM(size), 0) FROM tiles").fetchone()[0]
+    if total <= max_bytes:
+        return 0
+    victims = []
+    for src, z, x, y, size in c.execute("SELECT src, z, x, y, size FROM tiles ORDER BY accessed"):
+        if total <= max_bytes:
+            break
+        victims.append((src, z, x, y))
+        total -= size
+    with c:
+        c.executemany("DELETE FROM tiles WHERE src=? AND z=? AND x=? AND y=?", victims)
+    for v in victims:
+        try:
+            os.remove(_path(*v))
+        except FileNotFoundError:
+            pass
+    logging.info("tile cache: evicted %d tiles", len(victims))
+    return len(victims)
+
+def stats():
+    n, size = _conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tiles").fetchone()
+    return {"tiles": n, "bytes": size}